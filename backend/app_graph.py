@@ -5,39 +5,41 @@ from states.indexer import build_index
 from states.entities import EntityExtractor
 from states.rag import Rag
 from states.summarizer import Summarizer
-from states.visualizer import Visualizer
+from states.visualizer import ChartTables, Visualizer
+
+
+def IndexAndRag(state: DocState):
+    """
+    The RAG branch as one node. LangGraph runs nodes in supersteps, so a separate rag node
+    after build_index would wait for the slowest node of the index step (usually summarize)
+    before it could start. Both parts return {} unless the request is in RAG mode.
+    """
+    update = build_index(state)
+    if update:
+        state = state.model_copy(update=update)
+    return {**update, **Rag(state)}
+
 
 graph = StateGraph(DocState)
 
 graph.add_node("load_file", Loader)
-graph.add_node("build_index", build_index)
-graph.add_node("rag", Rag)
+graph.add_node("rag", IndexAndRag)
 graph.add_node("summarize", Summarizer)
 graph.add_node("entities", EntityExtractor)
+graph.add_node("chart_tables", ChartTables)
 graph.add_node("visualizer", Visualizer)
 
 # START → Load
 graph.add_edge(START, "load_file")
-def choose_index(state: DocState):
-    return "build_index" if state.use_rag else "summarize"
-
-graph.add_conditional_edges(
-    "load_file",
-    choose_index,
-    {
-        "build_index": "build_index",
-        "summarize": "summarize"
-    }
-)
-
-graph.add_edge("build_index", "rag")
-
-graph.add_edge("rag", "entities")
-graph.add_edge("summarize", "entities")
-graph.add_edge("entities", "visualizer")
-graph.add_edge("visualizer", END)
-
-app_graph = graph.compile(checkpointer=None)
 
+# Fan out: every branch only needs the loaded documents/tables, so they all run in the next step.
+BRANCHES = ["summarize", "entities", "chart_tables", "rag"]
+for branch in BRANCHES:
+    graph.add_edge("load_file", branch)
 
+# Fan in: the visualizer runs once all branches are done. Branches return only the fields they
+# set; `visuals` is the one field several of them write and is merged by its reducer.
+graph.add_edge(BRANCHES, "visualizer")
+graph.add_edge("visualizer", END)
 
+app_graph = graph.compile(checkpointer=None)
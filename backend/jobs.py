@@ -0,0 +1,153 @@
+"""
+Background execution of pipeline runs.
+
+``POST /jobs`` hands a run to a ``JobBackend`` and returns at once; ``GET /jobs/{id}``
+polls it. The in-process backend runs jobs on a bounded thread pool and rejects new
+work once ``max_queue`` jobs are waiting, so a burst of uploads cannot pile up without
+limit. Other backends (e.g. a Redis-backed queue shared by several API replicas) are
+added with ``register_job_backend`` and picked with DOCSENSE_JOB_BACKEND.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Type
+
+JOB_BACKEND = os.getenv("DOCSENSE_JOB_BACKEND", "inprocess")
+# Pipelines that run at the same time; each one can still fan out to the OCR pool.
+JOB_WORKERS = int(os.getenv("DOCSENSE_JOB_WORKERS", "2"))
+# Jobs allowed to wait for a worker before submissions are rejected.
+JOB_QUEUE_SIZE = int(os.getenv("DOCSENSE_JOB_QUEUE_SIZE", "32"))
+# Finished jobs kept for polling; the oldest are forgotten first.
+JOB_RETENTION = int(os.getenv("DOCSENSE_JOB_RETENTION", "500"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Graph nodes completed so far, in order.
+    steps: List[str] = field(default_factory=list)
+    result: Any = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": {"completed_steps": list(self.steps), "current_step": self.steps[-1] if self.steps else None},
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobBackend:
+    """
+    Interface for job backends.
+
+    ``submit(fn, *args, **kwargs)`` schedules ``fn(*args, on_step=..., **kwargs)`` and
+    returns the new Job; ``on_step(name)`` records progress. Raises QueueFullError when
+    the backend cannot take more work.
+    """
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Job:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InProcessJobBackend(JobBackend):
+    def __init__(self, max_workers: int = JOB_WORKERS, max_queue: int = JOB_QUEUE_SIZE, retention: int = JOB_RETENTION):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="docsense-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _count(self, status: str) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == status)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Job:
+        with self._lock:
+            if self._count(QUEUED) >= self.max_queue + max(0, self.max_workers - self._count(RUNNING)):
+                raise QueueFullError(f"{self.max_queue} jobs already waiting")
+            job = Job(id=uuid.uuid4().hex)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        job.status, job.started_at = RUNNING, time.time()
+        try:
+            job.result = fn(*args, on_step=job.steps.append, **kwargs)
+            job.status = DONE
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in (DONE, FAILED)]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "inprocess",
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._count(QUEUED),
+                "running": self._count(RUNNING),
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+JOB_BACKENDS: Dict[str, Type[JobBackend]] = {"inprocess": InProcessJobBackend}
+_backend: Optional[JobBackend] = None
+
+
+def register_job_backend(name: str, backend_cls: Type[JobBackend]) -> None:
+    JOB_BACKENDS[name] = backend_cls
+
+
+def get_job_backend() -> JobBackend:
+    global _backend
+    if _backend is None:
+        if JOB_BACKEND not in JOB_BACKENDS:
+            raise ValueError(f"Unknown job backend {JOB_BACKEND!r}; registered: {sorted(JOB_BACKENDS)}")
+        _backend = JOB_BACKENDS[JOB_BACKEND]()
+    return _backend
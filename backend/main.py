@@ -1,21 +1,29 @@
+import json
 import os
 import shutil
+import threading
+import uuid
+from collections import Counter
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, Form, Depends
+from typing import Literal
+from fastapi import FastAPI, UploadFile, Form, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 load_dotenv()
 
-from backend.app_graph import app_graph
+from backend.jobs import QueueFullError, get_job_backend
+from backend.pipeline import build_inputs, run_pipeline, stream_pipeline
+from backend.warmup import start_warm_up, warmup_status
 from database.database import SessionLocal, engine
-from database.models import Base
-from database.crud import save_document #get_document_by_filename
+from database.models import Base, ensure_schema
 from states.loaders.json_utils import make_json_serializable
-
-# Create tables
+from states.table_store import TABLE_PAGE_MAX_ROWS, read_table_page
+# Create tables, then add columns/indexes that older databases are missing
 Base.metadata.create_all(bind=engine)
+ensure_schema(engine)
 
 app = FastAPI(title="DocSense API")
 
@@ -27,7 +35,101 @@ app.add_middleware(
 )
 
 UPLOAD_DIR = "uploaded_docs"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Every request's upload gets its own directory here, so a queued or running job keeps
+# reading the file it was given even when the same name is uploaded again.
+REQUEST_UPLOAD_DIR = os.path.join(UPLOAD_DIR, "requests")
+os.makedirs(REQUEST_UPLOAD_DIR, exist_ok=True)
+# Request directories whose file is the input of a request or job that has not finished yet.
+_uploads_in_use: Counter = Counter()
+_uploads_lock = threading.Lock()
+
+
+@app.on_event("startup")
+def warm_up_in_background():
+    # Heavy models load after the server starts accepting connections, not before.
+    start_warm_up()
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    get_job_backend().shutdown()
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "warmup": warmup_status()}
+
+
+def _request_dir(path) -> str | None:
+    """The ``uploaded_docs/requests/<id>`` directory holding ``path``, if it is a request upload."""
+    parent = os.path.dirname(os.path.abspath(path))
+    return parent if os.path.dirname(parent) == os.path.abspath(REQUEST_UPLOAD_DIR) else None
+
+
+def _hold_uploads(paths) -> None:
+    with _uploads_lock:
+        _uploads_in_use.update(d for d in map(_request_dir, paths) if d)
+
+
+def _release_uploads(paths) -> None:
+    """
+    Mark a run over ``paths`` finished, then delete every request directory that no run
+    holds and whose file a newer upload of the same name has superseded.
+    """
+    with _uploads_lock:
+        _uploads_in_use.subtract(d for d in map(_request_dir, paths) if d)
+        for d in [d for d, n in _uploads_in_use.items() if n <= 0]:
+            del _uploads_in_use[d]
+        latest = set(_latest_uploads())
+        for d in Path(REQUEST_UPLOAD_DIR).iterdir():
+            if not d.is_dir() or os.path.abspath(d) in _uploads_in_use:
+                continue
+            if not any(str(path) in latest for path in d.iterdir()):
+                shutil.rmtree(d, ignore_errors=True)
+
+
+def _save_upload(file: UploadFile) -> Path:
+    """
+    Write the upload to a new ``uploaded_docs/requests/<id>/`` directory and return its path.
+    The copy is held for the caller's run; pass it to ``_release_uploads`` when that ends.
+    """
+    request_dir = Path(REQUEST_UPLOAD_DIR) / uuid.uuid4().hex
+    file_path = request_dir / Path(file.filename).name
+    _hold_uploads([file_path])
+    request_dir.mkdir(parents=True)
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(file.file, f)
+    return file_path
+
+
+def _latest_uploads() -> list:
+    """The latest upload of every file name (files saved directly in UPLOAD_DIR by earlier versions included)."""
+    latest = {}
+    candidates = [Path(UPLOAD_DIR) / name for name in os.listdir(UPLOAD_DIR)]
+    candidates += [path for d in Path(REQUEST_UPLOAD_DIR).iterdir() if d.is_dir() for path in d.iterdir()]
+    for path in candidates:
+        if path.is_file():
+            mtime = path.stat().st_mtime
+            if path.name not in latest or mtime >= latest[path.name][0]:
+                latest[path.name] = (mtime, str(path))
+    return [path for _, path in sorted(latest.values(), key=lambda item: os.path.basename(item[1]))]
+
+
+def _pipeline_inputs(file_path: Path, mode: str, user_query: str, batch: bool, chart_format: str) -> dict:
+    """
+    Pipeline inputs for one request. Its files are held until ``_release_uploads(_run_uploads(...))``
+    runs, so a newer upload of the same name cannot prune them mid-run.
+    """
+    # Only the uploaded file is processed; batch=True processes every uploaded file (the latest of each name).
+    with _uploads_lock:
+        paths = _latest_uploads() if batch else [str(file_path)]
+        _uploads_in_use.update(d for d in map(_request_dir, paths) if d)
+    return build_inputs(UPLOAD_DIR, paths, mode.lower() == "rag", user_query, chart_format)
+
+
+def _run_uploads(file_path: Path, inputs: dict) -> list:
+    """Everything ``_save_upload`` and ``_pipeline_inputs`` held for one request."""
+    return [file_path, *inputs["file_paths"]]
 
 
 def get_db():
@@ -43,68 +145,118 @@ async def process_file(
     file: UploadFile,
     mode: str = Form(...),
     user_query: str = Form(""),
+    batch: bool = Form(False),
+    chart_format: Literal["png", "svg", "spec"] = Form("png"),
+    use_cache: bool = Form(True),
     db: Session = Depends(get_db)
 ):
     filename = file.filename
-    file_path = Path(UPLOAD_DIR) / filename
-
-    '''
-    existing_doc = get_document_by_filename(db, filename)
-    if existing_doc:
-        return JSONResponse(content={
-            "summary": existing_doc.summary,
-            "rag_response": existing_doc.rag_response,
-            "entities": existing_doc.entities,
-            "visuals": existing_doc.visuals,
-            "extracted_images": existing_doc.extracted_images,
-            "image_descriptions": existing_doc.image_descriptions,
-            "extracted_tables": existing_doc.extracted_tables,
-            "image_insights": existing_doc.image_insights
-        })
-    '''
+    file_path = await run_in_threadpool(_save_upload, file)
+    held = [file_path]
+    try:
+        # The graph is synchronous; running it in the threadpool keeps the event loop serving other requests.
+        inputs = await run_in_threadpool(_pipeline_inputs, file_path, mode, user_query, batch, chart_format)
+        held = _run_uploads(file_path, inputs)
+        # Identical content + mode + query is answered from the documents table unless use_cache=false.
+        result = await run_in_threadpool(run_pipeline, inputs, filename, db=db, use_cache=use_cache)
+    finally:
+        await run_in_threadpool(_release_uploads, held)
+    return JSONResponse(content=result)
 
 
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+@app.post("/process/stream")
+async def process_file_stream(
+    file: UploadFile,
+    mode: str = Form(...),
+    user_query: str = Form(""),
+    batch: bool = Form(False),
+    chart_format: Literal["png", "svg", "spec"] = Form("png"),
+    use_cache: bool = Form(True),
+):
+    """
+    Same as /process/, but as Server-Sent Events: ``node``, ``progress`` and ``token``
+    events while the graph runs, then one ``result`` event (or ``error``).
+    """
+    filename = file.filename
+    file_path = await run_in_threadpool(_save_upload, file)
+    try:
+        inputs = await run_in_threadpool(_pipeline_inputs, file_path, mode, user_query, batch, chart_format)
+    except Exception:
+        await run_in_threadpool(_release_uploads, [file_path])
+        raise
+
+    def events():
+        # A sync generator: Starlette pulls it from a worker thread, so the graph never runs on the event loop.
+        try:
+            for event, data in stream_pipeline(inputs, filename, use_cache=use_cache):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            print(f"Streaming run for {filename} failed: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+        finally:
+            _release_uploads(_run_uploads(file_path, inputs))
 
-    state = app_graph.invoke({
-        "folder_path": UPLOAD_DIR,
-        "use_rag": mode.lower() == "rag",
-        "user_query": user_query
-    })
-
-    summary = state.get("summary", "")
-    rag_response = state.get("rag_response", "")
-    entities = state.get("entities", [])
-    visuals = state.get("visuals", {})
-
-    extracted_images = state.get("extracted_images", [])
-    image_descriptions = state.get("image_descriptions", [])
-    extracted_tables = state.get("extracted_tables", [])
-    image_insights = state.get("image_insights", [])
-
-    save_document(
-        db,
-        filename=filename,
-        summary=summary,
-        user_query=user_query,
-        rag_response=rag_response,
-        entities=entities,
-        visuals=visuals,
-        extracted_images=extracted_images,
-        image_descriptions=image_descriptions,
-        extracted_tables=extracted_tables,
-        image_insights=image_insights,
-    )
-
-
-    return JSONResponse(content=make_json_serializable({
-        "summary": summary,
-        "rag_response": rag_response,
-        "entities": entities,
-        "visuals": visuals,
-        "extracted_images": extracted_images,
-        "image_descriptions": image_descriptions,
-        "extracted_tables": extracted_tables,
-        "image_insights": image_insights
-    }))
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+def _run_job(inputs: dict, filename: str, held: list, use_cache: bool = True) -> dict:
+    try:
+        return run_pipeline(inputs, filename, use_cache=use_cache)
+    finally:
+        _release_uploads(held)
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    file: UploadFile,
+    mode: str = Form(...),
+    user_query: str = Form(""),
+    batch: bool = Form(False),
+    chart_format: Literal["png", "svg", "spec"] = Form("png"),
+    use_cache: bool = Form(True),
+):
+    """Queue a pipeline run and return its id immediately; poll GET /jobs/{job_id} for the result."""
+    filename = file.filename
+    file_path = await run_in_threadpool(_save_upload, file)
+    held = [file_path]
+    try:
+        # The job gets its own copy of the file, so later uploads of the same name do not change its input.
+        inputs = await run_in_threadpool(_pipeline_inputs, file_path, mode, user_query, batch, chart_format)
+        held = _run_uploads(file_path, inputs)
+        job = get_job_backend().submit(_run_job, inputs, filename, held, use_cache=use_cache)
+    except QueueFullError as e:
+        await run_in_threadpool(_release_uploads, held)
+        raise HTTPException(status_code=429, detail=f"Job queue is full: {e}")
+    except Exception:
+        await run_in_threadpool(_release_uploads, held)
+        raise
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.get("/jobs")
+def job_stats():
+    return get_job_backend().stats()
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = get_job_backend().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job.to_dict()
+
+
+@app.get("/tables/{table_id}")
+def get_table(
+    table_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=TABLE_PAGE_MAX_ROWS),
+):
+    """One page of an extracted table; results reference tables by ``table_id`` instead of embedding rows."""
+    try:
+        page = read_table_page(table_id, offset, limit)
+    except ValueError:
+        page = None
+    if page is None:
+        raise HTTPException(status_code=404, detail="Unknown table id")
+    return JSONResponse(content=make_json_serializable(page))
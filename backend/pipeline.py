@@ -0,0 +1,193 @@
+"""The document pipeline as one call, shared by the synchronous endpoint and the job workers."""
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from backend.app_graph import app_graph
+from database.crud import document_result, evict_cached_documents, find_cached_document, save_document
+from database.database import SessionLocal
+from states.cache import file_sha256
+from states.doc_state import DocState
+from states.entities import ENTITY_VERSION
+from states.indexer import index_version
+from states.loader import LOADER_VERSION, resolve_paths
+from states.loaders.json_utils import make_json_serializable
+from states.summarizer import SUMMARY_PROMPT_VERSION
+from states.table_store import table_exists
+from states.visualizer import CHART_RENDER_VERSION
+
+# Stored results are reused only when produced by the same pipeline: the first part is bumped
+# for changes to the graph itself, the rest follow the versions of the individual stages.
+PIPELINE_VERSION = "/".join(["1", LOADER_VERSION, SUMMARY_PROMPT_VERSION, ENTITY_VERSION, CHART_RENDER_VERSION])
+# Seconds a stored result may be served for an identical request; 0 disables the result cache.
+RESULT_CACHE_TTL = int(os.getenv("DOCSENSE_RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+
+RESULT_FIELDS = {
+    "summary": "",
+    "rag_response": "",
+    "entities": [],
+    "visuals": {},
+    "extracted_images": [],
+    "image_descriptions": [],
+    "extracted_tables": [],
+    "image_insights": [],
+    "retrieved_node_ids": [],
+}
+
+
+def build_inputs(
+    folder_path: str,
+    file_paths: List[str],
+    use_rag: bool,
+    user_query: str,
+    chart_format: str = "png",
+) -> Dict[str, Any]:
+    return {
+        "folder_path": folder_path,
+        "file_paths": file_paths,
+        "use_rag": use_rag,
+        "user_query": user_query,
+        "chart_format": chart_format,
+    }
+
+
+def content_hash(inputs: Dict[str, Any]) -> str:
+    """SHA-256 over the contents of every file the request processes; names do not matter."""
+    digests = sorted(file_sha256(path) for path in resolve_paths(DocState(**inputs)))
+    return hashlib.sha256("\n".join(digests).encode("ascii")).hexdigest()
+
+
+def _cache_fields(inputs: Dict[str, Any], digest: str) -> Dict[str, Any]:
+    use_rag = bool(inputs.get("use_rag"))
+    return {
+        "content_hash": digest,
+        "pipeline_version": PIPELINE_VERSION,
+        "mode": "rag" if use_rag else "summary",
+        # Summaries do not depend on the query, so any stored summary of the content matches.
+        "user_query": (inputs.get("user_query") or "").strip() if use_rag else None,
+        "chart_format": inputs.get("chart_format", "png"),
+        # RAG answers come from the shared index, which other uploads change; the version read
+        # here matches a row saved by a run that left the index in this state.
+        "index_version": index_version() if use_rag else None,
+    }
+
+
+def _outputs_exist(result: Dict[str, Any]) -> bool:
+    """A stored result points at images, chart files and stored tables; it is only usable while they exist."""
+    charts = (result.get("visuals") or {}).get("charts", [])
+    files = list(result.get("extracted_images") or []) + [c["file"] for c in charts if c.get("file")]
+    tables = [t["table_id"] for t in result.get("extracted_tables") or [] if isinstance(t, dict) and t.get("table_id")]
+    return all(os.path.exists(f) for f in files) and all(map(table_exists, tables))
+
+
+def cached_result(session: Session, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if RESULT_CACHE_TTL <= 0:
+        return None
+    document = find_cached_document(session, max_age_seconds=RESULT_CACHE_TTL, **fields)
+    if document is None:
+        return None
+    result = {field: value if value is not None else RESULT_FIELDS[field]
+              for field, value in document_result(document).items()}
+    return result if _outputs_exist(result) else None
+
+
+def stream_pipeline(
+    inputs: Dict[str, Any],
+    filename: str,
+    db: Optional[Session] = None,
+    use_cache: bool = True,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Run the graph and yield ``(event, data)`` pairs as it goes, ending with ``("result", body)``.
+
+    Events:
+      node      a node finished; ``partial`` holds the result fields it changed
+      progress  loader/summarizer progress (stage, file, done, total, ...)
+      token     a streamed piece of the summary or RAG answer (field, text)
+      result    the JSON-ready response body, after the result row is saved
+
+    A stored result for the same file contents, mode, query and pipeline version (see
+    RESULT_CACHE_TTL) is returned as the only event, with ``cached`` set; ``use_cache=False``
+    always runs the graph.
+    """
+    session = db or SessionLocal()
+    try:
+        yield from _stream_pipeline(inputs, filename, session, use_cache)
+    finally:
+        if db is None:
+            session.close()
+
+
+def _stream_pipeline(
+    inputs: Dict[str, Any],
+    filename: str,
+    session: Session,
+    use_cache: bool,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    fields = _cache_fields(inputs, content_hash(inputs))
+    if use_cache:
+        result = cached_result(session, fields)
+        if result is not None:
+            yield "result", make_json_serializable({**result, "cached": True})
+            return
+
+    state: Dict[str, Any] = {}
+    sent: Dict[str, Any] = {}
+    for mode, chunk in app_graph.stream(inputs, stream_mode=["updates", "custom", "values"]):
+        if mode == "values":
+            state = chunk
+        elif mode == "custom":
+            event = dict(chunk)
+            yield event.pop("event", "progress"), make_json_serializable(event)
+        else:
+            for node, update in chunk.items():
+                partial = {}
+                for field in RESULT_FIELDS:
+                    value = (update or {}).get(field)
+                    if value and value != sent.get(field):
+                        partial[field] = sent[field] = value
+                yield "node", {"node": node, "partial": make_json_serializable(partial)}
+
+    result = {field: state.get(field) or default for field, default in RESULT_FIELDS.items()}
+
+    save_document(
+        session,
+        filename=filename,
+        **{
+            **fields,
+            "user_query": (inputs.get("user_query") or "").strip(),
+            # The index this run answered from, after it synced the request's files.
+            "index_version": (state.get("index_version") or None) if fields["mode"] == "rag" else None,
+        },
+        **result,
+    )
+    if RESULT_CACHE_TTL > 0:
+        evict_cached_documents(session, RESULT_CACHE_TTL, PIPELINE_VERSION)
+
+    yield "result", make_json_serializable({**result, "cached": False})
+
+
+def run_pipeline(
+    inputs: Dict[str, Any],
+    filename: str,
+    on_step: Optional[Callable[[str], None]] = None,
+    db: Optional[Session] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Run the graph, save the result row and return the JSON-ready response body.
+
+    ``on_step`` is called with each node name as the node finishes. A database session is
+    opened for the call unless ``db`` is given (worker threads always open their own).
+    """
+    result: Dict[str, Any] = {}
+    for event, data in stream_pipeline(inputs, filename, db=db, use_cache=use_cache):
+        if event == "node" and on_step is not None:
+            on_step(data["node"])
+        elif event == "result":
+            result = data
+    return result
@@ -0,0 +1,93 @@
+"""
+Background warm-up of the resources the pipeline otherwise initializes on first use.
+
+Importing ``backend.app_graph`` is cheap: spaCy, the OpenAI/LlamaIndex clients, the
+format loaders and the OCR engine are all created lazily. Once uvicorn is serving,
+``start_warm_up`` loads them on a daemon thread, so readiness is not held up and the
+first real request usually finds everything in place. A request that arrives earlier
+simply initializes what it needs itself.
+"""
+from __future__ import annotations
+
+import importlib
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+# "0" disables the warm-up; resources are then initialized by the first request that needs them.
+WARMUP_ENABLED = os.getenv("DOCSENSE_WARMUP", "1") != "0"
+
+_status: Dict[str, str] = {}
+_thread: threading.Thread | None = None
+
+
+def _import_loaders() -> None:
+    from states.loader import _LOADERS
+
+    for module in sorted({module for module, _, _ in _LOADERS.values()}):
+        importlib.import_module(module)
+
+
+def _load_models() -> None:
+    from model.model import get_embed_model, get_llm
+
+    get_llm()
+    get_embed_model()
+
+
+def _load_nlp() -> None:
+    from states.entities import get_nlp
+
+    get_nlp()
+
+
+def _load_ocr() -> None:
+    from states.loaders.ocr import get_ocr_service
+
+    service = get_ocr_service()
+    # With a worker pool the engine lives in the workers, which preload it when they start.
+    if service.workers <= 1:
+        service.engine()
+
+
+def _import_llama_index() -> None:
+    importlib.import_module("llama_index.core")
+    importlib.import_module("states.vector_store")
+
+
+WARMUP_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("llama_index", _import_llama_index),
+    ("models", _load_models),
+    ("loaders", _import_loaders),
+    ("spacy", _load_nlp),
+    ("ocr", _load_ocr),
+]
+
+
+def warm_up() -> Dict[str, str]:
+    """Run every warm-up step, recording its duration (or error) in ``warmup_status()``."""
+    for name, step in WARMUP_STEPS:
+        _status[name] = "running"
+        start = time.perf_counter()
+        try:
+            step()
+            _status[name] = f"ok in {time.perf_counter() - start:.2f}s"
+        except Exception as e:
+            _status[name] = f"failed: {e}"
+            print(f"Warm-up step {name} failed: {e}")
+    return dict(_status)
+
+
+def start_warm_up() -> threading.Thread | None:
+    """Start ``warm_up`` on a daemon thread (once per process) unless DOCSENSE_WARMUP=0."""
+    global _thread
+    if not WARMUP_ENABLED or _thread is not None:
+        return _thread
+    _thread = threading.Thread(target=warm_up, name="docsense-warmup", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def warmup_status() -> Dict[str, str]:
+    return dict(_status)
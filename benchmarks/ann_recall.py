@@ -0,0 +1,97 @@
+"""
+Recall and latency of the IVF retrieval mode against exact search.
+
+    python -m benchmarks.ann_recall --rows 200000 --dim 256 --nprobe 4 8 16 32
+    python -m benchmarks.ann_recall --persist-dir index_storage   # an existing index
+
+Synthetic vectors are drawn around random cluster centres so the data has the kind of
+structure real embeddings have; uniformly random vectors make every ANN index look bad.
+"""
+from __future__ import annotations
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from states.ann import IVFIndex
+from states.vector_store import NumpyVectorStore, _normalize
+
+
+def synthetic_store(rows: int, dim: int, clusters: int, seed: int) -> NumpyVectorStore:
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    vectors = centres[labels] + 0.35 * rng.normal(size=(rows, dim)).astype(np.float32)
+    store = NumpyVectorStore(persist_dir=tempfile.mkdtemp(prefix="ann_bench_"))
+    for i, vector in enumerate(vectors):
+        store._append(f"node-{i}", f"doc-{i}", {}, vector)
+    store.persist()
+    return store
+
+
+def run_queries(store: NumpyVectorStore, queries: np.ndarray, k: int, **kwargs):
+    ids, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=k), **kwargs)
+        latencies.append(time.perf_counter() - start)
+        ids.append(set(result.ids))
+    return ids, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--persist-dir", help="benchmark an existing NumpyVectorStore instead of synthetic data")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.persist_dir:
+        store = NumpyVectorStore.from_persist_dir(args.persist_dir)
+        cleanup = None
+    else:
+        store = synthetic_store(args.rows, args.dim, args.clusters, args.seed)
+        cleanup = store.persist_dir
+
+    try:
+        rng = np.random.default_rng(args.seed + 1)
+        picks = rng.choice(store._persisted_rows, size=args.queries)
+        queries = np.asarray(store._matrix[picks], dtype=np.float32)
+        queries = _normalize(queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32))
+
+        store._ann = None
+        exact_ids, exact_lat = run_queries(store, queries, args.k)
+        print(f"rows={store._persisted_rows} dim={store._dim} k={args.k} queries={args.queries}")
+        print(f"exact      recall=1.000  mean={1000 * np.mean(exact_lat):7.2f}ms  p95={1000 * np.percentile(exact_lat, 95):7.2f}ms")
+
+        start = time.perf_counter()
+        exclude = np.zeros(store._persisted_rows, dtype=bool)
+        if store._deleted:
+            exclude[list(store._deleted)] = True
+        store._ann = IVFIndex.build(store._matrix, nlist=args.nlist, exclude=exclude)
+        print(f"ivf build  nlist={store._ann.nlist} in {time.perf_counter() - start:.2f}s")
+
+        for nprobe in args.nprobe:
+            ann_ids, ann_lat = run_queries(store, queries, args.k, nprobe=nprobe)
+            recall = np.mean([len(a & e) / max(len(e), 1) for a, e in zip(ann_ids, exact_ids)])
+            print(
+                f"nprobe={nprobe:<4} recall={recall:.3f}  mean={1000 * np.mean(ann_lat):7.2f}ms  "
+                f"p95={1000 * np.percentile(ann_lat, 95):7.2f}ms"
+            )
+    finally:
+        if cleanup:
+            shutil.rmtree(cleanup, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Column typing in ``auto_chart_from_table`` against the per-cell implementation it replaced.
+
+    python -m benchmarks.chart_typing --rows 100000 --runs 3
+
+Each case is a synthetic table of row dicts with currency/percent strings, categories,
+ISO dates and a few blanks. The old version kept here pivots the rows in Python and
+parses every cell with str/replace/float. For each case the script prints both timings
+on the row dicts, the new version's timing on an already-built DataFrame (what the
+charts get for tables read from the table store), and the chart type each version picks.
+Date cases are expected to differ: the old version treated dates as categories.
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from states.visualizer import _frame, auto_chart_from_table
+
+
+# The implementation before vectorization, kept as the baseline.
+def legacy_auto_chart(table):
+    """
+    Clean + simplified version of auto chart detection.
+    Detects numeric and categorical columns and chooses:
+    - Line     (if row count > 8 and numeric)
+    - Bar      (if categorical + numeric)
+    - Scatter  (if 2 numeric)
+    - Histogram (if 1 numeric)
+    """
+    if not table or not isinstance(table, list):
+        return None
+
+    # Convert rows → columns
+    columns = {}
+    for row in table:
+        for k, v in row.items():
+            columns.setdefault(k, []).append(v)
+
+    if len(columns) == 0:
+        return None
+
+    def is_numeric(val):
+        try:
+            return float(str(val).replace(",", "").replace("%", "").replace("$", "")) or True
+        except:
+            return False
+
+    def clean_num(val):
+        try:
+            return float(str(val).replace(",", "").replace("%", "").replace("$", ""))
+        except:
+            return 0.0
+
+    numeric_cols = []
+    categorical_cols = []
+
+    for col, vals in columns.items():
+        if all(is_numeric(v) for v in vals if v not in ["", None]):
+            numeric_cols.append(col)
+        else:
+            categorical_cols.append(col)
+
+    # ----- CHART DECISIONS -----
+
+    # 1) SCATTER → if two numeric columns
+    if len(numeric_cols) >= 2:
+        x, y = numeric_cols[:2]
+        return {
+            "type": "scatter",
+            "title": f"{y} vs {x}",
+            "labels": [clean_num(v) for v in columns[x]],
+            "values": [clean_num(v) for v in columns[y]],
+        }
+
+    # 2) HISTOGRAM → if one numeric column only
+    if len(numeric_cols) == 1 and len(categorical_cols) == 0:
+        col = numeric_cols[0]
+        return {
+            "type": "histogram",
+            "title": f"Distribution of {col}",
+            "values": [clean_num(v) for v in columns[col]],
+        }
+
+    # 3) BAR → category + numeric
+    if len(categorical_cols) >= 1 and len(numeric_cols) >= 1:
+        cat = categorical_cols[0]
+        num = numeric_cols[0]
+
+        return {
+            "type": "bar",
+            "title": f"{num} by {cat}",
+            "labels": columns[cat],
+            "values": [clean_num(v) for v in columns[num]]
+        }
+
+    # 4) LINE → if numeric only and many rows
+    if len(numeric_cols) == 1 and len(columns[numeric_cols[0]]) > 8:
+        col = numeric_cols[0]
+        return {
+            "type": "line",
+            "title": f"Trend of {col}",
+            "labels": list(range(len(columns[col]))),
+            "values": [clean_num(v) for v in columns[col]]
+        }
+
+    return None
+
+
+def make_cases(rows: int, seed: int):
+    rng = np.random.default_rng(seed)
+    amount = [f"${v:,.2f}" for v in rng.uniform(0, 50_000, rows)]
+    percent = [f"{v:.1f}%" for v in rng.uniform(0, 100, rows)]
+    region = rng.choice(["north", "south", "east", "west"], rows).tolist()
+    day = pd.date_range("2020-01-01", periods=rows, freq="h").strftime("%Y-%m-%d %H:%M").tolist()
+    for column in (amount, percent):
+        for i in rng.choice(rows, size=max(1, rows // 1000), replace=False):
+            column[i] = ""
+
+    def records(**columns):
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+    return {
+        "bar (region, amount)": records(region=region, amount=amount),
+        "scatter (amount, percent)": records(amount=amount, percent=percent),
+        "histogram (amount)": records(amount=amount),
+        "time series (date, amount)": records(date=day, amount=amount),
+    }
+
+
+def timed(fn, table, runs: int):
+    times, chart = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        chart = fn(table)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), (chart or {}).get("type")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"rows={args.rows} runs={args.runs} (median)")
+    for name, table in make_cases(args.rows, args.seed).items():
+        old_s, old_type = timed(legacy_auto_chart, table, args.runs)
+        new_s, new_type = timed(auto_chart_from_table, table, args.runs)
+        frame_s, _ = timed(auto_chart_from_table, _frame(table), args.runs)
+        print(
+            f"{name:<28} per-cell={1000 * old_s:8.1f}ms ({old_type})  "
+            f"vectorized={1000 * new_s:8.1f}ms ({new_type}) x{old_s / new_s:4.1f}  "
+            f"from DataFrame={1000 * frame_s:8.1f}ms x{old_s / frame_s:4.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Wall-clock time of the fan-out graph against the old linear pipeline on a folder of documents.
+
+    python -m benchmarks.graph_parallel docs/                         # real models (needs OPENAI_API_KEY)
+    python -m benchmarks.graph_parallel docs/ --simulate-llm 1.5      # fake LLM/embeddings with fixed latency
+    python -m benchmarks.graph_parallel docs/ --mode rag --query "What changed in Q3?"
+
+Both graphs are built from the same node functions; the linear one chains them the way
+the pipeline used to run (load -> index -> rag -> summarize -> entities -> charts ->
+visualizer). One untimed run first fills the extraction cache, so both graphs load from
+it and the comparison is about the work after loading. Summaries are cached too: with
+real models, later runs mostly hit that cache. Use --simulate-llm to give every LLM call
+the same cost on every run.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def build_linear_graph():
+    from langgraph.graph import END, START, StateGraph
+
+    from states.doc_state import DocState
+    from states.entities import EntityExtractor
+    from states.indexer import build_index
+    from states.loader import Loader
+    from states.rag import Rag
+    from states.summarizer import Summarizer
+    from states.visualizer import ChartTables, Visualizer
+
+    graph = StateGraph(DocState)
+    steps = [
+        ("load_file", Loader),
+        ("build_index", build_index),
+        ("rag", Rag),
+        ("summarize", Summarizer),
+        ("entities", EntityExtractor),
+        ("chart_tables", ChartTables),
+        ("visualizer", Visualizer),
+    ]
+    previous = START
+    for name, node in steps:
+        graph.add_node(name, node)
+        graph.add_edge(previous, name)
+        previous = name
+    graph.add_edge(previous, END)
+    return graph.compile()
+
+
+def simulate_models(latency: float) -> None:
+    """Swap in an LLM that sleeps ``latency`` seconds per call and a deterministic mock embedding."""
+    from llama_index.core.embeddings import MockEmbedding
+
+    import model.model as models
+
+    class _Message:
+        def __init__(self, content):
+            self.content = content
+
+    class SimulatedLLM:
+        model_name = "simulated"
+
+        def invoke(self, prompt):
+            time.sleep(latency)
+            return _Message(f"simulated answer for {len(prompt)} characters")
+
+        def batch(self, prompts, config=None):
+            # Calls inside a batch overlap, as they do against the real API.
+            time.sleep(latency)
+            return [_Message(f"simulated summary of {len(p)} characters") for p in prompts]
+
+        def stream(self, prompt):
+            time.sleep(latency)
+            for word in "a simulated streamed response".split():
+                yield _Message(word + " ")
+
+    models._models["model1"] = SimulatedLLM()
+    models._models["model2"] = MockEmbedding(embed_dim=256)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="folder of documents, processed as one batch")
+    parser.add_argument("--mode", choices=["summary", "rag"], default="summary")
+    parser.add_argument("--query", default="What are the key findings?")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--simulate-llm", type=float, metavar="SECONDS", help="fake models with this latency per call")
+    parser.add_argument("--cache-dir", help="cache directory (default: a fresh temporary one)")
+    args = parser.parse_args()
+
+    # Caches and the index are created lazily, so pointing them elsewhere before first use is enough.
+    os.environ["DOCSENSE_CACHE_DIR"] = args.cache_dir or tempfile.mkdtemp(prefix="graph_bench_cache_")
+    import states.indexer
+
+    states.indexer.PERSIST_DIR = tempfile.mkdtemp(prefix="graph_bench_index_")
+    if args.simulate_llm is not None:
+        simulate_models(args.simulate_llm)
+
+    from backend.app_graph import app_graph
+    from states.summarizer import _get_summary_cache
+
+    graphs = {"linear": build_linear_graph(), "parallel": app_graph}
+    inputs = {"folder_path": args.folder, "use_rag": args.mode == "rag", "user_query": args.query}
+
+    app_graph.invoke(inputs)  # untimed: fills the extraction cache for both graphs
+    timings = {name: [] for name in graphs}
+    for run in range(args.runs):
+        for name, graph in graphs.items():
+            if args.simulate_llm is not None:
+                _get_summary_cache().clear()
+            start = time.perf_counter()
+            graph.invoke(inputs)
+            timings[name].append(time.perf_counter() - start)
+            print(f"run {run + 1} {name:<8} {timings[name][-1]:7.2f}s", file=sys.stderr)
+
+    linear, parallel = statistics.mean(timings["linear"]), statistics.mean(timings["parallel"])
+    print(f"mode={args.mode} runs={args.runs} folder={args.folder}")
+    print(f"linear    mean={linear:7.2f}s  min={min(timings['linear']):7.2f}s")
+    print(f"parallel  mean={parallel:7.2f}s  min={min(timings['parallel']):7.2f}s")
+    print(f"saved     {linear - parallel:7.2f}s per run ({100 * (1 - parallel / linear):.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
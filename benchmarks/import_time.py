@@ -0,0 +1,69 @@
+"""
+Per-module import cost of the API entry points, from ``python -X importtime``.
+
+    python -m benchmarks.import_time                          # backend.app_graph
+    python -m benchmarks.import_time backend.main states.loader --top 30
+    python -m benchmarks.import_time --budget-ms 1500         # exit 1 when over budget (CI)
+
+Each target is imported in a fresh interpreter so earlier imports do not hide its cost.
+Cumulative times include everything a module pulls in; ``self`` is its own body only.
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+from typing import List, Tuple
+
+# (module, depth, self_us, cumulative_us)
+ImportRow = Tuple[str, int, int, int]
+
+
+def measure(module: str) -> Tuple[List[ImportRow], str]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    rows: List[ImportRow] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    error = "" if proc.returncode == 0 else proc.stderr.strip().splitlines()[-1]
+    return rows, error
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["backend.app_graph"])
+    parser.add_argument("--top", type=int, default=20, help="slowest modules to list by cumulative time")
+    parser.add_argument("--prefix", nargs="*", default=[], help="only list modules starting with these prefixes")
+    parser.add_argument("--budget-ms", type=float, default=0, help="fail when a target takes longer than this")
+    args = parser.parse_args()
+
+    over_budget = False
+    for module in args.modules:
+        rows, error = measure(module)
+        total_ms = next((cum for name, _, _, cum in rows if name == module), 0) / 1000
+        print(f"\n{module}: {total_ms:.0f} ms, {len(rows)} modules imported")
+        if error:
+            print(f"  import failed: {error}")
+
+        listed = [r for r in rows if not args.prefix or r[0].startswith(tuple(args.prefix))]
+        listed.sort(key=lambda r: r[3], reverse=True)
+        print(f"  {'cumulative':>10}  {'self':>8}  module")
+        for name, depth, self_us, cumulative_us in listed[:args.top]:
+            print(f"  {cumulative_us / 1000:>8.1f}ms  {self_us / 1000:>6.1f}ms  {'  ' * depth}{name}")
+
+        if args.budget_ms and total_ms > args.budget_ms:
+            print(f"  over budget: {total_ms:.0f} ms > {args.budget_ms:.0f} ms")
+            over_budget = True
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
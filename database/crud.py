@@ -1,10 +1,85 @@
+import datetime
 import json
 from sqlalchemy.orm import Session
 from database.models import Document
 
+def _utcnow():
+    # created_at is filled by the database with CURRENT_TIMESTAMP: UTC, without a timezone.
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
 
-#def get_document_by_filename(db: Session, filename: str):
-    #return db.query(Document).filter(Document.filename == filename).first()
+
+# Result fields stored as JSON text.
+JSON_FIELDS = (
+    "entities",
+    "visuals",
+    "extracted_images",
+    "image_descriptions",
+    "extracted_tables",
+    "image_insights",
+    "retrieved_node_ids",
+)
+
+
+def find_cached_document(
+        db: Session,
+        content_hash: str,
+        pipeline_version: str,
+        mode: str,
+        user_query: str,
+        chart_format: str,
+        max_age_seconds: int,
+        index_version: str = None,
+):
+    """
+    Newest row produced from the same content, pipeline, mode, query and chart format within
+    the TTL. ``user_query=None`` matches any query (summaries do not depend on it), and
+    ``index_version=None`` any index (only RAG answers depend on it).
+    """
+    cutoff = _utcnow() - datetime.timedelta(seconds=max_age_seconds)
+    query = db.query(Document).filter(
+        Document.content_hash == content_hash,
+        Document.pipeline_version == pipeline_version,
+        Document.mode == mode,
+        Document.chart_format == chart_format,
+        Document.created_at >= cutoff,
+    )
+    if user_query is not None:
+        query = query.filter(Document.user_query == user_query)
+    if index_version is not None:
+        query = query.filter(Document.index_version == index_version)
+    return (
+        query
+        .order_by(Document.created_at.desc(), Document.id.desc())
+        .first()
+    )
+
+
+def evict_cached_documents(db: Session, max_age_seconds: int, pipeline_version: str) -> int:
+    """
+    Take rows out of the result cache: expired ones and ones from other pipeline versions.
+    The rows stay as history; only their cache key is cleared.
+    """
+    cutoff = _utcnow() - datetime.timedelta(seconds=max_age_seconds)
+    count = (
+        db.query(Document)
+        .filter(Document.content_hash.isnot(None))
+        .filter((Document.created_at < cutoff) | (Document.pipeline_version != pipeline_version))
+        .update({Document.content_hash: None}, synchronize_session=False)
+    )
+    db.commit()
+    return count
+
+
+def document_result(document: Document) -> dict:
+    """A stored row as the pipeline's result fields, JSON columns decoded."""
+    result = {
+        "summary": document.summary or "",
+        "rag_response": document.rag_response or "",
+    }
+    for field in JSON_FIELDS:
+        value = getattr(document, field)
+        result[field] = json.loads(value) if value else None
+    return result
 
 
 def save_document(
@@ -19,6 +94,12 @@ def save_document(
         image_descriptions: list = None,
         extracted_tables: list = None,
         image_insights: list = None,
+        retrieved_node_ids: list = None,
+        content_hash: str = None,
+        pipeline_version: str = None,
+        mode: str = None,
+        chart_format: str = None,
+        index_version: str = None,
 ):
     db_document = Document(
         filename=filename,
@@ -32,6 +113,12 @@ def save_document(
         image_descriptions=json.dumps(image_descriptions) if image_descriptions else None,
         extracted_tables=json.dumps(extracted_tables) if extracted_tables else None,
         image_insights=json.dumps(image_insights) if image_insights else None,
+        retrieved_node_ids=json.dumps(retrieved_node_ids) if retrieved_node_ids else None,
+        content_hash=content_hash,
+        pipeline_version=pipeline_version,
+        mode=mode,
+        chart_format=chart_format,
+        index_version=index_version,
     )
 
     db.add(db_document)
@@ -1,5 +1,5 @@
 from database.database import Base
-from sqlalchemy import Column, Integer, String, Text,func
+from sqlalchemy import Column, Index, Integer, String, Text, func, inspect, text
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 
 class Document(Base):
@@ -16,5 +16,29 @@ class Document(Base):
     image_descriptions = Column(Text, nullable=True)      # JSON list
     extracted_tables = Column(Text, nullable=True)        # JSON list of dicts
     image_insights = Column(Text, nullable=True) 
+    retrieved_node_ids = Column(Text, nullable=True)      # JSON list of index node ids behind rag_response
     created_at = Column(TIMESTAMP, server_default=func.now())
+    # Result cache: SHA-256 over the processed files' contents, and the pipeline that produced the row.
+    content_hash = Column(String, nullable=True)
+    pipeline_version = Column(String, nullable=True)
+    mode = Column(String, nullable=True)                  # "rag" or "summary"
+    chart_format = Column(String, nullable=True)
+    # RAG rows: the index the answer was retrieved from (states.indexer.index_version).
+    index_version = Column(String, nullable=True)
 
+    __table_args__ = (Index("ix_documents_cache", "content_hash", "pipeline_version", "mode"),)
+
+
+def ensure_schema(engine):
+    """
+    Add columns introduced after a database was created (``create_all`` only creates missing
+    tables), then any missing indexes. SQLite supports ADD COLUMN for nullable columns.
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns(Document.__tablename__)}
+    with engine.begin() as conn:
+        for column in Document.__table__.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {Document.__tablename__} ADD COLUMN {column.name} {column_type}"))
+    for index in Document.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
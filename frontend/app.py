@@ -1,8 +1,115 @@
 import streamlit as st
 import requests
 import json
+import numpy as np
 import pandas as pd
 
+API_URL = "http://localhost:8000"
+TABLE_PAGE_ROWS = 100
+
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+def process_streaming(files, data, mode):
+    """Call /process/stream, rendering progress and the answer as it is generated; returns the final result."""
+    text_field = "rag_response" if mode == "RAG" else "summary"
+    st.subheader("🧠 RAG Response" if mode == "RAG" else "📝 Summary")
+    status = st.status("Processing your document...", expanded=True)
+    progress_line = status.empty()
+    text_box = st.empty()
+    streamed = ""
+    res = None
+
+    with requests.post(f"{API_URL}/process/stream", files=files, data=data, stream=True) as response:
+        response.raise_for_status()
+        for event, payload in iter_sse(response):
+            if event == "node":
+                status.write(f"✅ {payload['node']}")
+                if text_field in payload.get("partial", {}):
+                    streamed = payload["partial"][text_field]
+                    text_box.write(streamed)
+            elif event == "progress":
+                done, total = payload.get("done"), payload.get("total")
+                count = f" {done}/{total}" if done and total else ""
+                progress_line.write(f"{payload.get('stage', '')}{count} {payload.get('file', '')}")
+            elif event == "token" and payload.get("field") == text_field:
+                streamed += payload.get("text", "")
+                text_box.write(streamed)
+            elif event == "result":
+                res = payload
+            elif event == "error":
+                raise requests.RequestException(payload.get("detail", "processing failed"))
+
+    status.update(label="Done", state="complete", expanded=False)
+    res = res or {}
+    text_box.write(res.get(text_field) or streamed or "No response available")
+    return res
+
+
+def fetch_table_page(table_id, offset, limit=TABLE_PAGE_ROWS):
+    response = requests.get(f"{API_URL}/tables/{table_id}", params={"offset": offset, "limit": limit})
+    response.raise_for_status()
+    return response.json()
+
+
+def render_table(table_dict, key):
+    """Stored tables are pulled from /tables/{id} a page at a time; inline records are shown as they are."""
+    table_id = table_dict.get("table_id")
+    if not table_id:
+        st.dataframe(pd.DataFrame(table_dict.get("data", [])), use_container_width=True)
+        return
+
+    rows = table_dict.get("rows", 0)
+    pages = max(1, -(-rows // TABLE_PAGE_ROWS))
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"table_page_{key}")
+    offset = (page - 1) * TABLE_PAGE_ROWS
+    try:
+        data = fetch_table_page(table_id, offset)["data"]
+    except requests.RequestException as e:
+        st.error(f"Could not load table rows: {e}")
+        return
+    st.caption(f"Rows {offset + 1}-{offset + len(data)} of {rows}")
+    st.dataframe(pd.DataFrame(data, columns=table_dict.get("columns")), use_container_width=True)
+
+
+def draw_chart_spec(chart):
+    """Draw a chart from its spec (type, labels, values / words) with Streamlit's own charts; no image needed."""
+    ctype = chart["type"]
+    st.caption(chart.get("title", ""))
+    if ctype == "wordcloud":
+        words = sorted(chart.get("words", {}).items(), key=lambda item: item[1], reverse=True)[:30]
+        st.bar_chart(pd.DataFrame(words, columns=["word", "count"]), x="word", y="count")
+    elif ctype == "histogram":
+        counts, edges = np.histogram(chart["values"], bins=10)
+        bins = [f"{low:.3g}–{high:.3g}" for low, high in zip(edges[:-1], edges[1:])]
+        st.bar_chart(pd.DataFrame({"bin": bins, "count": counts}), x="bin", y="count")
+    else:
+        df = pd.DataFrame({"x": chart["labels"], "value": chart["values"]})
+        if chart.get("x_type") == "date":
+            df["x"] = pd.to_datetime(df["x"])
+        if ctype == "bar":
+            df["x"] = df["x"].astype(str)
+            st.bar_chart(df, x="x", y="value")
+        elif ctype == "scatter":
+            st.scatter_chart(df, x="x", y="value")
+        else:
+            st.line_chart(df, x="x", y="value")
+
+
 st.set_page_config(page_title="DocSense", layout="wide")
 st.title("📄 DocSense – AI Document Understanding")
 
@@ -13,28 +120,54 @@ user_query = ""
 if mode == "RAG":
     user_query = st.text_input("Ask your question:")
 
+CHART_FORMATS = {"Images (PNG)": "png", "Vector (SVG)": "svg", "Interactive (drawn in the browser)": "spec"}
+chart_format = CHART_FORMATS[st.selectbox("Charts:", list(CHART_FORMATS))]
+
+use_cache = st.checkbox("Reuse the stored result when this file and question were processed before", value=True)
+stream_results = st.checkbox("Show progress and results as they are generated", value=True)
+
+just_streamed = False
 if uploaded_file and st.button("Process"):
     files = {"file": uploaded_file}
-    data = {"mode": mode, "user_query": user_query}
+    data = {"mode": mode, "user_query": user_query, "chart_format": chart_format, "use_cache": use_cache}
 
-    with st.spinner("Processing your document..."):
+    if stream_results:
         try:
-            response = requests.post("http://localhost:8000/process/", files=files, data=data)
-            response.raise_for_status()
-            res = response.json()
+            res = process_streaming(files, data, mode)
+            just_streamed = True
         except requests.RequestException as e:
             st.error(f"Request failed: {e}")
             st.stop()
-
-    # -------------------------------------
-    # Summary or RAG Output
-    # -------------------------------------
-    if mode == "RAG":
-        st.subheader("🧠 RAG Response")
-        st.write(res.get("rag_response", "No RAG response"))
     else:
-        st.subheader("📝 Summary")
-        st.write(res.get("summary", "No summary available"))
+        with st.spinner("Processing your document..."):
+            try:
+                response = requests.post(f"{API_URL}/process/", files=files, data=data)
+                response.raise_for_status()
+                res = response.json()
+            except requests.RequestException as e:
+                st.error(f"Request failed: {e}")
+                st.stop()
+
+    # Kept across reruns, so paging through a table does not re-process the document.
+    st.session_state["result"] = {"res": res, "mode": mode}
+
+if "result" in st.session_state:
+    res = st.session_state["result"]["res"]
+    mode = st.session_state["result"]["mode"]
+
+    if res.get("cached"):
+        st.caption("Served from stored results; untick \"Reuse the stored result\" to process again.")
+
+    if not just_streamed:
+        # -------------------------------------
+        # Summary or RAG Output
+        # -------------------------------------
+        if mode == "RAG":
+            st.subheader("🧠 RAG Response")
+            st.write(res.get("rag_response", "No RAG response"))
+        else:
+            st.subheader("📝 Summary")
+            st.write(res.get("summary", "No summary available"))
 
     # -------------------------------------
     # Entities
@@ -48,7 +181,10 @@ if uploaded_file and st.button("Process"):
         except:
             entities = []
 
-    if entities:
+    if entities and isinstance(entities[0], dict) and "count" in entities[0]:
+        # Deduplicated entities: one row each, most frequent first; offsets stay in the API response.
+        st.dataframe(pd.DataFrame(entities)[["text", "label", "count"]], use_container_width=True)
+    elif entities:
         st.json(entities)
     else:
         st.write("No entities detected.")
@@ -74,6 +210,8 @@ if uploaded_file and st.button("Process"):
         for chart in charts:
             if isinstance(chart, dict) and "file" in chart:
                 st.image(chart["file"])
+            elif isinstance(chart, dict) and "type" in chart:
+                draw_chart_spec(chart)
     else:
         st.write("No charts detected.")
 
@@ -120,21 +258,17 @@ if uploaded_file and st.button("Process"):
             st.markdown(f"### Table {table_index + 1}")
             
             # Extract metadata
-            if isinstance(table_dict, dict) and "data" in table_dict:
+            if isinstance(table_dict, dict) and ("table_id" in table_dict or "data" in table_dict):
                 # New format with metadata
-                table_data = table_dict["data"]
                 source = table_dict.get("source", "Unknown")
                 table_type = table_dict.get("type", "Unknown")
                 
                 # Display metadata
                 st.caption(f"Source: {source} | Type: {table_type}")
                 
-                # Create DataFrame from data
-                df = pd.DataFrame(table_data)
+                render_table(table_dict, key=f"{table_index}_{table_dict.get('table_id', '')}")
             else:
                 # Fallback for old format (direct list of records)
-                df = pd.DataFrame(table_dict)
-            
-            st.dataframe(df, use_container_width=True)
+                st.dataframe(pd.DataFrame(table_dict), use_container_width=True)
     else:
         st.write("No tables found.")
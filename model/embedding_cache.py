@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import os
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+from states.cache import DiskCache, text_sha256
+
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("DOCSENSE_EMBEDDING_CACHE_MB", "2048")) * 1024 * 1024
+# Tokens sent to the provider in one request; OpenAI rejects embedding requests over 300k.
+EMBED_BATCH_TOKENS = int(os.getenv("DOCSENSE_EMBED_BATCH_TOKENS", "250000"))
+
+_encodings: Dict[str, object] = {}
+
+
+def count_embedding_tokens(model_name: str, text: str) -> int:
+    """Tokens ``text`` costs with ``model_name``'s tokenizer; a generous estimate when tiktoken has none."""
+    if model_name not in _encodings:
+        try:
+            import tiktoken
+
+            _encodings[model_name] = tiktoken.encoding_for_model(model_name)
+        except Exception:
+            _encodings[model_name] = None
+    encoding = _encodings[model_name]
+    if encoding is not None:
+        return len(encoding.encode_ordinary(text))
+    return len(text) // 3 + 1
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Embedding model wrapper that serves repeated texts from an on-disk cache.
+
+    Vectors are keyed by (model name, kind, SHA-256 of the text) and stored as float32
+    bytes. Only cache misses reach the wrapped model, in batches of at most
+    ``embed_batch_size`` texts and ``max_batch_tokens`` tokens, so long chunks never push a
+    request over the provider's limit. Works with any LlamaIndex embedding, e.g.
+    ``MockEmbedding`` for offline use.
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: DiskCache = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+    _max_batch_tokens: int = PrivateAttr(default=EMBED_BATCH_TOKENS)
+    _count_tokens: Callable[[str], int] = PrivateAttr()
+
+    def __init__(
+        self,
+        inner: BaseEmbedding,
+        cache: Optional[DiskCache] = None,
+        embed_batch_size: int = 512,
+        max_batch_tokens: int = EMBED_BATCH_TOKENS,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        **kwargs,
+    ):
+        super().__init__(
+            model_name=getattr(inner, "model_name", "unknown"),
+            embed_batch_size=embed_batch_size,
+            **kwargs,
+        )
+        self._inner = inner
+        self._cache = cache or DiskCache("embeddings", max_bytes=EMBEDDING_CACHE_MAX_BYTES)
+        self._hits = 0
+        self._misses = 0
+        self._max_batch_tokens = max_batch_tokens
+        self._count_tokens = count_tokens or (lambda text: count_embedding_tokens(self.model_name, text))
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self._hits, "misses": self._misses}
+
+    def _key(self, kind: str, text: str) -> str:
+        return f"{self.model_name}:{kind}:{text_sha256(text)}"
+
+    def _lookup(self, kind: str, texts: List[str]):
+        keys = [self._key(kind, text) for text in texts]
+        found = self._cache.get_many(keys)
+        results: List[Optional[List[float]]] = []
+        missing: Dict[str, List[int]] = {}
+        for i, (text, key) in enumerate(zip(texts, keys)):
+            raw = found.get(key)
+            if raw is None:
+                results.append(None)
+                missing.setdefault(text, []).append(i)
+            else:
+                results.append(np.frombuffer(raw, dtype=np.float32).tolist())
+        self._hits += len(texts) - sum(len(v) for v in missing.values())
+        self._misses += len(missing)
+        return results, missing
+
+    def _store(self, kind: str, results, missing, embeddings) -> List[List[float]]:
+        entries = {}
+        for text, embedding in zip(missing, embeddings):
+            entries[self._key(kind, text)] = np.asarray(embedding, dtype=np.float32).tobytes()
+            for i in missing[text]:
+                results[i] = embedding
+        self._cache.set_many(entries)
+        return results
+
+    def _batches(self, texts: List[str]) -> Iterator[List[str]]:
+        """``texts`` in order, split into requests within the text and token limits (an oversized text goes alone)."""
+        batch: List[str] = []
+        tokens = 0
+        for text in texts:
+            n = self._count_tokens(text)
+            if batch and (tokens + n > self._max_batch_tokens or len(batch) >= self.embed_batch_size):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(text)
+            tokens += n
+        if batch:
+            yield batch
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        results, missing = self._lookup("text", texts)
+        if not missing:
+            return results
+        embeddings = []
+        for batch in self._batches(list(missing)):
+            embeddings.extend(self._inner.get_text_embedding_batch(batch))
+        return self._store("text", results, missing, embeddings)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        results, missing = self._lookup("text", texts)
+        if not missing:
+            return results
+        embeddings = []
+        for batch in self._batches(list(missing)):
+            embeddings.extend(await self._inner.aget_text_embedding_batch(batch))
+        return self._store("text", results, missing, embeddings)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        results, missing = self._lookup("query", [query])
+        if not missing:
+            return results[0]
+        return self._store("query", results, missing, [self._inner.get_query_embedding(query)])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        results, missing = self._lookup("query", [query])
+        if not missing:
+            return results[0]
+        return self._store("query", results, missing, [await self._inner.aget_query_embedding(query)])[0]
@@ -1,13 +1,35 @@
-from langchain_openai import ChatOpenAI
-from llama_index.embeddings.openai import OpenAIEmbedding
-import os
 from dotenv import load_dotenv
 
 load_dotenv()
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
-# LLM
-model1 = ChatOpenAI(model="gpt-4o-mini", temperature=0.7, max_tokens=512)
+# Clients are built on first use: importing langchain_openai / llama_index costs seconds,
+# which the API should not pay before it can answer health checks.
+_models = {}
 
-# Embeddings
-model2 = OpenAIEmbedding(model="text-embedding-3-large")
+
+def get_llm():
+    """LLM (``model1``)."""
+    if "model1" not in _models:
+        from langchain_openai import ChatOpenAI
+
+        _models["model1"] = ChatOpenAI(model="gpt-4o-mini", temperature=0.7, max_tokens=512)
+    return _models["model1"]
+
+
+def get_embed_model():
+    """Embeddings (``model2``), cached on disk; misses go to OpenAI in batches bounded by count and tokens."""
+    if "model2" not in _models:
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        from model.embedding_cache import CachedEmbedding
+
+        _models["model2"] = CachedEmbedding(OpenAIEmbedding(model="text-embedding-3-large", embed_batch_size=512))
+    return _models["model2"]
+
+
+def __getattr__(name):
+    # Keeps ``from model.model import model1`` working; it builds the client at that point.
+    if name == "model1":
+        return get_llm()
+    if name == "model2":
+        return get_embed_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+ANN_CENTROIDS_FILE = "ivf_centroids.npy"
+ANN_LISTS_FILE = "ivf_lists.npy"
+ANN_OFFSETS_FILE = "ivf_offsets.npy"
+ANN_META_FILE = "ivf_meta.json"
+
+_ASSIGN_BLOCK = 65536
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by inner product on normalised vectors) for every row, in blocks."""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK):
+        block = np.asarray(vectors[start:start + _ASSIGN_BLOCK], dtype=np.float32)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over L2-normalised vectors.
+
+    Rows are clustered with spherical k-means into ``nlist`` cells; a query scores the
+    centroids, probes the ``nprobe`` closest cells and returns their row ids for exact
+    re-scoring. Higher ``nprobe`` trades latency for recall. Rows appended after the
+    build (ids >= ``rows``) are not covered and must be scanned by the caller.
+    """
+
+    def __init__(self, centroids: np.ndarray, lists: np.ndarray, offsets: np.ndarray, rows: int):
+        self.centroids = centroids
+        self.lists = lists
+        self.offsets = offsets
+        self.rows = rows
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        nlist: int = 0,
+        iterations: int = 10,
+        sample_size: int = 100_000,
+        exclude: Optional[np.ndarray] = None,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """
+        Cluster ``vectors`` (n x d, already normalised). ``nlist=0`` picks ~4*sqrt(n) cells.
+        Rows flagged in the boolean ``exclude`` mask (tombstones) are left out of every list.
+        """
+        n = len(vectors)
+        nlist = nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+
+        sample_idx = np.sort(rng.choice(n, size=min(n, max(sample_size, nlist)), replace=False))
+        sample = np.asarray(vectors[sample_idx], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = _assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty cells from random sample rows so every cell stays useful.
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        labels = _assign(vectors, centroids)
+        row_ids = np.arange(n, dtype=np.int64)
+        if exclude is not None:
+            keep = ~exclude[:n]
+            labels, row_ids = labels[keep], row_ids[keep]
+        order = np.argsort(labels, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+        return cls(centroids.astype(np.float32), row_ids[order], offsets, n)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = self.centroids @ query
+        cells = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self.lists[self.offsets[c]:self.offsets[c + 1]] for c in cells])
+
+    def save(self, directory: str) -> None:
+        """
+        Write every file under a temporary name and move it into place, metadata last. A reader
+        that mapped the previous ``ivf_lists.npy`` keeps its own copy of the old file instead of
+        seeing it rewritten underneath (which ends in SIGBUS).
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, array in (
+            (ANN_CENTROIDS_FILE, self.centroids),
+            (ANN_LISTS_FILE, self.lists),
+            (ANN_OFFSETS_FILE, self.offsets),
+        ):
+            tmp_path = os.path.join(directory, name + ".tmp")
+            with open(tmp_path, "wb") as fh:
+                np.save(fh, array)
+            os.replace(tmp_path, os.path.join(directory, name))
+        tmp_path = os.path.join(directory, ANN_META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"rows": self.rows, "nlist": self.nlist, "listed": int(len(self.lists))}, fh)
+        os.replace(tmp_path, os.path.join(directory, ANN_META_FILE))
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["IVFIndex"]:
+        """The saved index, or None when there is none or its files do not belong together."""
+        meta_path = os.path.join(directory, ANN_META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            index = cls(
+                np.load(os.path.join(directory, ANN_CENTROIDS_FILE)),
+                np.load(os.path.join(directory, ANN_LISTS_FILE), mmap_mode="r"),
+                np.load(os.path.join(directory, ANN_OFFSETS_FILE)),
+                meta["rows"],
+            )
+        except (OSError, ValueError, KeyError):
+            return None
+        consistent = (
+            index.nlist == meta["nlist"]
+            and len(index.offsets) == index.nlist + 1
+            and int(index.offsets[-1]) == len(index.lists) == meta.get("listed", len(index.lists))
+        )
+        return index if consistent else None
+
+    @staticmethod
+    def remove(directory: str) -> None:
+        for name in (ANN_CENTROIDS_FILE, ANN_LISTS_FILE, ANN_OFFSETS_FILE, ANN_META_FILE):
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                os.remove(path)
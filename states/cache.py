@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+CACHE_DIR = os.getenv("DOCSENSE_CACHE_DIR", "cache")
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+class DiskCache:
+    """
+    Small persistent key/value store backed by one SQLite file under CACHE_DIR.
+
+    Entries carry the ``version`` they were written with; lookups ignore entries from
+    other versions and ``invalidate()`` deletes them. Once the stored values exceed
+    ``max_bytes`` the least recently read entries are evicted.
+    """
+
+    def __init__(self, name: str, version: str = "1", max_bytes: int = 512 * 1024 * 1024):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite")
+        self.version = version
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, version TEXT NOT NULL, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE key = ? AND version = ?", (key, self.version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, version, value, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, self.version, sqlite3.Binary(value), len(value), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """Batched ``get``: returns only the keys that were found."""
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE version = ? AND key IN ({marks})",
+                    [self.version, *chunk],
+                ).fetchall()
+                found.update(rows)
+            now = time.time()
+            self._conn.executemany("UPDATE entries SET accessed = ? WHERE key = ?", [(now, k) for k in found])
+            self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(set(keys)) - len(found)
+        return found
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, version, value, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                [(k, self.version, sqlite3.Binary(v), len(v), now) for k, v in items.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def items(self) -> List[tuple]:
+        """Every ``(key, value)`` of the current version, most recently read first (does not count as reads)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, value FROM entries WHERE version = ? ORDER BY accessed DESC", (self.version,)
+            ).fetchall()
+
+    def get_object(self, key: str) -> Any:
+        raw = self.get(key)
+        if raw is None:
+            return None
+        try:
+            return pickle.loads(raw)
+        except Exception:
+            return None
+
+    def set_object(self, key: str, value: Any) -> None:
+        self.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def invalidate(self, version: Optional[str] = None) -> int:
+        """Delete entries written by any version other than ``version`` (default: the current one)."""
+        keep = version or self.version
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM entries WHERE version != ?", (keep,))
+            self._conn.commit()
+            return cur.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "bytes": self.total_bytes()}
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
@@ -16,19 +16,41 @@ class DocState(BaseModel):
     chart_candidates: list = []#
 '''
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import Annotated, List, Dict, Any
 from pydantic import Field
 
+
+def merge_visuals(left: Dict, right: Dict) -> Dict:
+    """Reducer for ``visuals``: parallel branches each add charts, and their lists are concatenated."""
+    merged = dict(left or {})
+    for key, value in (right or {}).items():
+        if isinstance(value, list) and isinstance(merged.get(key), list):
+            merged[key] = merged[key] + value
+        else:
+            merged[key] = value
+    return merged
+
+
 class DocState(BaseModel):
     folder_path: str = ""
+    # Explicit files for this request; when empty the whole folder_path is scanned (batch mode).
+    file_paths: List[str] = Field(default_factory=list)
     documents: List = []
     summary: str = ""
     entities: List[Dict] = []
-    visuals: Dict = {}
+    visuals: Annotated[Dict, merge_visuals] = {}
     user_query: str = ""
     rag_response: str = ""
     use_rag: bool = False
+    # "png" or "svg" chart files, or "spec" to return chart data only.
+    chart_format: str = "png"
     index: Any = None
+    # BM25 index over the same nodes, for hybrid retrieval.
+    keyword_index: Any = None
+    # Set by build_index; keys the semantic cache of RAG answers.
+    index_version: str = ""
+    # Ids of the nodes the RAG answer was generated from.
+    retrieved_node_ids: List[str] = Field(default_factory=list)
     extracted_images: List[str] = Field(default_factory=list)
     image_descriptions: List[str] = Field(default_factory=list)
     extracted_tables: List[Dict] = Field(default_factory=list)
@@ -1,12 +1,136 @@
+import os
+import pickle
+import re
+
 from langsmith import traceable
-import spacy
+from states.cache import DiskCache, text_sha256
 from states.doc_state import DocState
 
-nlp = spacy.load("en_core_web_sm")
+SPACY_MODEL = os.getenv("DOCSENSE_SPACY_MODEL", "en_core_web_sm")
+# Characters per chunk handed to spaCy; paragraphs are packed up to this size.
+ENTITY_CHUNK_CHARS = int(os.getenv("DOCSENSE_ENTITY_CHUNK_CHARS", "10000"))
+ENTITY_BATCH_SIZE = int(os.getenv("DOCSENSE_ENTITY_BATCH_SIZE", "32"))
+# Worker processes for nlp.pipe; only worth it for many uncached chunks.
+ENTITY_PROCESSES = int(os.getenv("DOCSENSE_ENTITY_PROCESSES", "1"))
+# Source offsets kept per distinct entity.
+ENTITY_MAX_OFFSETS = int(os.getenv("DOCSENSE_ENTITY_MAX_OFFSETS", "20"))
+# Bump when the extraction output changes so cached chunk results are not reused.
+ENTITY_VERSION = "1"
+
+# Components NER does not read; not loading them is most of the speed-up over the full pipeline.
+_UNUSED_PIPES = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter", "morphologizer"]
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_nlp = None
+_entity_cache = None
+
+
+def get_nlp():
+    """spaCy pipeline trimmed to NER, loaded on first use (or by the API warm-up) instead of at import."""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        nlp = spacy.load(SPACY_MODEL, exclude=_UNUSED_PIPES)
+        # In the small English models NER embeds its own tok2vec; the shared one only fed the excluded pipes.
+        if "tok2vec" in nlp.pipe_names and not getattr(nlp.get_pipe("tok2vec"), "listening_components", True):
+            nlp.remove_pipe("tok2vec")
+        _nlp = nlp
+    return _nlp
+
+
+def _get_entity_cache():
+    global _entity_cache
+    if _entity_cache is None:
+        import spacy
+        _entity_cache = DiskCache("entities", version=f"{ENTITY_VERSION}:{SPACY_MODEL}:{spacy.__version__}")
+    return _entity_cache
+
+
+def split_chunks(text, max_chars=ENTITY_CHUNK_CHARS):
+    """
+    ``(offset, chunk)`` pairs covering ``text``: paragraphs packed up to ``max_chars``.
+    Longer paragraphs are cut at sentence ends, and sentences that are still too long are hard-cut.
+    """
+    pieces, pos = [], 0
+    for para in re.split(r"(\n\s*\n)", text):
+        if len(para) <= max_chars:
+            pieces.append((pos, para))
+        else:
+            start = pos
+            for sentence in _SENTENCE_END.split(para):
+                begin = text.index(sentence, start) if sentence else start
+                for cut in range(0, len(sentence), max_chars):
+                    pieces.append((begin + cut, sentence[cut:cut + max_chars]))
+                start = begin + len(sentence)
+        pos += len(para)
+
+    chunks, chunk_start, chunk_end = [], None, 0
+    for offset, piece in pieces:
+        if chunk_start is not None and offset + len(piece) - chunk_start > max_chars:
+            chunks.append((chunk_start, text[chunk_start:chunk_end]))
+            chunk_start = None
+        if chunk_start is None:
+            chunk_start = offset
+        chunk_end = offset + len(piece)
+    if chunk_start is not None:
+        chunks.append((chunk_start, text[chunk_start:chunk_end]))
+    return [(offset, chunk) for offset, chunk in chunks if chunk.strip()]
+
+
+def extract_chunk_entities(chunks, n_process=ENTITY_PROCESSES):
+    """
+    ``[(text, label, start, end), ...]`` per chunk, offsets relative to the chunk.
+    Chunks seen before (same text, model and ENTITY_VERSION) come from the cache.
+    """
+    cache = _get_entity_cache()
+    keys = [text_sha256(chunk) for chunk in chunks]
+    found = cache.get_many(list(set(keys)))
+    results = [pickle.loads(found[k]) if k in found else None for k in keys]
+
+    todo = {}
+    for i, key in enumerate(keys):
+        if results[i] is None:
+            todo.setdefault(key, []).append(i)
+    if todo:
+        nlp = get_nlp()
+        firsts = [positions[0] for positions in todo.values()]
+        processes = n_process if len(firsts) > ENTITY_BATCH_SIZE else 1
+        docs = nlp.pipe((chunks[i] for i in firsts), batch_size=ENTITY_BATCH_SIZE, n_process=processes)
+        fresh = {}
+        for key, doc in zip(todo, docs):
+            fresh[key] = [(e.text, e.label_, e.start_char, e.end_char) for e in doc.ents]
+            for i in todo[key]:
+                results[i] = fresh[key]
+        cache.set_many({key: pickle.dumps(value) for key, value in fresh.items()})
+    return results
+
+
+def extract_entities(documents):
+    """
+    Entities of ``documents`` deduplicated by (text, label), most frequent first, each
+    with its count and up to ENTITY_MAX_OFFSETS source offsets (document, start, end).
+    """
+    spans = []
+    for doc_index, doc in enumerate(documents):
+        text = doc.text or ""
+        source = (doc.metadata or {}).get("filename", "")
+        spans.extend((doc_index, source, offset, chunk) for offset, chunk in split_chunks(text))
+
+    merged = {}
+    found = extract_chunk_entities([chunk for _, _, _, chunk in spans])
+    for (doc_index, source, offset, _), ents in zip(spans, found):
+        for text, label, start, end in ents:
+            key = (" ".join(text.split()), label)
+            entry = merged.setdefault(key, {"text": key[0], "label": label, "count": 0, "offsets": []})
+            entry["count"] += 1
+            if len(entry["offsets"]) < ENTITY_MAX_OFFSETS:
+                entry["offsets"].append(
+                    {"doc": doc_index, "source": source, "start": offset + start, "end": offset + end}
+                )
+    return sorted(merged.values(), key=lambda e: e["count"], reverse=True)
+
 
 @traceable(name="entity_extractor")
 def EntityExtractor(state: DocState):
-    text = state.rag_response or state.summary or " ".join([doc.text for doc in state.documents])
-    doc = nlp(text)
-    state.entities = [{"text": e.text, "label": e.label_} for e in doc.ents]
-    return state
+    # Runs in parallel with summarization, so it reads the loaded documents rather than the summary.
+    return {"entities": extract_entities(state.documents)}
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Sequence, Tuple
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from states.keyword_index import BM25Index
+
+RAG_TOP_K = int(os.getenv("DOCSENSE_RAG_TOP_K", "3"))
+# "hybrid" fuses BM25 and vector rankings; "vector" uses embeddings only.
+RETRIEVAL_MODE = os.getenv("DOCSENSE_RETRIEVAL", "hybrid")
+# Candidates taken from each ranking before fusion.
+HYBRID_CANDIDATES = int(os.getenv("DOCSENSE_HYBRID_CANDIDATES", "20"))
+# Reciprocal-rank-fusion constant; larger values flatten the lead of the top ranks.
+RRF_K = int(os.getenv("DOCSENSE_RRF_K", "60"))
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Ids from several best-first rankings, ordered by the sum of ``1 / (k + rank)`` over the rankings."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, start=1):
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Top ``similarity_top_k`` nodes by reciprocal-rank fusion of the vector index's and the
+    BM25 index's best ``candidates`` each. Ranks, not scores, are fused, so the two scales
+    need no calibration. Node scores are the fused RRF scores.
+    """
+
+    def __init__(
+        self,
+        index,
+        keywords: BM25Index,
+        similarity_top_k: int = RAG_TOP_K,
+        candidates: int = HYBRID_CANDIDATES,
+        rrf_k: int = RRF_K,
+    ):
+        super().__init__()
+        self._index = index
+        self._keywords = keywords
+        self._top_k = similarity_top_k
+        self._candidates = max(candidates, similarity_top_k)
+        self._rrf_k = rrf_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        dense = self._index.as_retriever(similarity_top_k=self._candidates).retrieve(query_bundle)
+        sparse = self._keywords.search(query_bundle.query_str, self._candidates)
+        fused = reciprocal_rank_fusion(
+            [[n.node.node_id for n in dense], [node_id for node_id, _ in sparse]], self._rrf_k
+        )[: self._top_k]
+
+        nodes = {n.node.node_id: n.node for n in dense}
+        missing = [node_id for node_id, _ in fused if node_id not in nodes]
+        if missing:
+            nodes.update((node.node_id, node) for node in self._index.docstore.get_nodes(missing, raise_error=False))
+        return [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in fused if node_id in nodes]
+
+
+def get_retriever(index, keywords=None, similarity_top_k: int = RAG_TOP_K) -> BaseRetriever:
+    """Hybrid retriever when a keyword index is available and RETRIEVAL_MODE allows it, else vector-only."""
+    if RETRIEVAL_MODE == "hybrid" and keywords is not None and len(keywords):
+        return HybridRetriever(index, keywords, similarity_top_k=similarity_top_k)
+    return index.as_retriever(similarity_top_k=similarity_top_k)
@@ -1,21 +1,282 @@
 from langsmith import traceable
-from llama_index.core import VectorStoreIndex, StorageContext
-from model.model import model2
+from model.model import get_embed_model
+from states.cache import text_sha256
 from states.doc_state import DocState
 import os
+import threading
+from contextlib import contextmanager
 
 PERSIST_DIR = "./index_storage"
+# Docstore and index store rows (states.sqlite_docstore); replaces LlamaIndex's docstore.json / index_store.json.
+KV_STORE_FILE = "docstore.sqlite"
+# Changes every time the persisted index does; answers cached against an older version are dropped.
+INDEX_VERSION_FILE = "index_version"
+# Held while an index is opened, synced and persisted; see index_lock.
+INDEX_LOCK_FILE = ".lock"
+# float16 halves the vector file at a small precision cost.
+VECTOR_DTYPE = os.getenv("DOCSENSE_VECTOR_DTYPE", "float32")
+# "ivf" switches retrieval to the approximate IVF index once the store is large enough.
+VECTOR_STORE_OPTIONS = {
+    "ann_mode": os.getenv("DOCSENSE_ANN", "exact"),
+    "ann_nlist": int(os.getenv("DOCSENSE_ANN_NLIST", "0")),
+    "ann_nprobe": int(os.getenv("DOCSENSE_ANN_NPROBE", "8")),
+    "ann_min_rows": int(os.getenv("DOCSENSE_ANN_MIN_ROWS", "20000")),
+}
+# Documents chunked, embedded and inserted together; bounds how many nodes/embeddings are in flight.
+INDEX_BATCH_SIZE = int(os.getenv("DOCSENSE_INDEX_BATCH_SIZE", "64"))
+
+# Metadata that locates a Document inside its source file.
+_POSITION_KEYS = ("type", "sheet", "page", "slide", "image_index", "table_index")
+
+
+def with_doc_ids(documents):
+    """
+    Give every Document a deterministic id derived from its filename and position in the file,
+    so a re-upload maps onto the same docstore entries and only changed content is re-embedded.
+    Works on any iterable and yields the Documents as they come, so a stream is never materialized.
+    """
+    seen = {}
+    for doc in documents:
+        meta = doc.metadata or {}
+        position = "|".join(str(meta.get(k, "")) for k in ("filename",) + _POSITION_KEYS)
+        ordinal = seen.get(position, 0)
+        seen[position] = ordinal + 1
+        doc.id_ = text_sha256(f"{position}#{ordinal}")
+        yield doc
+
+
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert_batch(index, documents, keywords=None):
+    """Chunk, embed and insert a batch of Documents in one go (``index.insert`` does it one Document at a time)."""
+    if not documents:
+        return
+    from llama_index.core.ingestion import run_transformations
+
+    nodes = run_transformations(documents, index._transformations)
+    index.insert_nodes(nodes)
+    if keywords is not None:
+        keywords.add_nodes(nodes)
+    for doc in documents:
+        index.docstore.set_document_hash(doc.doc_id, doc.hash)
+    # Spill this batch's vectors to disk instead of keeping every pending embedding in memory.
+    flush = getattr(index.vector_store, "flush", None)
+    if flush is not None:
+        flush()
+
+
+def _delete_document(index, keywords, ref_doc_id):
+    index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+    if keywords is not None:
+        keywords.delete(ref_doc_id)
+
+
+def sync_documents(index, documents, full_sync=False, batch_size=None, keywords=None):
+    """
+    Upsert ``documents`` into an index by comparing content hashes with the docstore.
+
+    ``documents`` may be any iterable (e.g. ``states.loader.iter_documents``); it is consumed
+    ``batch_size`` Documents at a time (default INDEX_BATCH_SIZE), and each batch is chunked,
+    embedded and inserted before the next is read. New documents are inserted, changed ones
+    re-embedded, and stored documents that belong to the same files but are no longer produced
+    are deleted. With ``full_sync`` every stored document missing from ``documents`` is deleted
+    (folder batch mode). A ``keywords`` BM25Index receives the same inserts and deletes.
+    Returns (added, updated, deleted) counts.
+    """
+    docstore = index.storage_context.docstore
+    added = updated = 0
+    incoming = set()
+    filenames = set()
+
+    for batch in _batched(documents, batch_size or INDEX_BATCH_SIZE):
+        to_insert = []
+        for doc in batch:
+            incoming.add(doc.doc_id)
+            filenames.add((doc.metadata or {}).get("filename"))
+            stored_hash = docstore.get_document_hash(doc.doc_id)
+            if stored_hash is None:
+                to_insert.append(doc)
+                added += 1
+            elif stored_hash != doc.hash:
+                _delete_document(index, keywords, doc.doc_id)
+                to_insert.append(doc)
+                updated += 1
+        _insert_batch(index, to_insert, keywords)
+
+    deleted = 0
+    for ref_doc_id, info in list(index.ref_doc_info.items()):
+        if ref_doc_id in incoming:
+            continue
+        if full_sync or (info.metadata or {}).get("filename") in filenames:
+            _delete_document(index, keywords, ref_doc_id)
+            deleted += 1
+
+    return added, updated, deleted
+
+
+_index_lock = threading.Lock()
+
+
+@contextmanager
+def index_lock():
+    """
+    Serializes index updates across threads and, through a lock file, across worker processes.
+
+    The vector store, docstore and keyword index each persist their own view of the files:
+    two writers that opened the same version would each drop the other's rows. Opening,
+    syncing and persisting under one lock makes every writer start from the last one's result.
+    """
+    from filelock import FileLock
+
+    os.makedirs(PERSIST_DIR, exist_ok=True)
+    with _index_lock, FileLock(os.path.join(PERSIST_DIR, INDEX_LOCK_FILE)):
+        yield
+
+
+def index_version():
+    """Id of the persisted index's current contents ("" for an index persisted before versions were kept)."""
+    try:
+        with open(os.path.join(PERSIST_DIR, INDEX_VERSION_FILE), encoding="utf-8") as fh:
+            return fh.read().strip()
+    except OSError:
+        return ""
+
+
+def _bump_index_version():
+    import uuid
+
+    version = uuid.uuid4().hex
+    path = os.path.join(PERSIST_DIR, INDEX_VERSION_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        fh.write(version)
+    os.replace(path + ".tmp", path)
+    return version
+
+
+def _open_stores():
+    """Docstore and index store over ``KV_STORE_FILE``; JSON stores left by earlier versions are imported first."""
+    from states.sqlite_docstore import SQLiteDocumentStore, SQLiteIndexStore, SQLiteKVStore
 
-@traceable(name="indexer")
-def build_index(state: DocState) -> DocState:
     os.makedirs(PERSIST_DIR, exist_ok=True)
-    if os.path.exists(os.path.join(PERSIST_DIR, "storage.json")):
-        storage_context = StorageContext.from_defaults(persist_dir=PERSIST_DIR)
-        index = VectorStoreIndex.load_from_storage(storage_context)
-        print("✅ Loaded existing index.")
-    else:
-        index = VectorStoreIndex.from_documents(state.documents, embed_model=model2)
+    kvstore = SQLiteKVStore(os.path.join(PERSIST_DIR, KV_STORE_FILE))
+    kvstore.import_json_stores(PERSIST_DIR)
+    return SQLiteDocumentStore(kvstore), SQLiteIndexStore(kvstore)
+
+
+def _open_index():
+    """``(index, existed)``: the persisted index, or a new empty one backed by NumpyVectorStore."""
+    from llama_index.core import VectorStoreIndex, StorageContext, load_index_from_storage
+    from states.vector_store import NumpyVectorStore
+
+    model2 = get_embed_model()
+    docstore, index_store = _open_stores()
+    if index_store.has_index():
+        storage_context = StorageContext.from_defaults(
+            docstore=docstore,
+            index_store=index_store,
+            vector_store=NumpyVectorStore.from_persist_dir(PERSIST_DIR, dtype=VECTOR_DTYPE, **VECTOR_STORE_OPTIONS),
+        )
+        return load_index_from_storage(storage_context, embed_model=model2), True
+    storage_context = StorageContext.from_defaults(
+        docstore=docstore,
+        index_store=index_store,
+        vector_store=NumpyVectorStore(persist_dir=PERSIST_DIR, dtype=VECTOR_DTYPE, **VECTOR_STORE_OPTIONS),
+    )
+    return VectorStoreIndex(nodes=[], storage_context=storage_context, embed_model=model2), False
+
+
+def open_index():
+    """
+    The persisted index, or a new empty one backed by NumpyVectorStore. Docstore writes
+    stay uncommitted until ``index.storage_context.persist``.
+    """
+    return _open_index()[0]
+
+
+def open_keyword_index(index):
+    """The BM25 index persisted beside ``index``; built from the docstore's nodes when there is none yet."""
+    from states.keyword_index import KEYWORD_META_FILE, BM25Index
+
+    existed = os.path.exists(os.path.join(PERSIST_DIR, KEYWORD_META_FILE))
+    keywords = BM25Index.from_persist_dir(PERSIST_DIR)
+    if not existed and index.docstore.docs:
+        keywords.add_nodes(index.docstore.docs.values())
+    return keywords
+
+
+def index_paths(paths, full_sync=False, batch_size=None):
+    """
+    Load and index files without holding the corpus in memory.
+
+    Documents stream out of ``states.loader.iter_documents`` file by file and go into the
+    index ``batch_size`` at a time, so peak memory follows the batch size (plus the
+    docstore), not the number of files. Returns (added, updated, deleted).
+    """
+    from states.loader import iter_documents
+
+    with index_lock():
+        index = open_index()
+        keywords = open_keyword_index(index)
+        try:
+            counts = sync_documents(
+                index, with_doc_ids(iter_documents(paths)), full_sync=full_sync, batch_size=batch_size, keywords=keywords
+            )
+        except Exception:
+            index.docstore.rollback()
+            raise
         index.storage_context.persist(persist_dir=PERSIST_DIR)
-        print("✅ Built and persisted new index.")
-    state.index = index
-    return state
+        keywords.persist()
+        if any(counts):
+            _bump_index_version()
+    return counts
+
+
+@traceable(name="indexer")
+def build_index(state: DocState):
+    # Runs on its own branch next to summarize/entities/charts; only RAG requests need an index.
+    if not state.use_rag:
+        return {}
+
+    with index_lock():
+        index, existed = _open_index()
+        keywords = open_keyword_index(index)
+        try:
+            added, updated, deleted = sync_documents(
+                index, with_doc_ids(state.documents), full_sync=not state.file_paths, keywords=keywords
+            )
+        except Exception:
+            index.docstore.rollback()
+            raise
+        version = index_version()
+        if added or updated or deleted or not existed:
+            index.storage_context.persist(persist_dir=PERSIST_DIR)
+            version = _bump_index_version()
+        else:
+            # Nothing changed; still end any open transaction so the next writer is not blocked.
+            index.docstore.persist()
+        # Also writes a keyword index just built from an existing docstore.
+        keywords.persist()
+    print(f"✅ {'Loaded existing' if existed else 'Built new'} index (+{added} new, ~{updated} changed, -{deleted} removed).")
+    return {"index": index, "keyword_index": keywords, "index_version": version}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Index a folder of documents in bounded batches.")
+    parser.add_argument("folder")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--full-sync", action="store_true", help="also delete indexed files missing from the folder")
+    args = parser.parse_args()
+    files = sorted(os.path.join(args.folder, f) for f in os.listdir(args.folder))
+    added, updated, deleted = index_paths([f for f in files if os.path.isfile(f)], args.full_sync, args.batch_size)
+    print(f"+{added} new, ~{updated} changed, -{deleted} removed")
@@ -0,0 +1,266 @@
+"""
+BM25 keyword index over the nodes of the vector index, persisted beside it in ``index_storage``.
+
+Embeddings rank exact identifiers (invoice numbers, part codes, names from extracted tables)
+poorly; term postings match them directly. ``states.hybrid_retriever`` fuses both rankings.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import uuid
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+KEYWORD_META_FILE = "bm25_meta.json"
+_SEGMENT_PREFIX = "bm25_segment_"
+
+BM25_K1 = float(os.getenv("DOCSENSE_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("DOCSENSE_BM25_B", "0.75"))
+
+# Merge all segments into one once there are this many, or once this share of rows are tombstones.
+_MAX_SEGMENTS = 8
+_COMPACT_RATIO = 0.3
+
+_TOKEN_RE = re.compile(r"[^\W_]+(?:[-_./:#][^\W_]+)*")
+_PART_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Codes joined by ``- _ . / : #`` (``INV-2023-0042``, ``v1.2``) are
+    kept whole and also split into their parts, so both the exact code and its pieces match.
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_PART_RE.findall(token))
+    return tokens
+
+
+def _decode_rows(gaps: np.ndarray, offsets: np.ndarray, firsts: np.ndarray) -> np.ndarray:
+    """Row numbers of every posting from per-term first rows and the gaps within each term."""
+    if not len(gaps):
+        return np.zeros(0, dtype=np.int32)
+    rows = np.cumsum(gaps, dtype=np.int64)
+    starts = offsets[:-1]
+    # Restart the running sum at each term's first row.
+    rows += np.repeat(firsts - rows[starts], np.diff(offsets))
+    return rows.astype(np.int32)
+
+
+class BM25Index:
+    """
+    Inverted index of node texts scored with BM25.
+
+    Postings are stored in segments: each ``persist`` writes the postings added since the
+    previous one as a new ``.npz``, so adding documents never rewrites what is already on
+    disk. A segment holds a newline-joined term list, per-term offsets and first rows, the
+    gaps between a term's rows (uint16 unless a gap needs more) and term frequencies
+    capped at 255 (uint8; BM25 has long saturated by then): about 3 bytes per posting,
+    uncompressed so it loads without inflating. Node ids, ref doc ids, token counts and
+    tombstones live in a JSON sidecar, as for ``NumpyVectorStore``. Deletes are tombstones
+    until enough accumulate (or segments pile up) and everything is merged into one segment.
+    """
+
+    def __init__(self, persist_dir: str, k1: float = BM25_K1, b: float = BM25_B):
+        self.persist_dir = persist_dir
+        self.k1 = k1
+        self.b = b
+        self._ids: List[str] = []
+        self._ref_doc_ids: List[Optional[str]] = []
+        self._lengths = array("i")
+        self._deleted: Set[int] = set()
+        self._row_by_id: Dict[str, int] = {}
+        self._segments: List[str] = []
+        # Segments merged away by _compact, removed once the metadata no longer lists them.
+        self._obsolete: List[str] = []
+        # term -> (rows, tfs) slices, one per segment
+        self._postings: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+        # term -> (rows, tfs) added since the last persist
+        self._pending: Dict[str, Tuple[array, array]] = {}
+        self._dirty = False
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, **kwargs) -> "BM25Index":
+        index = cls(persist_dir, **kwargs)
+        if os.path.exists(os.path.join(persist_dir, KEYWORD_META_FILE)):
+            index._load()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._deleted)
+
+    def _load(self) -> None:
+        with open(os.path.join(self.persist_dir, KEYWORD_META_FILE), "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        self._ids = meta["ids"]
+        self._ref_doc_ids = meta["ref_doc_ids"]
+        self._lengths = array("i", meta["lengths"])
+        self._deleted = set(meta["deleted"])
+        self._row_by_id = {node_id: row for row, node_id in enumerate(self._ids) if row not in self._deleted}
+        self._segments = meta["segments"]
+        for name in self._segments:
+            with np.load(os.path.join(self.persist_dir, name)) as data:
+                blob = data["terms"].tobytes().decode("utf-8")
+                offsets, firsts, tfs = data["offsets"], data["firsts"], data["tfs"]
+                rows = _decode_rows(data["gaps"], offsets, firsts)
+            for i, term in enumerate(blob.split("\n") if blob else []):
+                start, end = offsets[i], offsets[i + 1]
+                self._postings.setdefault(term, []).append((rows[start:end], tfs[start:end]))
+
+    def add(self, node_id: str, ref_doc_id: Optional[str], text: str) -> None:
+        if node_id in self._row_by_id:
+            self._deleted.add(self._row_by_id[node_id])
+        row = len(self._ids)
+        self._row_by_id[node_id] = row
+        self._ids.append(node_id)
+        self._ref_doc_ids.append(ref_doc_id)
+        counts = Counter(tokenize(text or ""))
+        self._lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            rows, tfs = self._pending.setdefault(term, (array("i"), array("i")))
+            rows.append(row)
+            tfs.append(tf)
+        self._dirty = True
+
+    def add_nodes(self, nodes: Iterable) -> None:
+        from llama_index.core.schema import MetadataMode
+
+        for node in nodes:
+            self.add(node.node_id, node.ref_doc_id, node.get_content(metadata_mode=MetadataMode.NONE))
+
+    def delete(self, ref_doc_id: str) -> None:
+        for row, rid in enumerate(self._ref_doc_ids):
+            if rid == ref_doc_id and row not in self._deleted:
+                self._deleted.add(row)
+                self._row_by_id.pop(self._ids[row], None)
+                self._dirty = True
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        parts = list(self._postings.get(term, []))
+        if term in self._pending:
+            rows, tfs = self._pending[term]
+            parts.append((np.frombuffer(rows, dtype=np.intc), np.frombuffer(tfs, dtype=np.intc)))
+        if not parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Up to ``top_k`` ``(node_id, score)`` pairs, best first; nodes sharing no term with ``query`` are left out."""
+        live = len(self)
+        if not live or top_k <= 0:
+            return []
+        lengths = np.frombuffer(self._lengths, dtype=np.intc).astype(np.float32)
+        alive = np.ones(len(self._ids), dtype=bool)
+        if self._deleted:
+            alive[list(self._deleted)] = False
+        avgdl = float(lengths[alive].mean()) or 1.0
+
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            rows, tfs = self._term_postings(term)
+            keep = alive[rows]
+            rows, tfs = rows[keep], tfs[keep].astype(np.float32)
+            if not len(rows):
+                continue
+            idf = math.log(1 + (live - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[rows] / avgdl)
+            # A node appears once per term, so the indexed add does not drop repeats.
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        k = min(top_k, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[row], float(scores[row])) for row in top]
+
+    def _write_segment(self, postings: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> Optional[str]:
+        terms = sorted(t for t, (rows, _) in postings.items() if len(rows))
+        if not terms:
+            return None
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[t][0]) for t in terms])
+        rows = np.concatenate([postings[t][0] for t in terms]).astype(np.int32)
+        tfs = np.minimum(np.concatenate([postings[t][1] for t in terms]), 255).astype(np.uint8)
+        blob = np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8)
+        firsts = rows[offsets[:-1]]
+        gaps = np.diff(rows, prepend=0)
+        gaps[offsets[:-1]] = 0
+        gaps = gaps.astype(np.uint16 if gaps.max() <= np.iinfo(np.uint16).max else np.uint32)
+
+        name = f"{_SEGMENT_PREFIX}{uuid.uuid4().hex[:12]}.npz"
+        tmp_path = os.path.join(self.persist_dir, name + ".tmp")
+        with open(tmp_path, "wb") as fh:
+            np.savez(fh, terms=blob, offsets=offsets, firsts=firsts, gaps=gaps, tfs=tfs)
+        os.replace(tmp_path, os.path.join(self.persist_dir, name))
+        start = 0
+        for term, end in zip(terms, offsets[1:]):
+            self._postings.setdefault(term, []).append((rows[start:end], tfs[start:end]))
+            start = end
+        return name
+
+    def _compact(self) -> None:
+        """Merge every segment and pending posting into one segment of live rows, renumbered."""
+        live = [row for row in range(len(self._ids)) if row not in self._deleted]
+        renumber = np.full(len(self._ids), -1, dtype=np.int64)
+        renumber[live] = np.arange(len(live))
+        merged = {}
+        for term in set(self._postings) | set(self._pending):
+            rows, tfs = self._term_postings(term)
+            keep = renumber[rows] >= 0
+            merged[term] = (renumber[rows[keep]], tfs[keep])
+
+        self._postings, self._pending = {}, {}
+        self._ids = [self._ids[row] for row in live]
+        self._ref_doc_ids = [self._ref_doc_ids[row] for row in live]
+        self._lengths = array("i", (self._lengths[row] for row in live))
+        self._row_by_id = {node_id: row for row, node_id in enumerate(self._ids)}
+        self._deleted = set()
+        name = self._write_segment(merged)
+        self._obsolete.extend(self._segments)
+        self._segments = [name] if name else []
+
+    def persist(self) -> None:
+        if not self._dirty:
+            return
+        os.makedirs(self.persist_dir, exist_ok=True)
+        if len(self._deleted) > _COMPACT_RATIO * max(len(self._ids), 1) or len(self._segments) >= _MAX_SEGMENTS:
+            self._compact()
+        elif self._pending:
+            pending = {t: (np.frombuffer(r, dtype=np.intc), np.frombuffer(f, dtype=np.intc))
+                       for t, (r, f) in self._pending.items()}
+            self._pending = {}
+            name = self._write_segment(pending)
+            if name:
+                self._segments.append(name)
+
+        meta = {
+            "ids": self._ids,
+            "ref_doc_ids": self._ref_doc_ids,
+            "lengths": self._lengths.tolist(),
+            "deleted": sorted(self._deleted),
+            "segments": self._segments,
+        }
+        tmp_path = os.path.join(self.persist_dir, KEYWORD_META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp_path, os.path.join(self.persist_dir, KEYWORD_META_FILE))
+        for name in self._obsolete:
+            try:
+                os.remove(os.path.join(self.persist_dir, name))
+            except OSError:
+                pass
+        self._obsolete = []
+        self._dirty = False
@@ -1,67 +1,179 @@
-
-
 from __future__ import annotations
 
+import importlib
 import os
 import tempfile
 import zipfile
-from typing import Any, Dict, Iterable, List
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List
 
 from langsmith import traceable
-from llama_index.core import Document
 
+from states.cache import DiskCache, file_sha256
 from states.doc_state import DocState
-from states.loaders.csv_loader import load_csv
-from states.loaders.docx_loader import load_docx
-from states.loaders.excel_loader import load_excel
-from states.loaders.image_loader import load_image
-from states.loaders.pdf_loader import load_pdf
-from states.loaders.pptx_loader import load_pptx
-from states.loaders.txt_loader import load_txt
+from states.progress import emit
+from states.table_store import table_exists
 
+if TYPE_CHECKING:
+    from llama_index.core import Document
 
-@traceable(name="loader")
-def Loader(state: DocState) -> DocState:
 
-    folder = state.folder_path or "uploaded_docs"
-    os.makedirs(folder, exist_ok=True)
+# Bump whenever a loader changes what it extracts; older cache entries are then ignored and purged.
+LOADER_VERSION = "4"
+EXTRACTION_CACHE_ENABLED = os.getenv("DOCSENSE_EXTRACTION_CACHE", "1") != "0"
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("DOCSENSE_EXTRACTION_CACHE_MB", "1024")) * 1024 * 1024
+
+_extraction_cache: DiskCache | None = None
+
+
+def get_extraction_cache() -> DiskCache:
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = DiskCache("extraction", version=LOADER_VERSION, max_bytes=EXTRACTION_CACHE_MAX_BYTES)
+        _extraction_cache.invalidate()
+    return _extraction_cache
+
 
-    artifacts: Dict[str, List[Any]] = {
+def _new_artifacts() -> Dict[str, List[Any]]:
+    return {
         "extracted_images": [],
         "image_descriptions": [],
         "image_insights": [],
         "extracted_tables": [],
     }
-    all_docs: List[Document] = []
-
-    for file in sorted(os.listdir(folder)):
-        full_path = os.path.join(folder, file)
-        if os.path.isdir(full_path):
-            continue
-
-        lower = file.lower()
-        try:
-            if lower.endswith(".pdf"):
-                docs = load_pdf(full_path, file, artifacts)
-            elif lower.endswith(".docx"):
-                docs = load_docx(full_path, file, artifacts)
-            elif lower.endswith((".pptx", ".ppt")):
-                docs = load_pptx(full_path, file, artifacts)
-            elif lower.endswith(".txt"):
-                docs = load_txt(full_path, file)
-            elif lower.endswith(".csv"):
-                docs = load_csv(full_path, file, artifacts)
-            elif lower.endswith((".xls", ".xlsx")):
-                docs = load_excel(full_path, file, artifacts)
-            elif lower.endswith((".png", ".jpg", ".jpeg")):
-                docs = load_image(full_path, file, artifacts)
+
+
+def _retarget(docs: List[Document], artifacts: Dict[str, List[Any]], old: str, new: str) -> None:
+    """Cached output was produced under another filename; point it at the current one."""
+    if old == new:
+        return
+    for doc in docs:
+        doc.set_content(doc.text.replace(f"Filename:{old}", f"Filename:{new}"))
+        if doc.metadata.get("filename") == old:
+            doc.metadata["filename"] = new
+    for table in artifacts["extracted_tables"]:
+        if isinstance(table, dict) and table.get("source") == old:
+            table["source"] = new
+
+
+def _artifacts_exist(artifacts: Dict[str, List[Any]]) -> bool:
+    tables = [t["table_id"] for t in artifacts["extracted_tables"] if isinstance(t, dict) and t.get("table_id")]
+    return all(os.path.exists(p) for p in artifacts["extracted_images"]) and all(map(table_exists, tables))
+
+
+def load_file_cached(full_path: str, artifacts: Dict[str, List[Any]]) -> List[Document]:
+    """
+    ``load_file`` behind a content-addressed cache keyed by the file's SHA-256 and LOADER_VERSION.
+
+    A hit restores both the Documents and the artifacts the loader produced, skipping
+    text extraction, OCR, table detection and vision calls entirely.
+    """
+    if not EXTRACTION_CACHE_ENABLED:
+        return load_file(full_path, artifacts)
+
+    file = os.path.basename(full_path)
+    try:
+        key = f"{file_sha256(full_path)}:{os.path.splitext(file)[1].lower()}"
+    except OSError as e:
+        print(f"Error hashing {file}: {e}")
+        return load_file(full_path, artifacts)
+
+    cache = get_extraction_cache()
+    entry = cache.get_object(key)
+    # Images and stored tables live on disk; a hit is only usable while they still exist.
+    if entry and _artifacts_exist(entry["artifacts"]):
+        docs, file_artifacts = entry["docs"], entry["artifacts"]
+        _retarget(docs, file_artifacts, entry["filename"], file)
+    else:
+        file_artifacts = _new_artifacts()
+        docs = load_file(full_path, file_artifacts)
+        if docs:
+            cache.set_object(key, {"filename": file, "docs": docs, "artifacts": file_artifacts})
+
+    for name, values in file_artifacts.items():
+        artifacts[name].extend(values)
+    return docs
+
+
+# Extension -> (module, function, takes artifacts). Loader modules are imported on first use,
+# so a text upload never pays for PyMuPDF, pandas or python-pptx.
+_LOADERS = {
+    ".pdf": ("states.loaders.pdf_loader", "load_pdf", True),
+    ".docx": ("states.loaders.docx_loader", "load_docx", True),
+    ".pptx": ("states.loaders.pptx_loader", "load_pptx", True),
+    ".ppt": ("states.loaders.pptx_loader", "load_pptx", True),
+    ".txt": ("states.loaders.txt_loader", "load_txt", False),
+    ".csv": ("states.loaders.csv_loader", "load_csv", True),
+    ".xls": ("states.loaders.excel_loader", "load_excel", True),
+    ".xlsx": ("states.loaders.excel_loader", "load_excel", True),
+    ".png": ("states.loaders.image_loader", "load_image", True),
+    ".jpg": ("states.loaders.image_loader", "load_image", True),
+    ".jpeg": ("states.loaders.image_loader", "load_image", True),
+}
+_DEFAULT_LOADER = _LOADERS[".txt"]
+
+
+def get_loader(ext: str) -> tuple[Callable[..., List[Document]], bool]:
+    """Loader function for ``ext`` (lower-case, with dot) and whether it takes the artifacts dict."""
+    module, name, takes_artifacts = _LOADERS.get(ext, _DEFAULT_LOADER)
+    return getattr(importlib.import_module(module), name), takes_artifacts
+
+
+def load_file(full_path: str, artifacts: Dict[str, List[Any]]) -> List[Document]:
+    """Dispatch a single file to its format-specific loader."""
+    file = os.path.basename(full_path)
+    try:
+        loader, takes_artifacts = get_loader(os.path.splitext(file)[1].lower())
+        if takes_artifacts:
+            return loader(full_path, file, artifacts)
+        return loader(full_path, file)
+    except Exception as e:
+        print(f"Error processing {file}: {e}")
+        return []
+
+
+def resolve_paths(state: DocState) -> List[str]:
+    """
+    Files to load for this request.
+
+    Job mode: ``state.file_paths`` lists exactly the files uploaded with the request.
+    Batch mode: no explicit files, so every file directly under ``state.folder_path`` is loaded.
+    """
+    if state.file_paths:
+        paths = []
+        for path in state.file_paths:
+            if os.path.isfile(path):
+                paths.append(path)
             else:
-                docs = load_txt(full_path, file)
-        except Exception as e:
-            print(f"Error processing {file}: {e}")
-            docs = []
-        
-        all_docs.extend(docs)
+                print(f"Skipping missing file {path}")
+        return paths
+
+    folder = state.folder_path or "uploaded_docs"
+    os.makedirs(folder, exist_ok=True)
+    return [
+        os.path.join(folder, file)
+        for file in sorted(os.listdir(folder))
+        if not os.path.isdir(os.path.join(folder, file))
+    ]
+
+
+def iter_documents(paths: List[str], artifacts: Dict[str, List[Any]] | None = None) -> Iterator[Document]:
+    """
+    Yield Documents file by file as each file is loaded, instead of building one list for the corpus.
+
+    Artifacts are collected into ``artifacts`` when given and dropped otherwise, so bulk
+    ingestion (``states.indexer.index_paths``) holds only the current file's output.
+    """
+    for i, full_path in enumerate(paths, start=1):
+        yield from load_file_cached(full_path, artifacts if artifacts is not None else _new_artifacts())
+        emit("progress", stage="load", file=os.path.basename(full_path), done=i, total=len(paths))
+
+
+@traceable(name="loader")
+def Loader(state: DocState) -> DocState:
+
+    artifacts = _new_artifacts()
+    # The summary, entity and chart branches all need the full set, so the graph materializes it here.
+    all_docs: List[Document] = list(iter_documents(resolve_paths(state), artifacts))
 
     state.documents = all_docs
     state.extracted_images = artifacts["extracted_images"]
@@ -69,6 +181,6 @@ def Loader(state: DocState) -> DocState:
     state.image_insights = artifacts["image_insights"]
     state.extracted_tables = artifacts["extracted_tables"]
     if not state.folder_path:
-        state.folder_path = folder
+        state.folder_path = "uploaded_docs"
 
     return state
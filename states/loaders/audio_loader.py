@@ -4,11 +4,12 @@ from typing import List
 
 from llama_index.core import Document
 
-from states.loaders.utils import client
+from states.loaders.utils import get_client
 
 
 def load_audio(path: str, filename: str) -> List[Document]:
     transcription = ""
+    client = get_client()
     if client is not None:
         try:
             with open(path, "rb") as fh:
@@ -5,20 +5,27 @@ from typing import Any, Dict, List
 import pandas as pd
 from llama_index.core import Document
 
+from states.cache import file_sha256
+from states.loaders.tabular import TABLE_CHUNK_ROWS, ingest_table
+from states.table_store import make_table_id
+
 
 def load_csv(path: str, filename: str, artifacts: Dict[str, List[Any]] | None = None) -> List[Document]:
+    """
+    Read the CSV in chunks of TABLE_CHUNK_ROWS rows. The Document holds the schema, a per-column
+    profile and sample rows (the full table when it is small); the full data goes to the table
+    store and ``extracted_tables`` gets a reference to it.
+    """
     try:
-        df = pd.read_csv(path)
-        txt = df.to_string()
-        # Add table to artifacts for visualization
-        if artifacts is not None and not df.empty:
-            artifacts["extracted_tables"].append({
-                "data": df.to_dict(orient='records'),
-                "columns": df.columns.tolist(),
-                "source": filename,
-                "type": "csv"
-            })
-        return [Document(text=txt, metadata={"filename": filename, "type": "csv"})]
+        doc = ingest_table(
+            pd.read_csv(path, chunksize=TABLE_CHUNK_ROWS),
+            header=f"[CSV]\nFilename:{filename}",
+            table_id=make_table_id(file_sha256(path)),
+            metadata={"filename": filename, "type": "csv"},
+            artifacts=artifacts,
+            artifact_fields={"source": filename, "type": "csv"},
+        )
+        return [doc] if doc else []
     except Exception as e:
         print(f"Failed to load CSV {filename}: {e}")
         return []
@@ -9,7 +9,8 @@ from docx import Document as DocxDocument
 from PIL import Image
 from llama_index.core import Document
 
-from states.loaders.utils import analyze_image_with_lvm, run_ocr_on_pil, save_pil_image
+from states.loaders.ocr import get_ocr_service
+from states.loaders.utils import ImageDeduper, analyze_images_batch, save_pil_image
 
 
 def load_docx(path: str, filename: str, artifacts: Dict[str, List[Any]] | None = None) -> List[Document]:
@@ -20,28 +21,40 @@ def load_docx(path: str, filename: str, artifacts: Dict[str, List[Any]] | None =
         docs: List[Document] = [Document(text=full_text, metadata={"filename": filename, "type": "docx"})]
 
         try:
+            images = []
             with zipfile.ZipFile(path) as zf:
                 for name in zf.namelist():
                     if name.startswith("word/media/") and not name.endswith("/"):
                         img_bytes = zf.read(name)
-                        pil_img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-                        img_path = save_pil_image(pil_img, f"{filename}_docx_{os.path.basename(name)}")
-                        caption, insights = analyze_image_with_lvm(pil_img)
-                        ocr_text = run_ocr_on_pil(pil_img)
-                        if artifacts is not None:
-                            artifacts["extracted_images"].append(img_path)
-                            artifacts["image_descriptions"].append(caption)
-                            artifacts["image_insights"].append(insights)
-                        docs.append(
-                            Document(
-                                text=(
-                                    "[DOCX IMAGE]\n"
-                                    f"Filename:{filename}\nImageName:{name}\n"
-                                    f"Caption:{caption}\nInsights:{insights}\nOCR:{ocr_text}"
-                                ),
-                                metadata={"filename": filename, "type": "docx-image", "image_path": img_path},
-                            )
-                        )
+                        images.append((name, Image.open(io.BytesIO(img_bytes)).convert("RGB")))
+
+            deduper = ImageDeduper([pil_img for _, pil_img in images])
+            # OCR runs on the worker pool while the vision batch is in flight.
+            ocr_batch = get_ocr_service().submit_batch([images[i][1] for i in deduper.ocr_todo])
+            vision = dict(zip(deduper.vision_todo, analyze_images_batch([images[i][1] for i in deduper.vision_todo])))
+            ocr_results = {i: r.text for i, r in zip(deduper.ocr_todo, ocr_batch.results())}
+            analyses = deduper.resolve(vision, ocr_results)
+            for i, (name, pil_img) in enumerate(images):
+                if not deduper.is_new(i):
+                    continue
+                img_path = save_pil_image(pil_img, f"{filename}_docx_{os.path.basename(name)}", deduper.hashes[i])
+                caption = analyses[i].get("caption", "")
+                insights = analyses[i].get("insights", "")
+                ocr_text = analyses[i].get("ocr", "")
+                if artifacts is not None:
+                    artifacts["extracted_images"].append(img_path)
+                    artifacts["image_descriptions"].append(caption)
+                    artifacts["image_insights"].append(insights)
+                docs.append(
+                    Document(
+                        text=(
+                            "[DOCX IMAGE]\n"
+                            f"Filename:{filename}\nImageName:{name}\n"
+                            f"Caption:{caption}\nInsights:{insights}\nOCR:{ocr_text}"
+                        ),
+                        metadata={"filename": filename, "type": "docx-image", "image_path": img_path},
+                    )
+                )
         except Exception:
             pass
 
@@ -1,30 +1,84 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
 
 import pandas as pd
 from llama_index.core import Document
 
+from states.cache import file_sha256
+from states.loaders.tabular import TABLE_CHUNK_ROWS, ingest_table
+from states.table_store import make_table_id
+
+
+def _column_names(header: tuple) -> List[str]:
+    """pandas-style names: blanks become ``Unnamed: i`` and repeats get ``.1``, ``.2`` suffixes."""
+    names: List[str] = []
+    seen: Dict[str, int] = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None or str(value).strip() == "" else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _sheet_chunks(sheet, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Stream an openpyxl read-only worksheet as DataFrames of ``chunk_rows`` rows (first row is the header)."""
+    rows = sheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = _column_names(header)
+    width = len(columns)
+    batch: List[tuple] = []
+    for row in rows:
+        if all(value is None for value in row):
+            continue
+        batch.append(tuple(row[:width]) + (None,) * (width - len(row)))
+        if len(batch) >= chunk_rows:
+            yield pd.DataFrame(batch, columns=columns)
+            batch = []
+    yield pd.DataFrame(batch, columns=columns)
+
+
+def _iter_sheets(path: str):
+    """(sheet name, chunk iterator) per sheet; .xlsx streams through openpyxl, other formats parse whole sheets."""
+    if path.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield sheet.title, _sheet_chunks(sheet, TABLE_CHUNK_ROWS)
+        finally:
+            workbook.close()
+    else:
+        with pd.ExcelFile(path) as workbook:
+            for sheet_name in workbook.sheet_names:
+                yield sheet_name, iter([workbook.parse(sheet_name)])
+
 
 def load_excel(path: str, filename: str, artifacts: Dict[str, List[Any]] | None = None) -> List[Document]:
+    """One profile Document and one stored table per sheet (see ``load_csv``); sheets are read one at a time."""
     try:
-        sheets = pd.read_excel(path, sheet_name=None)
         docs: List[Document] = []
-        for sheet_name, df in sheets.items():
-            docs.append(
-                Document(text=df.to_string(), metadata={"filename": filename, "type": "excel", "sheet": sheet_name})
+        digest = file_sha256(path)
+        for sheet_name, chunks in _iter_sheets(path):
+            doc = ingest_table(
+                chunks,
+                header=f"[EXCEL]\nFilename:{filename}\nSheet:{sheet_name}",
+                table_id=make_table_id(digest, str(sheet_name)),
+                metadata={"filename": filename, "type": "excel", "sheet": sheet_name},
+                artifacts=artifacts,
+                artifact_fields={"source": filename, "sheet": sheet_name, "type": "excel"},
             )
-            # Add table to artifacts for visualization
-            if artifacts is not None and not df.empty:
-                artifacts["extracted_tables"].append({
-                    "data": df.to_dict(orient='records'),
-                    "columns": df.columns.tolist(),
-                    "source": filename,
-                    "sheet": sheet_name,
-                    "type": "excel"
-                })
+            if doc:
+                docs.append(doc)
         return docs
-    
+
     except Exception as e:
         print(f"Failed to load Excel {filename}: {e}")
         return []
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import datetime
+import math
+from pathlib import Path
+from typing import Any
+
+
+def make_json_serializable(obj: Any) -> Any:
+    """
+    Recursively convert pipeline output into plain JSON types.
+
+    numpy scalars/arrays, pandas frames/series/timestamps, sets, tuples, paths and
+    datetimes are converted; NaN/inf become None; anything else falls back to ``str``.
+    """
+    if obj is None or isinstance(obj, (str, bool, int)):
+        return obj
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {str(k): make_json_serializable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return [make_json_serializable(v) for v in obj]
+    if isinstance(obj, Path):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+
+    # numpy / pandas without importing them: both expose tolist()/item() or to_dict().
+    if hasattr(obj, "to_dict") and callable(obj.to_dict):
+        try:
+            return make_json_serializable(obj.to_dict(orient="records"))
+        except TypeError:
+            return make_json_serializable(obj.to_dict())
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    if hasattr(obj, "tolist"):
+        return make_json_serializable(obj.tolist())
+    if hasattr(obj, "item"):
+        return make_json_serializable(obj.item())
+    return str(obj)
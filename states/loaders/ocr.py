@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import Any, Callable, List, Union
+
+from PIL import Image
+
+# Worker processes for OCR (and other CPU-bound loader work sharing the pool); 1 keeps everything inline.
+# Each worker holds its own OCR model, so the default stays small whatever the core count.
+OCR_WORKERS = int(os.getenv("DOCSENSE_OCR_WORKERS", "2"))
+# Images handed to a worker per task; amortises IPC and lets the engine run a batched prediction.
+OCR_BATCH_SIZE = int(os.getenv("DOCSENSE_OCR_BATCH_SIZE", "8"))
+
+_PADDLE_AVAILABLE = find_spec("paddleocr") is not None
+_PYTESSERACT_AVAILABLE = find_spec("pytesseract") is not None
+
+ImageInput = Union[Image.Image, bytes]
+
+
+@dataclass
+class OCRResult:
+    text: str
+    seconds: float
+
+
+def _to_pil(image: ImageInput) -> Image.Image:
+    if isinstance(image, (bytes, bytearray)):
+        return Image.open(io.BytesIO(image)).convert("RGB")
+    return image.convert("RGB")
+
+
+def _to_png(image: ImageInput) -> bytes:
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _paddle_texts(result: Any) -> str:
+    """Text lines from either PaddleOCR 3.x ``predict`` results or 2.x ``ocr`` output."""
+    if isinstance(result, dict) or hasattr(result, "get"):
+        return "\n".join(result.get("rec_texts") or []).strip()
+    lines = []
+    for page in result or []:
+        for line in page or []:
+            lines.append(line[1][0])
+    return "\n".join(lines).strip()
+
+
+class OCRService:
+    """
+    OCR engine that is loaded on first use rather than at import.
+
+    PaddleOCR is preferred with pytesseract as fallback. With ``workers > 1`` recognition
+    runs in a process pool whose workers preload the engine once at start-up; the same
+    pool is exposed through ``submit`` for other CPU-bound loader tasks. Every result
+    carries its own wall-clock time, and ``stats`` aggregates them.
+    """
+
+    def __init__(self, workers: int = OCR_WORKERS, batch_size: int = OCR_BATCH_SIZE):
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+        self._engine: Any = None
+        self._engine_kind = ""
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+        self.images = 0
+        self.seconds = 0.0
+
+    # -- engine -------------------------------------------------------------------------
+
+    def engine(self) -> Any:
+        if self._engine is None:
+            self._engine, self._engine_kind = False, "none"
+            if _PADDLE_AVAILABLE:
+                try:
+                    from paddleocr import PaddleOCR
+
+                    self._engine, self._engine_kind = PaddleOCR(use_angle_cls=True, lang="en"), "paddle"
+                except Exception as e:
+                    print(f"PaddleOCR unavailable, falling back: {e}")
+            if not self._engine and _PYTESSERACT_AVAILABLE:
+                import pytesseract
+
+                self._engine, self._engine_kind = pytesseract, "tesseract"
+        return self._engine
+
+    def _recognize_inline(self, images: List[ImageInput]) -> List[OCRResult]:
+        engine = self.engine()
+        if not engine:
+            return [OCRResult("", 0.0) for _ in images]
+        pil_images = [_to_pil(image) for image in images]
+
+        if self._engine_kind == "paddle" and hasattr(engine, "predict") and len(pil_images) > 1:
+            try:
+                import numpy as np
+
+                start = time.perf_counter()
+                outputs = engine.predict([np.array(img) for img in pil_images])
+                share = (time.perf_counter() - start) / len(pil_images)
+                return self._record([OCRResult(_paddle_texts(out), share) for out in outputs])
+            except Exception:
+                pass
+
+        results = []
+        for img in pil_images:
+            start = time.perf_counter()
+            try:
+                if self._engine_kind == "paddle":
+                    import numpy as np
+
+                    arr = np.array(img)
+                    if hasattr(engine, "predict"):
+                        text = _paddle_texts(engine.predict(arr)[0])
+                    else:
+                        text = _paddle_texts(engine.ocr(arr, cls=True))
+                else:
+                    text = engine.image_to_string(img).strip()
+            except Exception:
+                text = ""
+            results.append(OCRResult(text, time.perf_counter() - start))
+        return self._record(results)
+
+    def _record(self, results: List[OCRResult]) -> List[OCRResult]:
+        self.images += len(results)
+        self.seconds += sum(r.seconds for r in results)
+        return results
+
+    # -- pool ---------------------------------------------------------------------------
+
+    def executor(self) -> ProcessPoolExecutor | None:
+        if self.workers <= 1 or _IN_WORKER:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                # The pool starts from request threads of a process holding sockets, SQLite
+                # connections and thread locks; spawned workers inherit none of them.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+                )
+        return self._pool
+
+    def submit(self, fn: Callable, *args: Any, inline: bool = False) -> Future:
+        """Run ``fn(*args)`` on the pool (or inline when there is none, or ``inline``) and return a Future."""
+        pool = None if inline else self.executor()
+        if pool is not None:
+            return pool.submit(fn, *args)
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    # -- public API ---------------------------------------------------------------------
+
+    def recognize(self, image: ImageInput) -> OCRResult:
+        return self._recognize_inline([image])[0]
+
+    def submit_batch(self, images: List[ImageInput], inline: bool = False) -> "OCRBatch":
+        """Start OCR for ``images`` in chunks of ``batch_size``; collect with ``OCRBatch.results()``."""
+        if inline or self.executor() is None:
+            return OCRBatch(self, [], lambda: self._recognize_inline(images))
+        chunks = [images[i:i + self.batch_size] for i in range(0, len(images), self.batch_size)]
+        futures = [self.submit(_recognize_chunk, [_to_png(img) for img in chunk]) for chunk in chunks]
+        return OCRBatch(self, futures, None)
+
+    def recognize_batch(self, images: List[ImageInput]) -> List[OCRResult]:
+        return self.submit_batch(images).results()
+
+    def stats(self) -> dict:
+        return {
+            "engine": self._engine_kind or "not loaded",
+            "images": self.images,
+            "seconds": round(self.seconds, 3),
+            "mean_seconds": round(self.seconds / self.images, 3) if self.images else 0.0,
+        }
+
+
+class OCRBatch:
+    """Handle for a submitted batch; results come back in submission order."""
+
+    def __init__(self, service: OCRService, futures: List[Future], inline: Callable[[], List[OCRResult]] | None):
+        self._service = service
+        self._futures = futures
+        self._inline = inline
+
+    def results(self) -> List[OCRResult]:
+        if self._inline is not None:
+            return self._inline()
+        out: List[OCRResult] = []
+        for future in self._futures:
+            out.extend(future.result())
+        # Timings were measured in the workers; fold them into this process's stats.
+        return self._service._record(out)
+
+
+_IN_WORKER = False
+_service: OCRService | None = None
+
+
+def _init_worker() -> None:
+    """Pool initializer: use an inline service in this process and load the model before any task arrives."""
+    global _IN_WORKER, _service
+    _IN_WORKER = True
+    _service = OCRService(workers=1)
+    _service.engine()
+
+
+def _recognize_chunk(payloads: List[bytes]) -> List[OCRResult]:
+    return get_ocr_service()._recognize_inline(payloads)
+
+
+def get_ocr_service() -> OCRService:
+    global _service
+    if _service is None:
+        _service = OCRService()
+    return _service
@@ -1,26 +1,35 @@
 from __future__ import annotations
 
 import io
-from typing import Any, Dict, List
+import os
+from collections import OrderedDict
+from importlib.util import find_spec
+from typing import Any, Dict, List, Tuple
 
 import fitz  # PyMuPDF
 from PIL import Image
 from llama_index.core import Document
 
+from states.cache import file_sha256
+from states.loaders.ocr import get_ocr_service
 from states.loaders.utils import (
-    analyze_image_with_lvm,
+    ImageDeduper,
+    analyze_images_batch,
     page_to_pil,
     run_ocr_on_pil,
     save_pil_image,
 )
+from states.progress import emit
+from states.table_store import make_table_id, write_table
+
+# Camelot pulls in OpenCV/pdfminer; it is imported by the pool task that first needs it.
+_HAS_CAMELOT = find_spec("camelot") is not None
 
-try:
-    import camelot  # type: ignore
 
-    _HAS_CAMELOT = True
-except Exception:
-    camelot = None
-    _HAS_CAMELOT = False
+# Stream-table heuristic: gap (pt) that separates two cells, and how many aligned rows/columns make a table.
+TABLE_COLUMN_GAP = 12
+TABLE_MIN_ROWS = 3
+TABLE_MIN_COLUMNS = 2
 
 
 def is_valid_table(table_obj, min_rows: int = 2, min_cols: int = 2, min_accuracy: float = 50.0) -> bool:
@@ -80,7 +89,120 @@ def is_valid_table(table_obj, min_rows: int = 2, min_cols: int = 2, min_accuracy
         return False
 
 
-def load_pdf(path: str, filename: str, artifacts: Dict[str, List[Any]] | None = None) -> List[Document]:
+def detect_table_flavor(page: fitz.Page) -> str | None:
+    """
+    Cheap PyMuPDF pre-check deciding whether Camelot should look at a page, and how.
+
+    Returns "lattice" when the page has a grid of ruling lines, "stream" when at least
+    TABLE_MIN_ROWS visual rows share TABLE_MIN_COLUMNS aligned column starts, else None.
+    """
+    horizontal = vertical = 0
+    try:
+        for path in page.get_drawings():
+            for item in path.get("items", []):
+                if item[0] == "l":
+                    p1, p2 = item[1], item[2]
+                    if abs(p1.y - p2.y) < 1 and abs(p1.x - p2.x) > 20:
+                        horizontal += 1
+                    elif abs(p1.x - p2.x) < 1 and abs(p1.y - p2.y) > 10:
+                        vertical += 1
+                elif item[0] == "re":
+                    rect = item[1]
+                    if rect.height < 2 and rect.width > 20:
+                        horizontal += 1
+                    elif rect.width < 2 and rect.height > 10:
+                        vertical += 1
+                    elif rect.width > 10 and rect.height > 5:
+                        horizontal += 2
+                        vertical += 2
+    except Exception:
+        pass
+    if horizontal >= 3 and vertical >= 3:
+        return "lattice"
+
+    # Group words into visual rows by baseline, then record where each cell starts (a word after a wide gap).
+    rows: Dict[int, List[Tuple[float, float]]] = {}
+    try:
+        for x0, _, x1, y1, *_ in page.get_text("words"):
+            rows.setdefault(round(y1 / 3), []).append((x0, x1))
+    except Exception:
+        return None
+    column_hits: Dict[int, int] = {}
+    table_rows = 0
+    for words in rows.values():
+        words.sort()
+        starts = {round(words[0][0] / 10)}
+        for (_, prev_x1), (x0, _) in zip(words, words[1:]):
+            if x0 - prev_x1 > TABLE_COLUMN_GAP:
+                starts.add(round(x0 / 10))
+        if len(starts) >= TABLE_MIN_COLUMNS:
+            table_rows += 1
+            for start in starts:
+                column_hits[start] = column_hits.get(start, 0) + 1
+    aligned = sum(1 for hits in column_hits.values() if hits >= TABLE_MIN_ROWS)
+    if table_rows >= TABLE_MIN_ROWS and aligned >= TABLE_MIN_COLUMNS:
+        return "stream"
+    return None
+
+
+def _camelot_page(path: str, page_num: int, flavor: str) -> List[Any]:
+    """Pool task: run Camelot on one page; a lattice page with no valid table is retried as stream."""
+    import camelot  # type: ignore
+
+    flavors = [flavor, "stream"] if flavor == "lattice" else [flavor]
+    for current in flavors:
+        tables = camelot.read_pdf(path, pages=str(page_num + 1), flavor=current)
+        frames = [t.df for t in tables if not t.df.empty and is_valid_table(t)]
+        if frames:
+            return frames
+    return []
+
+
+def _worker_pdf(path: str):
+    """
+    ``path`` opened inside a pool worker and reused across the pages it is handed. Keyed by
+    modification time and size as well, so a file replaced under the same path is reopened;
+    only the most recent few stay open, and evicted documents are closed.
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    pdf = _WORKER_PDFS.get(key)
+    if pdf is not None:
+        _WORKER_PDFS.move_to_end(key)
+        return pdf
+    pdf = _WORKER_PDFS[key] = fitz.open(path)
+    while len(_WORKER_PDFS) > _WORKER_PDF_LIMIT:
+        _, evicted = _WORKER_PDFS.popitem(last=False)
+        evicted.close()
+    return pdf
+
+
+def _ocr_pdf_page(path: str, page_num: int) -> str:
+    """Pool task: render one page of ``path`` and OCR it with the worker's preloaded engine."""
+    pil_page = page_to_pil(_worker_pdf(path)[page_num])
+    return run_ocr_on_pil(pil_page) if pil_page else ""
+
+
+# Open documents per pool worker; a few covers the PDFs being processed at the same time.
+_WORKER_PDF_LIMIT = 4
+_WORKER_PDFS: "OrderedDict[Tuple[str, int, int], Any]" = OrderedDict()
+
+
+def load_pdf(
+    path: str,
+    filename: str,
+    artifacts: Dict[str, List[Any]] | None = None,
+    workers: int | None = None,
+) -> List[Document]:
+    """
+    Extract page text, embedded images and tables from a PDF.
+
+    Pages without a text layer are rendered and OCR'd, Camelot runs on candidate table pages,
+    and embedded images are OCR'd in batches, all on the shared OCR worker pool (see
+    ``states.loaders.ocr``); vision calls for the images go out as one concurrent batch
+    (``analyze_images_batch``). Results are reassembled in page order, so the output is
+    identical to a sequential run. ``workers=1`` processes everything inline.
+    """
     docs: List[Document] = []
     try:
         pdf = fitz.open(path)
@@ -88,17 +210,23 @@ def load_pdf(path: str, filename: str, artifacts: Dict[str, List[Any]] | None =
         print(f"Failed to open PDF {filename}: {e}")
         return docs
 
-    full_text_chunks: List[str] = []
+    # Pass 1 (cheap, in-process): text layer per page and the raw bytes of embedded images.
+    page_texts: Dict[int, str] = {}
+    scanned_pages: List[int] = []
+    # (page_num, img_index, xref, bytes); bytes are only extracted for the first use of an xref.
+    page_images: List[Tuple[int, int, int, bytes | None]] = []
+    extracted_xrefs: set = set()
+    table_pages: List[Tuple[int, str]] = []
     for page_num in range(len(pdf)):
         try:
             page = pdf[page_num]
-            page_text = page.get_text("text") or ""
-            if not page_text.strip():
-                pil_page = page_to_pil(page)
-                if pil_page:
-                    ocr_text = run_ocr_on_pil(pil_page)
-                    page_text = ocr_text or page_text
-            full_text_chunks.append(f"\n--- Page {page_num + 1} ---\n{page_text.strip()}")
+            page_texts[page_num] = page.get_text("text") or ""
+            if not page_texts[page_num].strip():
+                scanned_pages.append(page_num)
+            elif _HAS_CAMELOT:
+                flavor = detect_table_flavor(page)
+                if flavor:
+                    table_pages.append((page_num, flavor))
         except Exception as e:
             print(f"PDF page read error {filename} page {page_num + 1}: {e}")
             continue
@@ -111,55 +239,110 @@ def load_pdf(path: str, filename: str, artifacts: Dict[str, List[Any]] | None =
         for img_index, img in enumerate(images_info):
             try:
                 xref = img[0]
+                if xref in extracted_xrefs:
+                    # Same image object drawn again (logo, header): reuse the first occurrence.
+                    page_images.append((page_num, img_index, xref, None))
+                    continue
                 base = pdf.extract_image(xref)
                 image_bytes = base.get("image")
-                if not image_bytes:
-                    continue
-                pil_img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-                img_path = save_pil_image(pil_img, f"{filename}_p{page_num + 1}_i{img_index}")
-                caption, insights = analyze_image_with_lvm(pil_img)
-                ocr_text = run_ocr_on_pil(pil_img)
+                if image_bytes:
+                    extracted_xrefs.add(xref)
+                    page_images.append((page_num, img_index, xref, image_bytes))
+            except Exception as e:
+                print(f"Warning: image extraction failed for {filename} page {page_num + 1} img {img_index}: {e}")
 
-                if artifacts is not None:
-                    artifacts["extracted_images"].append(img_path)
-                    artifacts["image_descriptions"].append(caption)
-                    artifacts["image_insights"].append(insights)
+    # Pass 2: OCR and Camelot (CPU-bound) in worker processes, vision calls (I/O-bound) as an async batch.
+    service = get_ocr_service()
+    jobs = len(scanned_pages) + len(page_images) + len(table_pages)
+    inline = (workers or service.workers) <= 1 or jobs <= 1
 
-                docs.append(
-                    Document(
-                        text=(
-                            "[PDF IMAGE]\n"
-                            f"Filename:{filename}\nPage:{page_num + 1}\n"
-                            f"ImageIndex:{img_index}\nCaption:{caption}\nInsights:{insights}\nOCR:{ocr_text}"
-                        ),
-                        metadata={
-                            "filename": filename,
-                            "type": "pdf-image",
-                            "page": page_num + 1,
-                            "image_index": img_index,
-                            "image_path": img_path,
-                            "caption": caption,
-                            "insights": insights,
-                            "ocr": ocr_text,
-                        },
-                    )
-                )
+    def submit(fn, *args):
+        return service.submit(fn, *args, inline=inline)
+
+    # Camelot only sees candidate pages, each with the flavor its layout suggests.
+    table_jobs = [(page_num, submit(_camelot_page, path, page_num, flavor)) for page_num, flavor in table_pages]
+
+    page_ocr = {page_num: submit(_ocr_pdf_page, path, page_num) for page_num in scanned_pages}
+
+    pil_images: List[Image.Image | None] = []
+    for page_num, img_index, _, image_bytes in page_images:
+        try:
+            pil_images.append(Image.open(io.BytesIO(image_bytes)).convert("RGB") if image_bytes else None)
+        except Exception as e:
+            print(f"Warning: image extraction failed for {filename} page {page_num + 1} img {img_index}: {e}")
+            pil_images.append(None)
+
+    # Decorative images and repeats (same xref, same or near-identical pixels) are dropped; known images come from the cache.
+    deduper = ImageDeduper(pil_images, keys=[xref for _, _, xref, _ in page_images])
+    image_ocr = service.submit_batch([page_images[i][3] for i in deduper.ocr_todo], inline=inline)
+
+    # One structured vision request per new image, sent concurrently while the pool works through OCR.
+    vision = dict(zip(deduper.vision_todo, analyze_images_batch([pil_images[i] for i in deduper.vision_todo])))
+
+    full_text_chunks: List[str] = []
+    for page_num, page_text in page_texts.items():
+        if page_num in page_ocr:
+            try:
+                page_text = page_ocr[page_num].result() or page_text
             except Exception as e:
-                print(f"Warning: image extraction failed for {filename} page {page_num + 1} img {img_index}: {e}")
-                continue
+                print(f"PDF page OCR error {filename} page {page_num + 1}: {e}")
+        full_text_chunks.append(f"\n--- Page {page_num + 1} ---\n{page_text.strip()}")
+        emit("progress", stage="pdf_page", file=filename, done=page_num + 1, total=len(pdf))
+
+    try:
+        ocr_results = {i: r.text for i, r in zip(deduper.ocr_todo, image_ocr.results())}
+    except Exception as e:
+        print(f"PDF image OCR error {filename}: {e}")
+        ocr_results = {}
+    analyses = deduper.resolve(vision, ocr_results)
+
+    for i, (page_num, img_index, _, _) in enumerate(page_images):
+        if not deduper.is_new(i):
+            continue
+        try:
+            img_path = save_pil_image(pil_images[i], f"{filename}_p{page_num + 1}_i{img_index}", deduper.hashes[i])
+            caption = analyses[i].get("caption", "")
+            insights = analyses[i].get("insights", "")
+            ocr_text = analyses[i].get("ocr", "")
+
+            if artifacts is not None:
+                artifacts["extracted_images"].append(img_path)
+                artifacts["image_descriptions"].append(caption)
+                artifacts["image_insights"].append(insights)
+
+            docs.append(
+                Document(
+                    text=(
+                        "[PDF IMAGE]\n"
+                        f"Filename:{filename}\nPage:{page_num + 1}\n"
+                        f"ImageIndex:{img_index}\nCaption:{caption}\nInsights:{insights}\nOCR:{ocr_text}"
+                    ),
+                    metadata={
+                        "filename": filename,
+                        "type": "pdf-image",
+                        "page": page_num + 1,
+                        "image_index": img_index,
+                        "image_path": img_path,
+                        "caption": caption,
+                        "insights": insights,
+                        "ocr": ocr_text,
+                    },
+                )
+            )
+        except Exception as e:
+            print(f"Warning: image extraction failed for {filename} page {page_num + 1} img {img_index}: {e}")
+            continue
 
-    if _HAS_CAMELOT and camelot:
+    if table_jobs:
         try:
             tables_texts = []
-            tlist = camelot.read_pdf(path, pages="all", flavor="lattice")
-            for t in tlist:
-                if not t.df.empty and is_valid_table(t):
-                    tables_texts.append((t.df.to_string(), t.df))
-            if not tables_texts:
-                tlist = camelot.read_pdf(path, pages="all", flavor="stream")
-                for t in tlist:
-                    if not t.df.empty and is_valid_table(t):
-                        tables_texts.append((t.df.to_string(), t.df))
+            digest = None
+            for page_num, future in table_jobs:
+                try:
+                    for df in future.result():
+                        tables_texts.append((df.to_string(), df))
+                except Exception as e:
+                    print(f"Camelot extraction failed for {filename} page {page_num + 1}: {e}")
             for idx, (tbl_text, tbl_df) in enumerate(tables_texts):
                 # Fix column headers - Camelot often uses numeric indices instead of actual headers
                 # If columns are numeric (0, 1, 2...), use first row as headers
@@ -200,9 +383,11 @@ def load_pdf(path: str, filename: str, artifacts: Dict[str, List[Any]] | None =
                     )
                 )
                 if artifacts is not None:
+                    if digest is None:
+                        digest = file_sha256(path)
+                    stored = write_table(tbl_df, make_table_id(digest, f"t{idx}"))
                     artifacts["extracted_tables"].append({
-                        "data": tbl_df.to_dict(orient='records'),
-                        "columns": tbl_df.columns.tolist(),
+                        **(stored or {"data": tbl_df.to_dict(orient='records'), "columns": tbl_df.columns.tolist()}),
                         "source": filename,
                         "table_index": idx,
                         "type": "pdf"
@@ -7,7 +7,7 @@ from pptx import Presentation
 from PIL import Image
 from llama_index.core import Document
 
-from states.loaders.utils import analyze_image_with_lvm, save_pil_image
+from states.loaders.utils import ImageDeduper, analyze_images_batch, save_pil_image
 
 
 def load_pptx(path: str, filename: str, artifacts: Dict[str, List[Any]] | None = None) -> List[Document]:
@@ -15,6 +15,7 @@ def load_pptx(path: str, filename: str, artifacts: Dict[str, List[Any]] | None =
         prs = Presentation(path)
         slides_text = []
         docs: List[Document] = []
+        images = []
         for i, slide in enumerate(prs.slides):
             slide_text = []
             for shape in slide.shapes:
@@ -30,30 +31,40 @@ def load_pptx(path: str, filename: str, artifacts: Dict[str, List[Any]] | None =
                     if getattr(shape, "shape_type", None) == 13:  # Picture
                         img = shape.image
                         pil_img = Image.open(io.BytesIO(img.blob)).convert("RGB")
-                        img_path = save_pil_image(pil_img, f"{filename}_slide{i + 1}")
-                        caption, insights = analyze_image_with_lvm(pil_img)
-                        if artifacts is not None:
-                            artifacts["extracted_images"].append(img_path)
-                            artifacts["image_descriptions"].append(caption)
-                            artifacts["image_insights"].append(insights)
-                        docs.append(
-                            Document(
-                                text=(
-                                    "[PPTX IMAGE]\n"
-                                    f"Filename:{filename}\nSlide:{i + 1}\n"
-                                    f"Caption:{caption}\nInsights:{insights}"
-                                ),
-                                metadata={
-                                    "filename": filename,
-                                    "type": "pptx-image",
-                                    "slide": i + 1,
-                                    "image_path": img_path,
-                                },
-                            )
-                        )
+                        images.append((i, pil_img, img.sha1))
                 except Exception:
                     continue
 
+        # Slide masters repeat the same pictures; the blob SHA-1 catches exact reuse, the pixel comparison resized copies.
+        deduper = ImageDeduper([pil_img for _, pil_img, _ in images], keys=[sha1 for _, _, sha1 in images], ocr=False)
+        vision = dict(zip(deduper.vision_todo, analyze_images_batch([images[k][1] for k in deduper.vision_todo])))
+        analyses = deduper.resolve(vision)
+        for k, (i, pil_img, _) in enumerate(images):
+            if not deduper.is_new(k):
+                continue
+            img_path = save_pil_image(pil_img, f"{filename}_slide{i + 1}", deduper.hashes[k])
+            caption = analyses[k].get("caption", "")
+            insights = analyses[k].get("insights", "")
+            if artifacts is not None:
+                artifacts["extracted_images"].append(img_path)
+                artifacts["image_descriptions"].append(caption)
+                artifacts["image_insights"].append(insights)
+            docs.append(
+                Document(
+                    text=(
+                        "[PPTX IMAGE]\n"
+                        f"Filename:{filename}\nSlide:{i + 1}\n"
+                        f"Caption:{caption}\nInsights:{insights}"
+                    ),
+                    metadata={
+                        "filename": filename,
+                        "type": "pptx-image",
+                        "slide": i + 1,
+                        "image_path": img_path,
+                    },
+                )
+            )
+
         docs.insert(
             0,
             Document(
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import os
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+from llama_index.core import Document
+
+from states.table_store import _HAS_PYARROW, ParquetSink
+
+# Rows per pandas chunk; bounds memory for files of any length.
+TABLE_CHUNK_ROWS = int(os.getenv("DOCSENSE_TABLE_CHUNK_ROWS", "100000"))
+# Tables up to this many rows are rendered in full into the Document; larger ones get a profile + sample.
+TABLE_FULL_TEXT_ROWS = int(os.getenv("DOCSENSE_TABLE_FULL_TEXT_ROWS", "200"))
+TABLE_SAMPLE_ROWS = int(os.getenv("DOCSENSE_TABLE_SAMPLE_ROWS", "20"))
+# Records kept inline in the artifact when pyarrow is missing and the table cannot be stored.
+TABLE_PREVIEW_ROWS = int(os.getenv("DOCSENSE_TABLE_PREVIEW_ROWS", "500"))
+
+_TOP_VALUES = 5
+# Distinct values tracked per text column before the counts become approximate.
+_MAX_TRACKED_VALUES = 10000
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Downcast integers and turn repetitive text columns into categories (floats keep full precision)."""
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif series.dtype == object or pd.api.types.is_string_dtype(series):
+            distinct = series.nunique(dropna=True)
+            if distinct and distinct <= 0.5 * len(series):
+                df[col] = series.astype("category")
+    return df
+
+
+class ColumnProfile:
+    """Running statistics for one column, merged chunk by chunk."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.dtype = ""
+        self.count = 0
+        self.nulls = 0
+        self.numeric = True
+        self.minimum: Any = None
+        self.maximum: Any = None
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.values: Counter = Counter()
+        self.approximate = False
+
+    def update(self, series: pd.Series) -> None:
+        self.dtype = str(series.dtype)
+        nulls = int(series.isna().sum())
+        self.nulls += nulls
+        self.count += len(series) - nulls
+        values = series.dropna()
+        if values.empty:
+            return
+
+        if self.numeric and pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            as_float = values.astype("float64")
+            low, high = as_float.min(), as_float.max()
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+            self.total += float(as_float.sum())
+            self.total_sq += float((as_float * as_float).sum())
+            return
+
+        self.numeric = False
+        self.values.update(values.astype(str).value_counts().to_dict())
+        if len(self.values) > _MAX_TRACKED_VALUES:
+            self.values = Counter(dict(self.values.most_common(_MAX_TRACKED_VALUES // 10)))
+            self.approximate = True
+
+    def describe(self) -> str:
+        line = f"- {self.name} ({self.dtype}): non-null={self.count}, nulls={self.nulls}"
+        if self.numeric and self.count:
+            mean = self.total / self.count
+            std = max(self.total_sq / self.count - mean * mean, 0.0) ** 0.5
+            return f"{line}, min={self.minimum:g}, max={self.maximum:g}, mean={mean:g}, std={std:g}"
+        if self.values:
+            distinct = f"{'>=' if self.approximate else '='}{len(self.values)}"
+            top = ", ".join(f"{value} ({n})" for value, n in self.values.most_common(_TOP_VALUES))
+            return f"{line}, distinct{distinct}, top: {top}"
+        return line
+
+
+class TableIngest:
+    """Consumes a table chunk by chunk: profile, sample and the stored table (or inline preview records)."""
+
+    def __init__(self, table_id: Optional[str]):
+        self.rows = 0
+        self.columns: List[str] = []
+        self.profiles: Dict[str, ColumnProfile] = {}
+        self.head: Optional[pd.DataFrame] = None
+        self.samples: List[pd.DataFrame] = []
+        self.preview: List[Dict[str, Any]] = []
+        self.sink = ParquetSink(table_id) if table_id and _HAS_PYARROW else None
+        self.stored: Optional[Dict[str, Any]] = None
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        chunk.columns = [str(c) for c in chunk.columns]
+        chunk = compact_dtypes(chunk)
+        if not self.columns:
+            self.columns = list(chunk.columns)
+            self.profiles = {col: ColumnProfile(col) for col in self.columns}
+        for col in self.columns:
+            self.profiles[col].update(chunk[col])
+
+        if self.rows < TABLE_FULL_TEXT_ROWS:
+            head = chunk.head(TABLE_FULL_TEXT_ROWS - self.rows)
+            self.head = head if self.head is None else pd.concat([self.head, head])
+        if self.sink is None and len(self.preview) < TABLE_PREVIEW_ROWS:
+            self.preview.extend(chunk.head(TABLE_PREVIEW_ROWS - len(self.preview)).to_dict(orient="records"))
+        sample = chunk.sample(n=min(TABLE_SAMPLE_ROWS, len(chunk)), random_state=len(self.samples))
+        # Weight so each chunk contributes in proportion to its size when the final sample is drawn.
+        self.samples.append(sample.assign(_weight=len(chunk) / max(len(sample), 1)))
+
+        if self.sink is not None:
+            self.sink.write(chunk)
+        self.rows += len(chunk)
+
+    def finish(self) -> None:
+        if self.sink is not None:
+            self.stored = self.sink.close()
+
+    def sample_rows(self) -> pd.DataFrame:
+        pool = pd.concat(self.samples)
+        n = min(TABLE_SAMPLE_ROWS, len(pool))
+        return pool.sample(n=n, weights="_weight", random_state=0).drop(columns="_weight").sort_index()
+
+    def text(self, header: str) -> str:
+        lines = [header, f"Rows: {self.rows}  Columns: {len(self.columns)}", "Schema:"]
+        lines += [self.profiles[col].describe() for col in self.columns]
+        if self.rows <= TABLE_FULL_TEXT_ROWS:
+            lines += ["Rows:", self.head.to_string() if self.head is not None else ""]
+        else:
+            lines += [f"Sample rows ({TABLE_SAMPLE_ROWS} of {self.rows}):", self.sample_rows().to_string()]
+        return "\n".join(lines)
+
+    def artifact(self, **fields: Any) -> Dict[str, Any]:
+        """The ``extracted_tables`` entry: a reference to the stored table, or inline preview records."""
+        if self.stored is not None:
+            return {**self.stored, **fields}
+        return {
+            "data": self.preview,
+            "columns": self.columns,
+            "rows": self.rows,
+            "truncated": self.rows > len(self.preview),
+            **fields,
+        }
+
+
+def ingest_table(
+    chunks: Iterable[pd.DataFrame],
+    header: str,
+    table_id: Optional[str],
+    metadata: Dict[str, Any],
+    artifacts: Dict[str, List[Any]] | None,
+    artifact_fields: Dict[str, Any],
+) -> Optional[Document]:
+    """Run ``chunks`` through a TableIngest; returns the profile Document and records the table artifact."""
+    ingest = TableIngest(table_id)
+    try:
+        for chunk in chunks:
+            ingest.add(chunk)
+        ingest.finish()
+    except Exception:
+        if ingest.sink is not None:
+            ingest.sink.discard()
+        raise
+    if not ingest.columns:
+        return None
+    if artifacts is not None and ingest.rows:
+        artifacts["extracted_tables"].append(ingest.artifact(**artifact_fields))
+    return Document(text=ingest.text(header), metadata={**metadata, "rows": ingest.rows})
@@ -1,47 +1,40 @@
 from __future__ import annotations
 
+import asyncio
 import base64
+import hashlib
 import io
+import json
 import os
+import random
 import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Tuple
 
 import fitz  # PyMuPDF
+import numpy as np
 from PIL import Image
 
-try:
-    from openai import OpenAI
-
-    client = OpenAI()
-except Exception:
-    client = None
-
-try:
-    from paddleocr import PaddleOCR
-
-    paddle_ocr = PaddleOCR(use_angle_cls=True, lang="en")
-    _PADDLE_AVAILABLE = True
-except Exception:
-    paddle_ocr = None
-    _PADDLE_AVAILABLE = False
-
-try:
-    import pytesseract
-
-    _PYTESSERACT_AVAILABLE = True
-except Exception:
-    pytesseract = None
-    _PYTESSERACT_AVAILABLE = False
+from states.loaders.ocr import _PADDLE_AVAILABLE, _PYTESSERACT_AVAILABLE, get_ocr_service
 
 
 __all__ = [
-    "client",
+    "get_client",
     "EXTRACTED_IMG_DIR",
     "save_pil_image",
     "run_ocr_on_pil",
     "extract_numeric_signals",
     "page_to_pil",
     "analyze_image_with_lvm",
+    "analyze_images_async",
+    "analyze_images_batch",
+    "downscale_for_vision",
+    "perceptual_hash",
+    "pixel_digest",
+    "is_decorative",
+    "ImageDeduper",
     "_PADDLE_AVAILABLE",
     "_PYTESSERACT_AVAILABLE",
 ]
@@ -51,29 +44,29 @@ EXTRACTED_IMG_DIR = os.path.join("uploaded_docs", "extracted_images")
 os.makedirs(EXTRACTED_IMG_DIR, exist_ok=True)
 
 #A PIL Image is an in-memory representation of an image.
-def save_pil_image(pil_img: Image.Image, filename_hint: str) -> str:# image extraction
+def save_pil_image(pil_img: Image.Image, filename_hint: str, digest: str | None = None) -> str:# image extraction
+    """
+    Save ``pil_img`` as a PNG named by its pixel digest (``digest`` when the caller already
+    has it), so cached extraction results and stored runs keep pointing at the pixels they
+    were made from even when a later upload reuses the filename.
+    """
     os.makedirs(EXTRACTED_IMG_DIR, exist_ok=True)
-    safe_name = re.sub(r"[^0-9A-Za-z._-]", "_", filename_hint)[:120]
-    tmp_path = os.path.join(EXTRACTED_IMG_DIR, f"{safe_name}.png")
-    pil_img.save(tmp_path, format="PNG")
-    return tmp_path
+    safe_name = re.sub(r"[^0-9A-Za-z._-]", "_", filename_hint)[:80]
+    digest = digest or pixel_digest(pil_img)
+    path = os.path.join(EXTRACTED_IMG_DIR, f"{safe_name}_{digest[:16]}.png")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        pil_img.save(tmp_path, format="PNG")
+        os.replace(tmp_path, path)
+    return path
 
 
 def run_ocr_on_pil(pil_img: Image.Image) -> str:
+    """OCR one image in this process; the engine is loaded on first call (see states.loaders.ocr)."""
     try:
-        if _PADDLE_AVAILABLE and paddle_ocr:
-            import numpy as np
-
-            arr = np.array(pil_img.convert("RGB"))
-            ocr_res = paddle_ocr.ocr(arr, cls=True)
-            texts = [line[1][0] for page in ocr_res for line in page]
-            return "\n".join(texts).strip()
-        if _PYTESSERACT_AVAILABLE and pytesseract:
-            text = pytesseract.image_to_string(pil_img)
-            return text.strip()
+        return get_ocr_service().recognize(pil_img).text
     except Exception:
-        pass
-    return ""
+        return ""
 
 
 def page_to_pil(page: fitz.Page) -> Image.Image | None:
@@ -85,64 +78,321 @@ def page_to_pil(page: fitz.Page) -> Image.Image | None:
         return None
 
 
-def analyze_image_with_lvm(pil_image: Image.Image) -> Tuple[str, str]:
+VISION_MODEL = "gpt-4o"
+# Longest image side sent to the vision model; larger images are downscaled before encoding.
+VISION_MAX_SIDE = int(os.getenv("DOCSENSE_VISION_MAX_SIDE", "1024"))
+VISION_CONCURRENCY = int(os.getenv("DOCSENSE_VISION_CONCURRENCY", "8"))
+VISION_MAX_RETRIES = int(os.getenv("DOCSENSE_VISION_MAX_RETRIES", "3"))
+
+_VISION_PROMPT = (
+    "Describe this image in one concise sentence, then give 2-3 short insights or observations about it. "
+    'Reply with a JSON object: {"caption": "<one sentence>", "insights": ["<insight>", ...]}'
+)
+
+client = None
+
+
+def get_client():
+    """Synchronous OpenAI client, created on first use; None when openai is missing or unconfigured."""
+    global client
     if client is None:
-        return "[Vision client unavailable]", ""
+        try:
+            from openai import OpenAI
 
-    def _extract_response_text(resp: Any) -> str:
-        content = getattr(resp.choices[0].message, "content", "")
-        if isinstance(content, str):
-            return content.strip()
-        if isinstance(content, list):
-            texts = []
-            for block in content:
-                if isinstance(block, dict) and block.get("type") == "text":
-                    texts.append(block.get("text", ""))
-            return "\n".join(texts).strip()
-        return ""
+            client = OpenAI()
+        except Exception:
+            client = False
+    return client or None
 
+
+def _new_async_client():
+    """
+    A fresh ``AsyncOpenAI`` for one batch, or None when openai is missing or unconfigured.
+    Its connection pool belongs to the event loop that uses it, and every batch runs on its
+    own loop (``asyncio.run``), possibly in several job threads at once, so clients are not shared.
+    """
     try:
-        buf = io.BytesIO()
-        pil_image.save(buf, format="PNG")
-        b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-        payload = {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}}
+        from openai import AsyncOpenAI
 
-        try:
-            resp1 = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "Describe this image in one concise sentence."},
-                            payload,
-                        ],
-                    }
+        # analyze_images_async retries with its own backoff; SDK retries would multiply them.
+        return AsyncOpenAI(max_retries=0)
+    except Exception:
+        return None
+
+
+def downscale_for_vision(pil_image: Image.Image, max_side: int = VISION_MAX_SIDE) -> Image.Image:
+    if max(pil_image.size) <= max_side:
+        return pil_image
+    scaled = pil_image.copy()
+    scaled.thumbnail((max_side, max_side), Image.LANCZOS)
+    return scaled
+
+
+def _vision_request(pil_image: Image.Image) -> Dict[str, Any]:
+    buf = io.BytesIO()
+    downscale_for_vision(pil_image).save(buf, format="PNG")
+    b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
+    return {
+        "model": VISION_MODEL,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": _VISION_PROMPT},
+                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}},
                 ],
-                max_tokens=180,
-            )
-            caption = _extract_response_text(resp1) or "[No caption generated]"
-        except Exception:
-            caption = "[No caption generated]"
+            }
+        ],
+        "response_format": {"type": "json_object"},
+        "max_tokens": 400,
+    }
+
 
+def _parse_vision_response(resp: Any) -> Tuple[str, str]:
+    content = getattr(resp.choices[0].message, "content", "") or ""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return content.strip() or "[No caption generated]", ""
+    caption = str(data.get("caption") or "").strip() or "[No caption generated]"
+    insights = data.get("insights") or ""
+    if isinstance(insights, list):
+        insights = "\n".join(f"- {str(i).strip()}" for i in insights if str(i).strip())
+    return caption, str(insights).strip()
+
+
+def analyze_image_with_lvm(pil_image: Image.Image, vision_client: Any = None) -> Tuple[str, str]:
+    """Caption and insights for one image from a single structured vision call."""
+    vision_client = vision_client or get_client()
+    if vision_client is None:
+        return "[Vision client unavailable]", ""
+    request = _vision_request(pil_image)
+    for attempt in range(VISION_MAX_RETRIES + 1):
         try:
-            resp2 = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "Give 2-3 short insights or observations about this image."},
-                            payload,
-                        ],
-                    }
-                ],
-                max_tokens=250,
-            )
-            insights = _extract_response_text(resp2)
-        except Exception:
-            insights = ""
+            return _parse_vision_response(vision_client.chat.completions.create(**request))
+        except Exception as e:
+            if attempt == VISION_MAX_RETRIES:
+                return f"[VisionError] {e}", ""
+            time.sleep(_backoff(attempt))
+    return "[No caption generated]", ""
+
+
+def _backoff(attempt: int) -> float:
+    return min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+
+
+async def analyze_images_async(
+    images: List[Image.Image],
+    vision_client: Any = None,
+    concurrency: int = VISION_CONCURRENCY,
+    max_retries: int = VISION_MAX_RETRIES,
+) -> List[Tuple[str, str]]:
+    """
+    Caption + insights for many images, at most ``concurrency`` requests in flight.
+
+    ``vision_client`` is any object exposing an async ``chat.completions.create`` (a local
+    stub, say); by default an ``AsyncOpenAI`` is created for this call and closed after it.
+    Failed requests are retried with exponential backoff; results keep the order of ``images``.
+    """
+    if vision_client is not None:
+        return await _analyze_with(vision_client, images, concurrency, max_retries)
+    own_client = _new_async_client()
+    if own_client is None:
+        return [("[Vision client unavailable]", "") for _ in images]
+    async with own_client:
+        return await _analyze_with(own_client, images, concurrency, max_retries)
+
+
+async def _analyze_with(
+    vision_client: Any,
+    images: List[Image.Image],
+    concurrency: int,
+    max_retries: int,
+) -> List[Tuple[str, str]]:
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(pil_image: Image.Image) -> Tuple[str, str]:
+        request = _vision_request(pil_image)
+        for attempt in range(max_retries + 1):
+            try:
+                async with semaphore:
+                    resp = await vision_client.chat.completions.create(**request)
+                return _parse_vision_response(resp)
+            except Exception as e:
+                if attempt == max_retries:
+                    return f"[VisionError] {e}", ""
+                await asyncio.sleep(_backoff(attempt))
+        return "[No caption generated]", ""
+
+    return list(await asyncio.gather(*(one(img) for img in images)))
+
+
+def analyze_images_batch(images: List[Image.Image], **kwargs: Any) -> List[Tuple[str, str]]:
+    """Blocking wrapper around ``analyze_images_async`` that is safe to call from inside a running event loop."""
+    if not images:
+        return []
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(analyze_images_async(images, **kwargs))
+    # Already inside an event loop (e.g. a FastAPI handler): run the batch on a fresh loop in a helper thread.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, analyze_images_async(images, **kwargs)).result()
+
+
+# Images smaller than this (bullets, spacers, rules) are treated as decorative and skipped.
+MIN_IMAGE_SIDE = int(os.getenv("DOCSENSE_MIN_IMAGE_SIDE", "32"))
+MIN_IMAGE_AREA = int(os.getenv("DOCSENSE_MIN_IMAGE_AREA", str(64 * 64)))
+# Images within this many differing dHash bits are compared pixel for pixel; the hash alone is not an identity.
+PHASH_MAX_DISTANCE = int(os.getenv("DOCSENSE_PHASH_MAX_DISTANCE", "10"))
+# dHash candidates are repeats when no 8x8 block of their grayscale pixels differs by more than this mean level (0-255).
+NEAR_DUPLICATE_MAX_DIFF = float(os.getenv("DOCSENSE_NEAR_DUPLICATE_MAX_DIFF", "8"))
+_NEAR_DUPLICATE_SIDE = 1024
+# Bump when the vision prompt or OCR engine changes so cached analyses are dropped.
+IMAGE_ANALYSIS_VERSION = "2"
+
+_image_cache = None
+
+
+def _get_image_cache():
+    global _image_cache
+    if _image_cache is None:
+        from states.cache import DiskCache
+
+        _image_cache = DiskCache("image_analysis", version=IMAGE_ANALYSIS_VERSION)
+    return _image_cache
+
+
+def perceptual_hash(pil_image: Image.Image) -> int:
+    """64-bit difference hash: robust to rescaling and recompression, cheap to compute."""
+    small = pil_image.convert("L").resize((9, 8), Image.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def pixel_digest(pil_image: Image.Image) -> str:
+    """SHA-256 over mode, size and raw pixels: equal only for identical images, whatever the file encoding."""
+    digest = hashlib.sha256(f"{pil_image.mode}:{pil_image.size[0]}x{pil_image.size[1]}:".encode())
+    digest.update(pil_image.tobytes())
+    return digest.hexdigest()
+
+
+def _near_duplicate(a: Image.Image, b: Image.Image) -> bool:
+    """
+    Same picture up to rescaling or mild recompression. Both are compared in grayscale at
+    the smaller one's width (at most _NEAR_DUPLICATE_SIDE), and every 8x8 block must agree
+    to within NEAR_DUPLICATE_MAX_DIFF levels on average, so a changed digit or word keeps
+    two otherwise equal scans apart.
+    """
+    (wa, ha), (wb, hb) = a.size, b.size
+    if abs(wa * hb - wb * ha) > 0.02 * max(wa * hb, wb * ha):
+        return False
+    width = min(wa, wb, _NEAR_DUPLICATE_SIDE)
+    height = max(round(width * ha / wa), 1)
+    pa, pb = (np.asarray(im.convert("L").resize((width, height), Image.BILINEAR), dtype=np.float32) for im in (a, b))
+    diff = np.abs(pa - pb)
+    rows, cols = height // 8 * 8, width // 8 * 8
+    if rows and cols:
+        diff = diff[:rows, :cols].reshape(rows // 8, 8, cols // 8, 8).mean(axis=(1, 3))
+    return float(diff.max()) <= NEAR_DUPLICATE_MAX_DIFF
+
+
+def is_decorative(pil_image: Image.Image) -> bool:
+    width, height = pil_image.size
+    return width < MIN_IMAGE_SIDE or height < MIN_IMAGE_SIDE or width * height < MIN_IMAGE_AREA
+
+
+class ImageDeduper:
+    """
+    Works out which images of one document really need vision and OCR calls.
+
+    Decorative images are dropped. Repeats of an earlier image in the same document
+    (same ``keys`` entry, e.g. a PDF xref, identical pixels, or a rescaled or recompressed
+    copy) are marked in ``repeats`` so loaders can skip them. A dHash within
+    PHASH_MAX_DISTANCE only selects which earlier images to compare block by block, since
+    unrelated text pages often share a dHash.
+    Images already analysed in an earlier document are served from a persistent cache
+    keyed by pixel digest, so captions and OCR text are only reused for the exact same
+    image. Callers run vision on ``vision_todo`` and OCR on ``ocr_todo``, then pass the
+    results to ``resolve``.
+    """
+
+    def __init__(self, images: List[Image.Image], keys: List[Any] | None = None, ocr: bool = True):
+        self.images = images
+        self.skipped: set = set()
+        self.repeats: Dict[int, int] = {}
+        self.hashes: Dict[int, str] = {}
+        self.cached: Dict[int, Dict[str, Any]] = {}
+        self.vision_todo: List[int] = []
+        self.ocr_todo: List[int] = []
+
+        by_key: Dict[Any, int] = {}
+        seen: List[Tuple[int, str, int]] = []
+        cache = _get_image_cache()
+        for i, image in enumerate(images):
+            key = keys[i] if keys is not None else None
+            if key is not None and key in by_key:
+                self.repeats[i] = by_key[key]
+                continue
+            if image is None or is_decorative(image):
+                self.skipped.add(i)
+                continue
+            phash = perceptual_hash(image)
+            digest = pixel_digest(image)
+            original = next((j for h, d, j in seen if d == digest), None)
+            if original is None:
+                original = next(
+                    (
+                        j
+                        for h, _, j in seen
+                        if bin(h ^ phash).count("1") <= PHASH_MAX_DISTANCE and _near_duplicate(images[j], image)
+                    ),
+                    None,
+                )
+            if original is not None:
+                self.repeats[i] = original
+                if key is not None:
+                    by_key[key] = original
+                continue
+            if key is not None:
+                by_key[key] = i
+            seen.append((phash, digest, i))
+            self.hashes[i] = digest
+
+            entry = cache.get_object(self.hashes[i]) or {}
+            self.cached[i] = entry
+            if "caption" not in entry:
+                self.vision_todo.append(i)
+            if ocr and "ocr" not in entry:
+                self.ocr_todo.append(i)
+
+    def is_new(self, i: int) -> bool:
+        return i not in self.skipped and i not in self.repeats
 
-        return caption, insights
-    except Exception as e:
-        return f"[VisionError] {e}", ""
+    def resolve(
+        self,
+        vision: Dict[int, Tuple[str, str]],
+        ocr: Dict[int, str] | None = None,
+    ) -> Dict[int, Dict[str, Any]]:
+        """Merge fresh results into cached ones; returns {index: {caption, insights, ocr}} for new images."""
+        cache = _get_image_cache()
+        results: Dict[int, Dict[str, Any]] = {}
+        for i, entry in self.cached.items():
+            entry = dict(entry)
+            if i in vision:
+                entry["caption"], entry["insights"] = vision[i]
+            if ocr is not None and i in ocr:
+                entry["ocr"] = ocr[i]
+            if i in vision or (ocr is not None and i in ocr):
+                stored = dict(entry)
+                # Failed vision calls are not cached, so the next document retries them.
+                if stored.get("caption", "").startswith(("[VisionError]", "[Vision client unavailable]")):
+                    stored.pop("caption")
+                    stored.pop("insights", None)
+                cache.set_object(self.hashes[i], stored)
+            results[i] = entry
+        return results
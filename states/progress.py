@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+def emit(event: str, **data: Any) -> None:
+    """
+    Push a custom event (``{"event": event, **data}``) to clients of a streamed graph run.
+
+    Nodes call this for page progress and LLM tokens. It does nothing when the graph is
+    run with ``invoke`` or the code is called outside a graph. Only call it from the node's
+    own thread: the writer is looked up from the run context.
+    """
+    try:
+        from langgraph.config import get_stream_writer
+
+        writer = get_stream_writer()
+    except Exception:
+        return
+    writer({"event": event, **data})
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from states.cache import DiskCache, text_sha256
+from states.keyword_index import tokenize
+
+QUERY_CACHE_ENABLED = os.getenv("DOCSENSE_QUERY_CACHE", "1") != "0"
+# Cosine similarity above which a new question counts as the same as a cached one.
+QUERY_CACHE_THRESHOLD = float(os.getenv("DOCSENSE_QUERY_CACHE_THRESHOLD", "0.95"))
+# Answers held in memory; the persistent tier keeps the rest.
+QUERY_CACHE_SIZE = int(os.getenv("DOCSENSE_QUERY_CACHE_SIZE", "256"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("DOCSENSE_QUERY_CACHE_MB", "256")) * 1024 * 1024
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    node_ids: List[str]
+    similarity: float
+
+
+def _codes(query: str) -> frozenset:
+    """Tokens with a digit or a joiner (``INV-2023-0042``, ``Q3``, ``2021``): questions must agree on these exactly."""
+    return frozenset(t for t in tokenize(query) if not t.isalpha())
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class SemanticQueryCache:
+    """
+    RAG answers looked up by question embedding instead of exact text.
+
+    Entries belong to one index version (see ``states.indexer.index_version``): the first
+    lookup under a new version drops the in-memory tier and purges older versions from
+    the persistent tier (a DiskCache), so an answer is never served from a changed index.
+    Every cached question's unit vector stays in one matrix, so a lookup is a single
+    matrix-vector product. Embeddings barely move when only an identifier changes, so a
+    hit also needs the same numbers and codes (``INV-2023-0042`` vs ``INV-2023-0043``) as
+    the new question. Answers are kept in an LRU of ``size`` entries; the others are read
+    back from disk on a hit.
+    """
+
+    def __init__(
+        self,
+        threshold: float = QUERY_CACHE_THRESHOLD,
+        size: int = QUERY_CACHE_SIZE,
+        name: str = "rag_queries",
+        max_bytes: int = QUERY_CACHE_MAX_BYTES,
+    ):
+        self.threshold = threshold
+        self.size = size
+        self.name = name
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._store: Optional[DiskCache] = None
+        self._keys: List[str] = []
+        self._codes: List[frozenset] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._answers: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+
+    def _switch(self, version: str) -> None:
+        if version == self._version:
+            return
+        if self._store is not None:
+            self._store.close()
+        self._store = DiskCache(self.name, version=version, max_bytes=self.max_bytes)
+        self._store.invalidate()
+        self._version = version
+        self._answers.clear()
+        entries = []
+        for key, raw in self._store.items():
+            try:
+                entries.append((key, pickle.loads(raw)))
+            except Exception:
+                continue
+        self._keys = [key for key, _ in entries]
+        self._codes = [_codes(e["query"]) for _, e in entries]
+        self._vectors = np.vstack([e["vector"] for _, e in entries]) if entries else np.zeros((0, 0), dtype=np.float32)
+        for key, entry in entries[: self.size]:
+            self._answers[key] = entry
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        self._answers[key] = entry
+        self._answers.move_to_end(key)
+        while len(self._answers) > self.size:
+            self._answers.popitem(last=False)
+
+    def lookup(self, version: str, query: str, embedding) -> Optional[CachedAnswer]:
+        """
+        The cached answer whose question is most similar to ``embedding``, if at least
+        ``threshold``, among those with the same codes as ``query``.
+        """
+        vector = _unit(embedding)
+        codes = _codes(query)
+        with self._lock:
+            self._switch(version)
+            if self._vectors.shape[0] and self._vectors.shape[1] == vector.shape[0]:
+                scores = self._vectors @ vector
+                above = np.flatnonzero(scores >= self.threshold)
+                for best in above[np.argsort(-scores[above])]:
+                    if self._codes[best] != codes:
+                        continue
+                    key = self._keys[best]
+                    entry = self._answers.get(key) or self._store.get_object(key)
+                    if entry is not None:
+                        self._remember(key, entry)
+                        self.hits += 1
+                        return CachedAnswer(entry["query"], entry["answer"], entry["node_ids"], float(scores[best]))
+            self.misses += 1
+            return None
+
+    def store(self, version: str, query: str, embedding, answer: str, node_ids: List[str]) -> None:
+        vector = _unit(embedding)
+        key = text_sha256(query)
+        entry = {"query": query, "vector": vector, "answer": answer, "node_ids": list(node_ids)}
+        with self._lock:
+            self._switch(version)
+            if key not in self._keys and (not self._vectors.size or self._vectors.shape[1] == vector.shape[0]):
+                self._keys.append(key)
+                self._codes.append(_codes(query))
+                self._vectors = vector[None, :] if not self._vectors.size else np.vstack([self._vectors, vector])
+            self._remember(key, entry)
+            self._store.set_object(key, entry)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._keys), "in_memory": len(self._answers)}
+
+
+_query_cache: Optional[SemanticQueryCache] = None
+
+
+def get_query_cache() -> SemanticQueryCache:
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = SemanticQueryCache()
+    return _query_cache
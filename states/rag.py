@@ -1,14 +1,37 @@
 from langsmith import traceable
-from model.model import model1
+from model.model import get_embed_model, get_llm
 from states.doc_state import DocState
+from states.progress import emit
+from states.query_cache import QUERY_CACHE_ENABLED, get_query_cache
 
 @traceable(name="rag",run_type='retriever')
 def Rag(state: DocState):
-    if not state.user_query or not state.index:
-        return state
-    retriever = state.index.as_retriever(similarity_top_k=3)
-    nodes = retriever.retrieve(state.user_query)
+    if not state.use_rag or not state.user_query or not state.index:
+        return {}
+    from llama_index.core import QueryBundle
+    from states.hybrid_retriever import RETRIEVAL_MODE, get_retriever
+
+    # One query embedding serves both the cache lookup and retrieval.
+    embed_model = get_embed_model()
+    embedding = embed_model.get_query_embedding(state.user_query)
+    # Entries are only comparable under the same index contents, embedding model and retrieval mode.
+    version = f"{state.index_version}:{embed_model.model_name}:{RETRIEVAL_MODE}"
+    cache = get_query_cache()
+    hit = cache.lookup(version, state.user_query, embedding) if QUERY_CACHE_ENABLED else None
+    if hit is not None:
+        emit("progress", stage="rag_cache", similarity=round(hit.similarity, 4))
+        emit("token", field="rag_response", text=hit.answer)
+        return {"rag_response": hit.answer, "retrieved_node_ids": hit.node_ids}
+
+    retriever = get_retriever(state.index, state.keyword_index)
+    nodes = retriever.retrieve(QueryBundle(query_str=state.user_query, embedding=embedding))
     context = "\n".join([n.text for n in nodes])
-    response = model1.invoke(f"Answer using context:\n{context}\nQuestion: {state.user_query}")
-    state.rag_response = response.content
-    return state
+    parts = []
+    for chunk in get_llm().stream(f"Answer using context:\n{context}\nQuestion: {state.user_query}"):
+        parts.append(chunk.content)
+        emit("token", field="rag_response", text=chunk.content)
+    answer = "".join(parts)
+    node_ids = [n.node.node_id for n in nodes]
+    if QUERY_CACHE_ENABLED:
+        cache.store(version, state.user_query, embedding, answer, node_ids)
+    return {"rag_response": answer, "retrieved_node_ids": node_ids}
@@ -0,0 +1,160 @@
+"""
+Docstore and index store for ``index_storage`` in one SQLite file.
+
+LlamaIndex's default stores are JSON files rewritten whole on every ``persist`` and parsed
+whole on every load, so each upsert cost time proportional to the corpus and so did every
+RAG request that opened the index. Here each node, hash and ref-doc entry is its own row:
+an upsert writes only the rows it touched, and opening the index reads the index struct
+but no node until one is asked for.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.index_store.keyval_index_store import KVIndexStore
+from llama_index.core.storage.index_store.utils import index_struct_to_json
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION, BaseKVStore
+
+# Files the JSON stores of earlier versions left in ``index_storage``; imported once, then removed.
+LEGACY_STORE_FILES = ("docstore.json", "index_store.json")
+
+
+class SQLiteKVStore(BaseKVStore):
+    """
+    Key/value store of JSON dicts in one SQLite table, keyed by (collection, key).
+
+    Writes join an open transaction that ``commit`` ends, so everything one index sync
+    changed becomes visible together, and a sync that fails part-way leaves the last
+    committed state (``rollback`` drops the rest). One connection is shared by all
+    threads behind a lock, as for ``DiskCache``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        # Writers are serialized by states.indexer.index_lock; wait out a checkpoint rather than fail.
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "collection TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (collection, key))"
+        )
+        self._conn.commit()
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put_all([(key, val)], collection=collection)
+
+    def put_all(self, kv_pairs: List[Tuple[str, dict]], collection: str = DEFAULT_COLLECTION, batch_size: int = 1) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO kv (collection, key, value) VALUES (?, ?, ?)",
+                [(collection, key, json.dumps(val)) for key, val in kv_pairs],
+            )
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE collection = ? AND key = ?", (collection, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM kv WHERE collection = ?", (collection,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key))
+        return cur.rowcount > 0
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put(key, val, collection)
+
+    async def aput_all(self, kv_pairs: List[Tuple[str, dict]], collection: str = DEFAULT_COLLECTION, batch_size: int = 1) -> None:
+        self.put_all(kv_pairs, collection, batch_size)
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        return self.get(key, collection)
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection)
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection)
+
+    def count(self, collection: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM kv WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def commit(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    def rollback(self) -> None:
+        with self._lock:
+            self._conn.rollback()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def import_json_stores(self, persist_dir: str, names=LEGACY_STORE_FILES) -> int:
+        """
+        Copy the collections of LlamaIndex JSON stores (``SimpleKVStore`` dumps) in
+        ``persist_dir`` into this store, commit, then delete the files. Returns the rows copied.
+        """
+        copied = 0
+        paths = [os.path.join(persist_dir, name) for name in names]
+        paths = [path for path in paths if os.path.exists(path)]
+        for path in paths:
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            for collection, entries in data.items():
+                self.put_all(list(entries.items()), collection=collection)
+                copied += len(entries)
+        if paths:
+            self.commit()
+            for path in paths:
+                os.remove(path)
+        return copied
+
+
+class SQLiteDocumentStore(KVDocumentStore):
+    """``KVDocumentStore`` over a ``SQLiteKVStore``; ``persist`` commits instead of writing a file."""
+
+    def __init__(self, kvstore: SQLiteKVStore, namespace: Optional[str] = None, batch_size: int = 256):
+        super().__init__(kvstore, namespace=namespace, batch_size=batch_size)
+
+    def persist(self, persist_path: str = "", fs=None) -> None:
+        self._kvstore.commit()
+
+    def rollback(self) -> None:
+        """Drop every uncommitted write to the shared store (index store rows included)."""
+        self._kvstore.rollback()
+
+
+class SQLiteIndexStore(KVIndexStore):
+    """``KVIndexStore`` over a ``SQLiteKVStore``; ``persist`` commits instead of writing a file."""
+
+    def __init__(self, kvstore: SQLiteKVStore, namespace: Optional[str] = None):
+        super().__init__(kvstore, namespace=namespace)
+
+    def persist(self, persist_path: str = "", fs=None) -> None:
+        self._kvstore.commit()
+
+    def add_index_struct(self, index_struct) -> None:
+        # Loading an index stores its struct again; skipping the identical write keeps a
+        # read-only open from taking the database's write lock.
+        key = index_struct.index_id
+        data = index_struct_to_json(index_struct)
+        if self._kvstore.get(key, collection=self._collection) != data:
+            self._kvstore.put(key, data, collection=self._collection)
+
+    def has_index(self) -> bool:
+        return self._kvstore.count(self._collection) > 0
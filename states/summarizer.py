@@ -1,10 +1,159 @@
 from langsmith import traceable
-from model.model import model1
+from model.model import get_llm
+from states.cache import DiskCache, text_sha256
 from states.doc_state import DocState
+from states.progress import emit
+import os
+
+# Token budget per map chunk and per reduce group; keeps every call well inside the context window.
+SUMMARY_CHUNK_TOKENS = int(os.getenv("DOCSENSE_SUMMARY_CHUNK_TOKENS", "6000"))
+SUMMARY_CONCURRENCY = int(os.getenv("DOCSENSE_SUMMARY_CONCURRENCY", "4"))
+# Bump when prompts change so cached chunk summaries are not reused.
+SUMMARY_PROMPT_VERSION = "1"
+
+MAP_PROMPT = "Summarize this text:\n"
+REDUCE_PROMPT = "Combine these partial summaries of the same document into one coherent summary:\n"
+
+_summary_cache = None
+_encoding = None
+
+
+def _get_summary_cache():
+    global _summary_cache
+    if _summary_cache is None:
+        _summary_cache = DiskCache("summaries", version=SUMMARY_PROMPT_VERSION)
+    return _summary_cache
+
+
+def count_tokens(text):
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(get_llm().model_name)
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode_ordinary(text))
+    return len(text) // 4 + 1
+
+
+def split_by_tokens(text, budget=SUMMARY_CHUNK_TOKENS):
+    """
+    Split text into line-aligned chunks of at most ``budget`` tokens.
+
+    Text that fits the budget is returned whole, so it takes a single summary call. In
+    longer text, past half the budget a chunk also closes on lines whose hash is 0 mod 8.
+    Those content-defined cut points make boundaries re-align shortly after an edit, so a
+    mostly-unchanged document reproduces most of its previous chunks (and cache hits).
+    """
+    if count_tokens(text) <= budget:
+        return [text] if text.strip() else []
+    chunks, current, used = [], [], 0
+    for line in text.splitlines():
+        tokens = count_tokens(line) + 1
+        while tokens > budget:
+            # A single line over budget (e.g. a wide table row): hard-split by characters.
+            cut = max(1, len(line) * budget // tokens)
+            if current:
+                chunks.append("\n".join(current))
+                current, used = [], 0
+            chunks.append(line[:cut])
+            line = line[cut:]
+            tokens = count_tokens(line) + 1
+        if current and used + tokens > budget:
+            chunks.append("\n".join(current))
+            current, used = [], 0
+        current.append(line)
+        used += tokens
+        if used >= budget // 2 and int(text_sha256(line)[:8], 16) % 8 == 0:
+            chunks.append("\n".join(current))
+            current, used = [], 0
+    if current:
+        chunks.append("\n".join(current))
+    return [c for c in chunks if c.strip()]
+
+
+def _summary_key(model1, prompt, text):
+    return text_sha256(f"{model1.model_name}\n{prompt}{text}")
+
+
+def _summarize_all(prompt, texts):
+    """Run ``prompt`` over every text concurrently, serving previously seen texts from the cache."""
+    cache = _get_summary_cache()
+    model1 = get_llm()
+    keys = [_summary_key(model1, prompt, t) for t in texts]
+    found = cache.get_many(keys)
+    results = [found[k].decode("utf-8") if k in found else None for k in keys]
+
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        responses = model1.batch(
+            [f"{prompt}{texts[i]}" for i in missing],
+            config={"max_concurrency": SUMMARY_CONCURRENCY},
+        )
+        for i, response in zip(missing, responses):
+            results[i] = response.content
+        cache.set_many({keys[i]: results[i].encode("utf-8") for i in missing})
+    return results
+
+
+def _summarize_final(prompt, text):
+    """The call that produces the final summary; its tokens are streamed to the client as they arrive."""
+    cache = _get_summary_cache()
+    model1 = get_llm()
+    key = _summary_key(model1, prompt, text)
+    found = cache.get(key)
+    if found is not None:
+        summary = found.decode("utf-8")
+        emit("token", field="summary", text=summary)
+        return summary
+
+    parts = []
+    for chunk in model1.stream(f"{prompt}{text}"):
+        parts.append(chunk.content)
+        emit("token", field="summary", text=chunk.content)
+    summary = "".join(parts)
+    cache.set(key, summary.encode("utf-8"))
+    return summary
+
+
+def _group_by_tokens(texts, budget):
+    groups, current, used = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def summarize_text(text, budget=SUMMARY_CHUNK_TOKENS):
+    """Map-reduce summary: summarize chunks in parallel, then merge summaries level by level."""
+    chunks = split_by_tokens(text, budget)
+    if not chunks:
+        return ""
+    if len(chunks) == 1:
+        return _summarize_final(MAP_PROMPT, chunks[0])
+
+    emit("progress", stage="summarize", chunks=len(chunks))
+    summaries = _summarize_all(MAP_PROMPT, chunks)
+    while True:
+        groups = _group_by_tokens(summaries, budget)
+        if len(groups) == len(summaries):
+            # Each summary fills a group on its own; pair them up so the reduction always progresses.
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        texts = ["\n\n".join(g) for g in groups]
+        if len(texts) == 1:
+            return _summarize_final(REDUCE_PROMPT, texts[0])
+        summaries = _summarize_all(REDUCE_PROMPT, texts)
+
 
 @traceable(name="summarizer")
 def Summarizer(state: DocState):
-    text = " ".join([doc.text for doc in state.documents])
-    result = model1.invoke(f"Summarize this text:\n{text}").content
-    state.summary = result
-    return state
+    text = "\n".join([doc.text for doc in state.documents])
+    return {"summary": summarize_text(text)}
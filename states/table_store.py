@@ -0,0 +1,228 @@
+"""
+Extracted tables as Parquet datasets addressed by id.
+
+State, the results table and API responses carry only a small reference
+(``table_id``, ``rows``, ``columns`` and source fields); rows are read back a page at a
+time with ``read_table_page`` (served by ``GET /tables/{table_id}``).
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import tempfile
+from importlib.util import find_spec
+from typing import Any, Dict, List, Optional
+
+TABLE_STORE_DIR = os.path.join("uploaded_docs", "extracted_tables")
+# Rows per Parquet row group; a page read decodes only the groups it overlaps.
+TABLE_ROW_GROUP_ROWS = int(os.getenv("DOCSENSE_TABLE_ROW_GROUP_ROWS", "10000"))
+TABLE_PAGE_MAX_ROWS = int(os.getenv("DOCSENSE_TABLE_PAGE_MAX_ROWS", "1000"))
+
+_HAS_PYARROW = find_spec("pyarrow") is not None
+_ID_RE = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9._-]*")
+_INFO_FILE = "_table.json"
+
+
+def make_table_id(digest: str, suffix: str = "") -> str:
+    """Content-addressed id: the source file's SHA-256 prefix, plus e.g. the sheet name or table index."""
+    name = digest[:16] + (f"_{suffix}" if suffix else "")
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+
+
+def table_dir(table_id: str) -> str:
+    if not _ID_RE.fullmatch(table_id or ""):
+        raise ValueError(f"Invalid table id: {table_id!r}")
+    return os.path.join(TABLE_STORE_DIR, table_id)
+
+
+def table_info(table_id: str) -> Optional[Dict[str, Any]]:
+    """``{"table_id", "rows", "columns"}`` for a stored table, or None if there is none."""
+    try:
+        with open(os.path.join(table_dir(table_id), _INFO_FILE), encoding="utf-8") as fh:
+            info = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return {"table_id": table_id, "rows": info["rows"], "columns": info["columns"]}
+
+
+def table_exists(table_id: str) -> bool:
+    return table_info(table_id) is not None
+
+
+def _promote(a, b):
+    """Common Arrow type for a column whose inferred type differs between chunks."""
+    import pyarrow as pa
+
+    if a == b:
+        return a
+    if pa.types.is_null(a):
+        return b
+    if pa.types.is_null(b):
+        return a
+    if pa.types.is_integer(a) and pa.types.is_integer(b):
+        if pa.types.is_signed_integer(a) == pa.types.is_signed_integer(b):
+            return a if a.bit_width >= b.bit_width else b
+        return pa.int64()
+    if (pa.types.is_integer(a) or pa.types.is_floating(a)) and (pa.types.is_integer(b) or pa.types.is_floating(b)):
+        return pa.float64()
+    if pa.types.is_dictionary(a) and pa.types.is_dictionary(b):
+        return pa.dictionary(pa.int32(), _promote(a.value_type, b.value_type))
+    return pa.string()
+
+
+class ParquetSink:
+    """
+    Writes a table chunk by chunk as the parts of one stored dataset.
+
+    Each chunk keeps the types pandas inferred for it; when a later chunk disagrees (an int
+    column that turns float, text in a numeric column), the column is widened and only the
+    parts written with the narrower type are rewritten on ``close``. Parts go to a private
+    temporary directory that ``close`` renames into place, so concurrent ingests never touch
+    a table that readers can see. Ids are content-addressed: when the table is already
+    stored, nothing is written and ``close`` returns the stored table's info.
+    """
+
+    def __init__(self, table_id: str):
+        self.table_id = table_id
+        self.directory = table_dir(table_id)
+        self.rows = 0
+        self.parts: List[str] = []
+        self.schemas: List[Any] = []
+        self.schema = None
+        self.existing = table_info(table_id)
+        self.tmp_dir = None
+        if self.existing is None:
+            os.makedirs(TABLE_STORE_DIR, exist_ok=True)
+            self.tmp_dir = tempfile.mkdtemp(prefix=f".tmp-{table_id}-", dir=TABLE_STORE_DIR)
+
+    def write(self, chunk) -> None:
+        if self.existing is not None:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed Python objects in one column: store that text as written.
+            mixed = {col: chunk[col].astype("string") for col in chunk.columns if chunk[col].dtype == object}
+            table = pa.Table.from_pandas(chunk.assign(**mixed), preserve_index=False)
+        table = table.replace_schema_metadata(None)
+
+        if self.schema is None:
+            self.schema = table.schema
+        else:
+            self.schema = pa.schema(
+                [pa.field(f.name, _promote(f.type, table.schema.field(f.name).type)) for f in self.schema]
+            )
+        path = os.path.join(self.tmp_dir, f"part-{len(self.parts):05d}.parquet")
+        pq.write_table(table, path, compression="zstd", row_group_size=TABLE_ROW_GROUP_ROWS)
+        self.parts.append(path)
+        self.schemas.append(table.schema)
+        self.rows += table.num_rows
+
+    def close(self) -> Dict[str, Any]:
+        if self.existing is not None:
+            return self.existing
+        import pyarrow.parquet as pq
+
+        for path, schema in zip(self.parts, self.schemas):
+            if schema != self.schema:
+                table = pq.read_table(path).cast(self.schema)
+                pq.write_table(table, path, compression="zstd", row_group_size=TABLE_ROW_GROUP_ROWS)
+        columns = list(self.schema.names) if self.schema is not None else []
+        with open(os.path.join(self.tmp_dir, _INFO_FILE), "w", encoding="utf-8") as fh:
+            json.dump({"rows": self.rows, "columns": columns}, fh)
+        self._publish()
+        return table_info(self.table_id) or {"table_id": self.table_id, "rows": self.rows, "columns": columns}
+
+    def _publish(self) -> None:
+        """Rename the finished parts into place, unless another ingest of the same content got there first."""
+        try:
+            os.rename(self.tmp_dir, self.directory)
+            return
+        except OSError:
+            if table_exists(self.table_id):
+                self.discard()
+                return
+        # A directory without table info is a write interrupted before this scheme; nobody reads it.
+        stale = tempfile.mkdtemp(prefix=f".stale-{self.table_id}-", dir=TABLE_STORE_DIR)
+        try:
+            os.replace(self.directory, stale)
+            os.rename(self.tmp_dir, self.directory)
+        except OSError:
+            self.discard()
+        shutil.rmtree(stale, ignore_errors=True)
+
+    def discard(self) -> None:
+        """Drop the parts written so far (e.g. when the ingest fails)."""
+        if self.tmp_dir is not None:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def write_table(df, table_id: str) -> Optional[Dict[str, Any]]:
+    """Store one DataFrame under ``table_id``; returns its info, or None when pyarrow is not installed."""
+    if not _HAS_PYARROW:
+        return None
+    sink = ParquetSink(table_id)
+    try:
+        sink.write(df)
+        return sink.close()
+    except Exception:
+        sink.discard()
+        raise
+
+
+def _read_rows(table_id: str, offset: int, limit: int):
+    """Arrow table of rows ``offset`` to ``offset + limit``; only the row groups overlapping them are read."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    directory = table_dir(table_id)
+    pieces = []
+    skip, need = offset, limit
+    for name in sorted(os.listdir(directory)):
+        if need <= 0:
+            break
+        if not name.endswith(".parquet"):
+            continue
+        parquet = pq.ParquetFile(os.path.join(directory, name))
+        if skip >= parquet.metadata.num_rows:
+            skip -= parquet.metadata.num_rows
+            continue
+        for group in range(parquet.num_row_groups):
+            size = parquet.metadata.row_group(group).num_rows
+            if skip >= size:
+                skip -= size
+                continue
+            piece = parquet.read_row_group(group).slice(skip, need)
+            skip = 0
+            pieces.append(piece)
+            need -= piece.num_rows
+            if need <= 0:
+                break
+    return pa.concat_tables(pieces) if pieces else None
+
+
+def read_table_page(table_id: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+    """Rows ``offset`` to ``offset + limit`` of a stored table as records, with the table's size and columns."""
+    info = table_info(table_id)
+    if info is None:
+        return None
+    offset = max(0, offset)
+    limit = max(0, min(limit, TABLE_PAGE_MAX_ROWS))
+    rows = _read_rows(table_id, offset, limit)
+    return {**info, "offset": offset, "limit": limit, "data": rows.to_pylist() if rows is not None else []}
+
+
+def read_table_frame(table: Any, limit: int):
+    """
+    Leading ``limit`` rows of an ``extracted_tables`` entry as a typed DataFrame, read straight
+    from Parquet; None when the entry is not a stored table (inline records, pyarrow missing).
+    """
+    if not (isinstance(table, dict) and table.get("table_id")) or not table_exists(table["table_id"]):
+        return None
+    rows = _read_rows(table["table_id"], 0, limit)
+    return rows.to_pandas() if rows is not None else None
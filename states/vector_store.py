@@ -0,0 +1,381 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from pydantic import PrivateAttr
+
+from states.ann import IVFIndex
+
+VECTORS_FILE = "vectors.bin"
+META_FILE = "vectors_meta.json"
+LEGACY_JSON_FILE = "default__vector_store.json"
+
+# Rows scored per block when the stored dtype has to be upcast (float16).
+_SCORE_BLOCK = 65536
+# Rewrite the vector file once this share of rows are tombstones.
+_COMPACT_RATIO = 0.3
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _filterable(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep the small scalar metadata used for filtering; long text (captions, OCR) stays in the docstore."""
+    out = {}
+    for key, value in (metadata or {}).items():
+        if isinstance(value, (int, float, bool)) or (isinstance(value, str) and len(value) <= 256):
+            out[key] = value
+    return out
+
+
+def _matches(metadata: Dict[str, Any], filters: Optional[MetadataFilters]) -> bool:
+    if filters is None or not filters.filters:
+        return True
+    results = []
+    for f in filters.filters:
+        if isinstance(f, MetadataFilters):
+            results.append(_matches(metadata, f))
+            continue
+        value = metadata.get(f.key)
+        if f.operator == FilterOperator.EQ:
+            results.append(value == f.value)
+        elif f.operator == FilterOperator.NE:
+            results.append(value != f.value)
+        elif f.operator == FilterOperator.IN:
+            results.append(value in f.value)
+        elif f.operator == FilterOperator.NIN:
+            results.append(value not in f.value)
+        else:
+            raise NotImplementedError(f"Unsupported filter operator: {f.operator}")
+    if filters.condition == FilterCondition.OR:
+        return any(results)
+    return all(results)
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Vector store keeping L2-normalised embeddings in one contiguous binary file.
+
+    Persisted rows are opened with ``np.memmap`` (so loading does not read the vectors),
+    rows added since the last persist are held in memory, and ``persist`` appends only
+    those new rows. Node ids, ref doc ids and scalar metadata live in a JSON sidecar.
+    Deletes are tombstones until enough accumulate to compact the file. Text is not
+    stored here; the index resolves result ids through its docstore.
+
+    With ``ann_mode="ivf"`` an IVF index (``states.ann.IVFIndex``) is built and persisted
+    beside the vectors once the store holds ``ann_min_rows`` rows; queries then score only
+    the ``ann_nprobe`` closest cells plus rows added since the last build. ``nprobe`` can
+    also be passed per query through the retriever's ``vector_store_kwargs``.
+    """
+
+    stores_text: bool = False
+    is_embedding_query: bool = True
+    persist_dir: str
+    dtype: str = "float32"
+    ann_mode: str = "exact"
+    ann_nlist: int = 0
+    ann_nprobe: int = 8
+    ann_min_rows: int = 20000
+    # Rebuild the IVF cells once this share of rows has been appended since the last build.
+    ann_rebuild_ratio: float = 0.2
+
+    _dim: Optional[int] = PrivateAttr(default=None)
+    _ids: List[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: List[Optional[str]] = PrivateAttr(default_factory=list)
+    _metadata: List[Dict[str, Any]] = PrivateAttr(default_factory=list)
+    _row_by_id: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _deleted: Set[int] = PrivateAttr(default_factory=set)
+    _matrix: Optional[np.ndarray] = PrivateAttr(default=None)
+    _persisted_rows: int = PrivateAttr(default=0)
+    _pending: List[np.ndarray] = PrivateAttr(default_factory=list)
+    _dirty: bool = PrivateAttr(default=False)
+    _ann: Optional[IVFIndex] = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, dtype: str = "float32", **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(persist_dir=persist_dir, dtype=dtype, **kwargs)
+        meta_path = os.path.join(persist_dir, META_FILE)
+        legacy_path = os.path.join(persist_dir, LEGACY_JSON_FILE)
+        if os.path.exists(meta_path):
+            store._load()
+        elif os.path.exists(legacy_path):
+            store._migrate_simple_store(legacy_path)
+            store.persist()
+        return store
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def _load(self) -> None:
+        with open(os.path.join(self.persist_dir, META_FILE), "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        self.dtype = meta["dtype"]
+        self._dim = meta["dim"]
+        self._ids = meta["ids"]
+        self._ref_doc_ids = meta["ref_doc_ids"]
+        self._metadata = meta["metadata"]
+        self._deleted = set(meta["deleted"])
+        self._row_by_id = {node_id: row for row, node_id in enumerate(self._ids) if row not in self._deleted}
+        self._persisted_rows = len(self._ids)
+        self._truncate_orphan_rows()
+        self._open_matrix()
+        if self.ann_mode == "ivf":
+            self._ann = IVFIndex.load(self.persist_dir)
+            if self._ann is not None and self._ann.rows > self._persisted_rows:
+                self._ann = None
+
+    def _truncate_orphan_rows(self) -> None:
+        """Drop rows written after the last metadata save (flush or crash), so appends stay aligned with ``_ids``."""
+        path = os.path.join(self.persist_dir, VECTORS_FILE)
+        if not self._dim or not os.path.exists(path):
+            return
+        expected = self._persisted_rows * self._dim * np.dtype(self.dtype).itemsize
+        if os.path.getsize(path) > expected:
+            with open(path, "r+b") as fh:
+                fh.truncate(expected)
+
+    def _open_matrix(self) -> None:
+        path = os.path.join(self.persist_dir, VECTORS_FILE)
+        if self._persisted_rows and self._dim:
+            self._matrix = np.memmap(path, dtype=self.dtype, mode="r", shape=(self._persisted_rows, self._dim))
+        else:
+            self._matrix = None
+
+    def _migrate_simple_store(self, path: str) -> None:
+        """Import the embeddings of a SimpleVectorStore JSON file written by earlier versions."""
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        ref_ids = data.get("text_id_to_ref_doc_id", {})
+        metadata = data.get("metadata_dict", {})
+        for node_id, embedding in data.get("embedding_dict", {}).items():
+            self._append(node_id, ref_ids.get(node_id), metadata.get(node_id, {}), embedding)
+
+    def _append(self, node_id: str, ref_doc_id: Optional[str], metadata: Dict[str, Any], embedding) -> None:
+        vector = _normalize(np.asarray(embedding, dtype=np.float32))
+        if self._dim is None:
+            self._dim = vector.shape[0]
+        elif vector.shape[0] != self._dim:
+            raise ValueError(f"Embedding dimension {vector.shape[0]} does not match store dimension {self._dim}")
+        if node_id in self._row_by_id:
+            self._deleted.add(self._row_by_id[node_id])
+        self._row_by_id[node_id] = len(self._ids)
+        self._ids.append(node_id)
+        self._ref_doc_ids.append(ref_doc_id)
+        self._metadata.append(_filterable(metadata))
+        self._pending.append(vector)
+        self._dirty = True
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        for node in nodes:
+            self._append(node.node_id, node.ref_doc_id, node.metadata, node.get_embedding())
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        for row, rid in enumerate(self._ref_doc_ids):
+            if rid == ref_doc_id and row not in self._deleted:
+                self._deleted.add(row)
+                self._row_by_id.pop(self._ids[row], None)
+                self._dirty = True
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters: Optional[MetadataFilters] = None, **kwargs: Any) -> None:
+        for node_id in node_ids or []:
+            row = self._row_by_id.pop(node_id, None)
+            if row is not None:
+                self._deleted.add(row)
+                self._dirty = True
+
+    def clear(self) -> None:
+        self._deleted.update(range(len(self._ids)))
+        self._row_by_id = {}
+        self._dirty = True
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        parts = []
+        if self._matrix is not None:
+            if self._matrix.dtype == np.float32:
+                parts.append(self._matrix @ query)
+            else:
+                parts.append(
+                    np.concatenate([
+                        self._matrix[start:start + _SCORE_BLOCK].astype(np.float32) @ query
+                        for start in range(0, self._persisted_rows, _SCORE_BLOCK)
+                    ])
+                )
+        if self._pending:
+            parts.append(np.vstack(self._pending) @ query)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.float32)
+
+    def _row_scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Scores for a sorted subset of rows (ANN candidates)."""
+        scores = np.empty(len(rows), dtype=np.float32)
+        split = int(np.searchsorted(rows, self._persisted_rows))
+        if split:
+            scores[:split] = np.asarray(self._matrix[rows[:split]], dtype=np.float32) @ query
+        if split < len(rows):
+            scores[split:] = np.vstack(self._pending)[rows[split:] - self._persisted_rows] @ query
+        return scores
+
+    def _candidate_mask(self, query: VectorStoreQuery) -> Optional[np.ndarray]:
+        if not (self._deleted or query.doc_ids or query.node_ids or query.filters):
+            return None
+        mask = np.ones(len(self._ids), dtype=bool)
+        if self._deleted:
+            mask[list(self._deleted)] = False
+        doc_ids = set(query.doc_ids or [])
+        node_ids = set(query.node_ids or [])
+        if doc_ids or node_ids or query.filters:
+            for row in np.flatnonzero(mask):
+                if doc_ids and self._ref_doc_ids[row] not in doc_ids:
+                    mask[row] = False
+                elif node_ids and self._ids[row] not in node_ids:
+                    mask[row] = False
+                elif not _matches(self._metadata[row], query.filters):
+                    mask[row] = False
+        return mask
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.query_embedding is None or not self._ids:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        q = _normalize(np.asarray(query.query_embedding, dtype=np.float32))
+        mask = self._candidate_mask(query)
+        if self._ann is not None:
+            nprobe = int(kwargs.get("nprobe", self.ann_nprobe))
+            rows = np.unique(np.concatenate([
+                self._ann.candidates(q, nprobe),
+                np.arange(self._ann.rows, len(self._ids)),
+            ]))
+            scores = self._row_scores(rows, q)
+            if mask is not None:
+                scores = np.where(mask[rows], scores, -np.inf)
+        else:
+            rows = None
+            scores = self._scores(q)
+            if mask is not None:
+                scores = np.where(mask, scores, -np.inf)
+
+        available = int(np.isfinite(scores).sum())
+        k = min(query.similarity_top_k, available)
+        if k <= 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = rows[top] if rows is not None else top
+        return VectorStoreQueryResult(
+            nodes=None,
+            similarities=[float(scores[i]) for i in top],
+            ids=[self._ids[i] for i in hits],
+        )
+
+    def flush(self) -> None:
+        """
+        Move pending rows from memory to the end of the vector file without rewriting the metadata.
+
+        Bulk ingestion calls this after every batch so memory holds one batch of embeddings, not
+        the corpus. The rows only count as stored once ``persist`` records their ids.
+        """
+        if not self._pending:
+            return
+        os.makedirs(self.persist_dir, exist_ok=True)
+        self._truncate_orphan_rows()
+        with open(os.path.join(self.persist_dir, VECTORS_FILE), "ab") as fh:
+            fh.write(np.vstack(self._pending).astype(self.dtype).tobytes())
+        self._persisted_rows = len(self._ids)
+        self._pending = []
+        self._open_matrix()
+
+    def persist(self, persist_path: Optional[str] = None, fs: Any = None) -> None:
+        """
+        Write new rows to disk. ``persist_path`` is the file name StorageContext would use for
+        a JSON store; only its directory is used.
+        """
+        if persist_path:
+            self.persist_dir = os.path.dirname(persist_path) or self.persist_dir
+        if not self._dirty:
+            return
+        os.makedirs(self.persist_dir, exist_ok=True)
+        vectors_path = os.path.join(self.persist_dir, VECTORS_FILE)
+
+        if len(self._deleted) > _COMPACT_RATIO * max(len(self._ids), 1):
+            self._compact(vectors_path)
+            # Row numbers changed, so the IVF lists are stale.
+            self._ann = None
+            IVFIndex.remove(self.persist_dir)
+        elif self._pending:
+            self._truncate_orphan_rows()
+            with open(vectors_path, "ab") as fh:
+                fh.write(np.vstack(self._pending).astype(self.dtype).tobytes())
+            self._persisted_rows = len(self._ids)
+            self._pending = []
+
+        meta = {
+            "dim": self._dim,
+            "dtype": self.dtype,
+            "ids": self._ids,
+            "ref_doc_ids": self._ref_doc_ids,
+            "metadata": self._metadata,
+            "deleted": sorted(self._deleted),
+        }
+        tmp_path = os.path.join(self.persist_dir, META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp_path, os.path.join(self.persist_dir, META_FILE))
+        self._open_matrix()
+        self._maybe_build_ann()
+        self._dirty = False
+
+    def _maybe_build_ann(self) -> None:
+        if self.ann_mode != "ivf" or self._matrix is None or self._persisted_rows < self.ann_min_rows:
+            return
+        if self._ann is not None and self._persisted_rows - self._ann.rows <= self.ann_rebuild_ratio * self._ann.rows:
+            return
+        exclude = np.zeros(self._persisted_rows, dtype=bool)
+        if self._deleted:
+            exclude[list(self._deleted)] = True
+        self._ann = IVFIndex.build(self._matrix, nlist=self.ann_nlist, exclude=exclude)
+        self._ann.save(self.persist_dir)
+
+    def _compact(self, vectors_path: str) -> None:
+        live = [row for row in range(len(self._ids)) if row not in self._deleted]
+        pending = np.vstack(self._pending) if self._pending else None
+        tmp_path = vectors_path + ".tmp"
+        with open(tmp_path, "wb") as fh:
+            for start in range(0, len(live), _SCORE_BLOCK):
+                rows = np.asarray(live[start:start + _SCORE_BLOCK])
+                block = []
+                persisted = rows[rows < self._persisted_rows]
+                if len(persisted):
+                    block.append(np.asarray(self._matrix[persisted], dtype=np.float32))
+                fresh = rows[rows >= self._persisted_rows]
+                if len(fresh):
+                    block.append(pending[fresh - self._persisted_rows])
+                fh.write(np.vstack(block).astype(self.dtype).tobytes())
+        self._matrix = None
+        os.replace(tmp_path, vectors_path)
+
+        self._ids = [self._ids[row] for row in live]
+        self._ref_doc_ids = [self._ref_doc_ids[row] for row in live]
+        self._metadata = [self._metadata[row] for row in live]
+        self._row_by_id = {node_id: row for row, node_id in enumerate(self._ids)}
+        self._deleted = set()
+        self._persisted_rows = len(self._ids)
+        self._pending = []
@@ -1,69 +1,212 @@
 # backend/states/visualizer.py
+import json
+import multiprocessing
 import os
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
 
-def auto_chart_from_table(table):
+from states.cache import text_sha256
+from states.table_store import _HAS_PYARROW, read_table_frame
+
+CHART_DIR = os.getenv("DOCSENSE_CHART_DIR", "visuals")
+# "png"/"svg" render files; "spec" returns only the chart data for the client to draw.
+CHART_FORMATS = ("png", "svg", "spec")
+# Bump when rendering changes so previously rendered files are not reused.
+CHART_RENDER_VERSION = "2"
+WORDCLOUD_MAX_WORDS = 200
+# Worker processes for rendering; a request only uses them with at least CHART_POOL_MIN charts to draw.
+CHART_WORKERS = int(os.getenv("DOCSENSE_CHART_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHART_POOL_MIN = int(os.getenv("DOCSENSE_CHART_POOL_MIN", "4"))
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+# Rows read from a stored table for its chart; past this the chart covers the first rows and its title says so.
+CHART_MAX_ROWS = int(os.getenv("DOCSENSE_CHART_MAX_ROWS", "1000000"))
+# Points one chart spec carries. Longer bar and time-series data is aggregated, longer scatter,
+# histogram and line data is sampled at an even stride; either way the title says so.
+CHART_MAX_POINTS = int(os.getenv("DOCSENSE_CHART_MAX_POINTS", "5000"))
+
+# Share of non-empty cells that must parse for a column to count as numeric / as dates.
+NUMERIC_RATIO = float(os.getenv("DOCSENSE_CHART_NUMERIC_RATIO", "0.9"))
+DATE_RATIO = float(os.getenv("DOCSENSE_CHART_DATE_RATIO", "0.9"))
+# Cells tried first before a whole column is parsed; most columns of another type are rejected here.
+_PROBE_CELLS = 50
+
+
+def _ratio(parsed, present):
+    total = int(present.sum())
+    return int((parsed & present).sum()) / total if total else 0.0
+
+
+def _frame(table):
     """
-    Clean + simplified version of auto chart detection.
-    Detects numeric and categorical columns and chooses:
-    - Line     (if row count > 8 and numeric)
-    - Bar      (if categorical + numeric)
-    - Scatter  (if 2 numeric)
-    - Histogram (if 1 numeric)
+    DataFrame from row dicts. pyarrow converts uniform rows in C; rows with differing keys
+    or mixed-type columns are pivoted column by column (still cheaper than DataFrame(records)).
     """
-    if not table or not isinstance(table, list):
-        return None
+    import itertools
 
-    # Convert rows → columns
-    columns = {}
-    for row in table:
-        for k, v in row.items():
-            columns.setdefault(k, []).append(v)
+    import pandas as pd
 
-    if len(columns) == 0:
-        return None
+    names = list(dict.fromkeys(itertools.chain.from_iterable(table)))
+    if _HAS_PYARROW and names == list(table[0]):
+        import pyarrow as pa
 
-    def is_numeric(val):
         try:
-            return float(str(val).replace(",", "").replace("%", "").replace("$", "")) or True
-        except:
-            return False
+            return pa.Table.from_pylist(table).to_pandas()
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+    return pd.DataFrame({name: [row.get(name) for row in table] for name in names})
 
-    def clean_num(val):
-        try:
-            return float(str(val).replace(",", "").replace("%", "").replace("$", ""))
-        except:
-            return 0.0
 
-    numeric_cols = []
-    categorical_cols = []
+def _to_float(text):
+    """A plain cast when every cell parses (no per-cell Python); otherwise to_numeric with coercion."""
+    import pandas as pd
 
-    for col, vals in columns.items():
-        if all(is_numeric(v) for v in vals if v not in ["", None]):
-            numeric_cols.append(col)
-        else:
-            categorical_cols.append(col)
+    try:
+        return text.astype("float64")
+    except (TypeError, ValueError):
+        return pd.to_numeric(text, errors="coerce")
+
+
+def classify_columns(df):
+    """
+    Type every column in one vectorized pass.
+
+    Returns ``(numeric, dates, categorical)``: numeric maps column -> float Series with
+    ``,``/``%``/``$`` stripped (unparseable cells are 0.0), dates maps column -> datetime
+    Series, categorical lists the remaining columns. Booleans count as categorical.
+    """
+    import warnings
+
+    import pandas as pd
+
+    numeric, dates, categorical = {}, {}, []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            categorical.append(col)
+            continue
+        if pd.api.types.is_numeric_dtype(series):
+            numeric[col] = series.astype("float64").fillna(0.0)
+            continue
+        if pd.api.types.is_datetime64_any_dtype(series):
+            dates[col] = series
+            continue
+
+        text = series.astype("string").str.strip()
+        present = text.notna() & (text != "")
+        if not present.any():
+            # Only empty cells: the old per-cell check counted these as numeric.
+            numeric[col] = pd.Series(0.0, index=series.index)
+            continue
+
+        cleaned = text
+        for symbol in ",%$":
+            # Literal replaces: several times faster than one regex over the column.
+            cleaned = cleaned.str.replace(symbol, "", regex=False)
+        probe = cleaned[present].head(_PROBE_CELLS)
+        if pd.to_numeric(probe, errors="coerce").notna().mean() >= NUMERIC_RATIO:
+            values = _to_float(cleaned.where(present))
+            if _ratio(values.notna(), present) >= NUMERIC_RATIO:
+                numeric[col] = values.astype("float64").fillna(0.0)
+                continue
+
+        with warnings.catch_warnings():
+            # No common format: pandas warns and falls back to per-cell parsing.
+            warnings.simplefilter("ignore")
+            probe = text[present].head(_PROBE_CELLS)
+            # Text without digits ("north", "yes") is never a date; skip the slow per-cell fallback.
+            if (
+                probe.str.contains(r"\d", regex=True).mean() >= DATE_RATIO
+                and pd.to_datetime(probe, errors="coerce").notna().mean() >= DATE_RATIO
+            ):
+                parsed = pd.to_datetime(text, errors="coerce")
+                if _ratio(parsed.notna(), present) >= DATE_RATIO:
+                    dates[col] = parsed
+                    continue
+        categorical.append(col)
+    return numeric, dates, categorical
+
+
+def _stride(values, limit):
+    """Every k-th item, with k the smallest step that keeps at most ``limit``; returns (items, k)."""
+    step = max(1, -(-len(values) // limit))
+    return values[::step], step
+
+
+def _sampled(title, step, total):
+    return f"{title} (every {step}th of {total:,} rows)" if step > 1 else title
+
+
+def auto_chart_from_table(table):
+    """
+    Detects numeric, date and categorical columns and chooses:
+    - Line      (date + numeric: the numeric column summed per date, in date order)
+    - Scatter   (if 2 numeric)
+    - Histogram (if 1 numeric)
+    - Bar       (if categorical + numeric)
+    - Line      (if row count > 8 and numeric)
+    ``table`` is a list of row dicts or a DataFrame. Every row is used; past CHART_MAX_POINTS
+    values the chart is aggregated or sampled as noted in its title.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(table, pd.DataFrame):
+        df = table
+    elif table and isinstance(table, list):
+        df = _frame(table)
+    else:
+        return None
+
+    if len(df.columns) == 0:
+        return None
+
+    numeric, dates, categorical = classify_columns(df)
+    numeric_cols = list(numeric)
+    categorical_cols = categorical
 
     # ----- CHART DECISIONS -----
 
+    # 0) TIME SERIES → a date column and a numeric column
+    if dates and numeric_cols:
+        date_col, num = next(iter(dates)), numeric_cols[0]
+        series = numeric[num].groupby(dates[date_col]).sum().sort_index()
+        title = f"{num} over {date_col}"
+        if len(series) > CHART_MAX_POINTS:
+            # Consecutive dates summed into equal-size buckets, labelled by their first date.
+            step = -(-len(series) // CHART_MAX_POINTS)
+            totals = series.groupby(np.arange(len(series)) // step).sum()
+            series = pd.Series(totals.to_numpy(), index=series.index[::step])
+            title = f"{title} (summed per {step} dates)"
+        return {
+            "type": "line",
+            "title": title,
+            "x_type": "date",
+            "labels": series.index.astype(str).tolist(),
+            "values": series.tolist(),
+        }
+
     # 1) SCATTER → if two numeric columns
     if len(numeric_cols) >= 2:
         x, y = numeric_cols[:2]
+        xs, step = _stride(numeric[x], CHART_MAX_POINTS)
         return {
             "type": "scatter",
-            "title": f"{y} vs {x}",
-            "labels": [clean_num(v) for v in columns[x]],
-            "values": [clean_num(v) for v in columns[y]],
+            "title": _sampled(f"{y} vs {x}", step, len(df)),
+            "labels": xs.tolist(),
+            "values": numeric[y][::step].tolist(),
         }
 
     # 2) HISTOGRAM → if one numeric column only
     if len(numeric_cols) == 1 and len(categorical_cols) == 0:
         col = numeric_cols[0]
+        values, step = _stride(numeric[col], CHART_MAX_POINTS)
         return {
             "type": "histogram",
-            "title": f"Distribution of {col}",
-            "values": [clean_num(v) for v in columns[col]],
+            "title": _sampled(f"Distribution of {col}", step, len(df)),
+            "values": values.tolist(),
         }
 
     # 3) BAR → category + numeric
@@ -71,85 +214,192 @@ def auto_chart_from_table(table):
         cat = categorical_cols[0]
         num = numeric_cols[0]
 
+        if len(df) <= CHART_MAX_POINTS:
+            return {
+                "type": "bar",
+                "title": f"{num} by {cat}",
+                "labels": df[cat].tolist(),
+                "values": numeric[num].tolist(),
+            }
+        # One bar per row is unreadable and unbounded: total per category, largest first.
+        totals = numeric[num].groupby(df[cat].astype("string").fillna("")).sum().sort_values(ascending=False)
+        title = f"Total {num} by {cat}"
+        if len(totals) > CHART_MAX_POINTS:
+            title = f"{title} (top {CHART_MAX_POINTS:,} of {len(totals):,})"
+            totals = totals.head(CHART_MAX_POINTS)
         return {
             "type": "bar",
-            "title": f"{num} by {cat}",
-            "labels": columns[cat],
-            "values": [clean_num(v) for v in columns[num]]
+            "title": title,
+            "labels": totals.index.tolist(),
+            "values": totals.tolist(),
         }
 
     # 4) LINE → if numeric only and many rows
-    if len(numeric_cols) == 1 and len(columns[numeric_cols[0]]) > 8:
+    if len(numeric_cols) == 1 and len(df) > 8:
         col = numeric_cols[0]
+        values, step = _stride(numeric[col], CHART_MAX_POINTS)
         return {
             "type": "line",
-            "title": f"Trend of {col}",
-            "labels": list(range(len(columns[col]))),
-            "values": [clean_num(v) for v in columns[col]]
+            "title": _sampled(f"Trend of {col}", step, len(df)),
+            "labels": list(range(0, len(df), step)),
+            "values": values.tolist(),
         }
 
     return None
 
 
+def chart_key(chart, fmt):
+    """Content hash of a chart spec and output format; names the rendered file."""
+    spec = {k: v for k, v in chart.items() if k not in ("file", "format", "key")}
+    payload = json.dumps({"version": CHART_RENDER_VERSION, "format": fmt, **spec}, sort_keys=True, default=str)
+    return text_sha256(payload)[:24]
+
+
 def render_chart(chart, file_path):
-    """Simplified chart rendering with clean matplotlib."""
+    """
+    Draw ``chart`` to ``file_path`` (.png or .svg) on a standalone Agg figure; no pyplot global
+    state, so renders can run concurrently. The file is written under a temporary name and
+    moved into place, so a reader never sees a partial image.
+    """
     ctype = chart["type"]
-    title = chart["title"]
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fmt = os.path.splitext(file_path)[1].lstrip(".")
 
-    plt.figure(figsize=(10, 6))
-    plt.title(title, fontsize=14)
+    if ctype == "wordcloud":
+        from wordcloud import WordCloud
+
+        wc = WordCloud(width=800, height=400, random_state=0).generate_from_frequencies(chart["words"])
+        if fmt == "svg":
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                fh.write(wc.to_svg())
+        else:
+            wc.to_image().save(tmp_path, format="PNG")
+        os.replace(tmp_path, file_path)
+        return file_path
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_title(chart["title"], fontsize=14)
 
     if ctype == "bar":
-        labels = chart["labels"]
-        values = chart["values"]
-        plt.bar(labels, values)
-        plt.xticks(rotation=45)
+        ax.bar([str(label) for label in chart["labels"]], chart["values"])
+        ax.tick_params(axis="x", labelrotation=45)
 
     elif ctype == "line":
-        plt.plot(chart["labels"], chart["values"], marker="o")
+        labels = chart["labels"]
+        if chart.get("x_type") == "date":
+            import pandas as pd
+
+            labels = pd.to_datetime(labels)
+            ax.tick_params(axis="x", labelrotation=45)
+        ax.plot(labels, chart["values"], marker="o")
 
     elif ctype == "scatter":
-        plt.scatter(chart["labels"], chart["values"])
+        ax.scatter(chart["labels"], chart["values"])
 
     elif ctype == "histogram":
-        plt.hist(chart["values"], bins=10)
+        ax.hist(chart["values"], bins=10)
 
-    plt.tight_layout()
-    plt.savefig(file_path)
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(tmp_path, format=fmt)
+    os.replace(tmp_path, file_path)
+    return file_path
 
 
-def Visualizer(state):
-    """Simple & clean visualizer with auto charts and wordcloud fallback."""
-    text = state.summary or state.rag_response or ""
-    tables = getattr(state, "extracted_tables", [])
+def _get_render_pool():
+    global _render_pool
+    if CHART_WORKERS <= 1:
+        return None
+    with _render_pool_lock:
+        if _render_pool is None:
+            # Spawned, not forked: the pool is created from a request thread, and a fork would copy
+            # the server's locks and connections mid-use.
+            _render_pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+
+def _render_inline(chart, path):
+    future = Future()
+    try:
+        future.set_result(render_chart(chart, path))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def render_charts(charts, fmt="png"):
+    """
+    Attach an output to every chart spec. ``spec`` leaves rendering to the client; for
+    ``png``/``svg`` each chart is written once to ``CHART_DIR/<spec hash>.<fmt>`` and later
+    identical charts reuse the file. With CHART_POOL_MIN or more charts to draw they render
+    in a process pool. Charts that fail to render are returned as specs.
+    """
+    rendered = []
+    todo = []
+    for chart in charts:
+        chart = {**chart, "key": chart_key(chart, fmt), "format": fmt}
+        if fmt in ("png", "svg"):
+            path = os.path.join(CHART_DIR, f"{chart['key']}.{fmt}")
+            if os.path.exists(path):
+                chart["file"] = path
+            else:
+                todo.append((chart, path))
+        rendered.append(chart)
 
-    os.makedirs("visuals", exist_ok=True)
-    state.visuals = {"charts": []}
+    if todo:
+        os.makedirs(CHART_DIR, exist_ok=True)
+        pool = _get_render_pool() if len(todo) >= CHART_POOL_MIN else None
+        if pool is not None:
+            results = [pool.submit(render_chart, chart, path) for chart, path in todo]
+        else:
+            results = [_render_inline(chart, path) for chart, path in todo]
+        for (chart, path), result in zip(todo, results):
+            try:
+                chart["file"] = result.result()
+            except Exception as e:
+                print(f"Rendering chart {chart.get('title', chart['type'])} failed: {e}")
+                chart["format"] = "spec"
+    return rendered
 
-    # 1) Try to generate chart from tables
-    for i, table in enumerate(tables, start=1):
-        # Extract the actual data from the table dict structure
-        table_data = table.get("data", table) if isinstance(table, dict) else table
+
+def ChartTables(state):
+    """Auto charts for the extracted tables; runs as soon as loading is done."""
+    tables = getattr(state, "extracted_tables", [])
+    charts = []
+
+    for table in tables:
+        # Stored tables come back from Parquet already typed.
+        table_data = read_table_frame(table, CHART_MAX_ROWS)
+        if table_data is None:
+            table_data = table.get("data", table) if isinstance(table, dict) else table
         chart = auto_chart_from_table(table_data)
         if chart:
-            file_path = f"visuals/table_chart_{i}.png"
-            render_chart(chart, file_path)
-            chart["file"] = file_path
-            state.visuals["charts"].append(chart)
-
-    # 2) Fallback: wordcloud
-    if not state.visuals["charts"]:
-        file_path = "visuals/wordcloud.png"
-        wc = WordCloud(width=800, height=400).generate(text)
-        plt.imshow(wc)
-        plt.axis("off")
-        plt.savefig(file_path)
-        plt.close()
-
-        state.visuals["charts"].append({
-            "type": "wordcloud",
-            "file": file_path,
-        })
-
-    return state
+            # Fewer rows than the table has: past CHART_MAX_ROWS, or an inline preview without pyarrow.
+            total = table.get("rows") if isinstance(table, dict) else None
+            if total and total > len(table_data):
+                chart["title"] = f"{chart['title']} (first {len(table_data):,} of {total:,} rows)"
+            charts.append(chart)
+
+    return {"visuals": {"charts": render_charts(charts, state.chart_format)}}
+
+
+def Visualizer(state):
+    """Join point of the parallel branches: wordcloud of the summary/answer when no table produced a chart."""
+    text = state.summary or state.rag_response or ""
+    charts = (state.visuals or {}).get("charts", [])
+
+    if not charts and text.strip():
+        from wordcloud import WordCloud
+
+        # Word frequencies are the spec: enough for the client to draw it, and the render cache key.
+        words = WordCloud().process_text(text)
+        top = dict(sorted(words.items(), key=lambda item: item[1], reverse=True)[:WORDCLOUD_MAX_WORDS])
+        if top:
+            chart = {"type": "wordcloud", "title": "Word cloud", "words": top}
+            return {"visuals": {"charts": render_charts([chart], state.chart_format)}}
+
+    return {}
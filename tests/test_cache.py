@@ -0,0 +1,64 @@
+import pytest
+
+from states import cache
+from states.cache import DiskCache, file_sha256, text_sha256
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_values_survive_reopen():
+    store = DiskCache("t", version="1")
+    store.set("a", b"alpha")
+    store.set_object("obj", {"rows": [1, 2], "name": "x"})
+    store.set_many({"b": b"beta", "c": b"gamma"})
+    store.close()
+
+    reopened = DiskCache("t", version="1")
+    assert reopened.get("a") == b"alpha"
+    assert reopened.get_object("obj") == {"rows": [1, 2], "name": "x"}
+    assert reopened.get_many(["a", "b", "c", "missing"]) == {"a": b"alpha", "b": b"beta", "c": b"gamma"}
+    assert reopened.get("missing") is None and reopened.get_object("missing") is None
+    assert sorted(key for key, _ in reopened.items()) == ["a", "b", "c", "obj"]
+
+
+def test_other_versions_are_ignored_and_invalidated():
+    DiskCache("t", version="1").set("a", b"old")
+    current = DiskCache("t", version="2")
+    assert current.get("a") is None
+    current.set("b", b"new")
+
+    assert current.invalidate() == 1
+    assert DiskCache("t", version="1").get("a") is None
+    assert current.get("b") == b"new"
+
+
+def test_least_recently_read_entries_are_evicted():
+    store = DiskCache("t", max_bytes=250)
+    for key in "abc":
+        store.set(key, b"x" * 100)
+    assert store.get("a") is None
+    assert store.total_bytes() <= 250
+
+    store.get("b")
+    store.set("d", b"x" * 100)
+    assert store.get("b") is not None and store.get("c") is None
+
+
+def test_delete_and_clear():
+    store = DiskCache("t")
+    store.set_many({"a": b"1", "b": b"2"})
+    store.delete("a")
+    assert store.get("a") is None and store.get("b") == b"2"
+    store.clear()
+    assert store.items() == [] and store.total_bytes() == 0
+
+
+def test_content_hashes(tmp_path):
+    path = tmp_path / "f.bin"
+    path.write_bytes(b"abc")
+    assert file_sha256(str(path)) == text_sha256("abc")
+    assert file_sha256(str(path), chunk_size=1) == text_sha256("abc")
@@ -0,0 +1,92 @@
+import asyncio
+from typing import List
+
+import pytest
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+from model.embedding_cache import CachedEmbedding
+from states.cache import DiskCache
+
+
+class FakeEmbedding(BaseEmbedding):
+    """Deterministic offline embedding that records every batch it is sent."""
+
+    _batches: List[List[str]] = PrivateAttr(default_factory=list)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    def _vector(self, text: str) -> List[float]:
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._batches.append(list(texts))
+        return [self._vector(t) for t in texts]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self._batches.append([query])
+        return self._vector(query)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._get_text_embeddings(texts)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embedding(text)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    monkeypatch.setattr("states.cache.CACHE_DIR", str(tmp_path))
+    return FakeEmbedding(model_name="fake", embed_batch_size=1000)
+
+
+def _cached(fake, **kwargs):
+    # One token per character keeps the token budget easy to reason about.
+    return CachedEmbedding(fake, cache=DiskCache("embeddings"), count_tokens=len, **kwargs)
+
+
+def test_misses_are_embedded_once_and_then_served_from_disk(fake):
+    model = _cached(fake)
+    texts = ["alpha", "beta", "alpha", "gamma"]
+    first = model.get_text_embedding_batch(texts)
+    assert fake._batches == [["alpha", "beta", "gamma"]]
+    assert (model.hits, model.misses) == (0, 3)
+
+    reopened = _cached(fake)
+    again = reopened.get_text_embedding_batch(["gamma", "alpha", "delta"])
+    assert fake._batches[-1] == ["delta"]
+    assert (reopened.hits, reopened.misses) == (2, 1)
+    assert again[:2] == [first[3], first[0]]
+    assert first[0] == pytest.approx(fake._vector("alpha"))
+
+
+def test_query_and_text_embeddings_are_cached_apart(fake):
+    model = _cached(fake)
+    model.get_text_embedding("alpha")
+    model.get_query_embedding("alpha")
+    model.get_query_embedding("alpha")
+    assert fake._batches == [["alpha"], ["alpha"]]
+
+
+def test_batches_respect_token_and_count_limits(fake):
+    model = _cached(fake, max_batch_tokens=10, embed_batch_size=3)
+    texts = ["aaaa", "bbbb", "cc", "d", "e", "f", "g" * 25, "hh"]
+    vectors = model.get_text_embedding_batch(texts)
+
+    assert fake._batches == [["aaaa", "bbbb", "cc"], ["d", "e", "f"], ["g" * 25], ["hh"]]
+    assert all(sum(map(len, batch)) <= 10 for batch in fake._batches if len(batch) > 1)
+    assert vectors == [pytest.approx(fake._vector(t)) for t in texts]
+
+
+def test_async_batches_respect_token_limit(fake):
+    model = _cached(fake, max_batch_tokens=6)
+    asyncio.run(model.aget_text_embedding_batch(["abc", "def", "ghi"]))
+    assert fake._batches == [["abc", "def"], ["ghi"]]
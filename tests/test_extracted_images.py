@@ -0,0 +1,26 @@
+import os
+
+from PIL import Image
+
+from states.loaders import utils
+
+
+def test_same_name_different_pixels_keep_both_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "EXTRACTED_IMG_DIR", str(tmp_path))
+    first = utils.save_pil_image(Image.new("RGB", (64, 64), (255, 0, 0)), "report.pdf_p1_i0")
+    second = utils.save_pil_image(Image.new("RGB", (64, 64), (0, 0, 255)), "report.pdf_p1_i0")
+
+    assert first != second
+    assert Image.open(first).getpixel((0, 0)) == (255, 0, 0)
+    assert Image.open(second).getpixel((0, 0)) == (0, 0, 255)
+
+
+def test_same_pixels_reuse_the_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "EXTRACTED_IMG_DIR", str(tmp_path))
+    image = Image.new("RGB", (64, 64), (0, 128, 0))
+    path = utils.save_pil_image(image, "slides.pptx_slide3")
+    mtime = os.stat(path).st_mtime_ns
+
+    assert utils.save_pil_image(image, "slides.pptx_slide3", utils.pixel_digest(image)) == path
+    assert os.stat(path).st_mtime_ns == mtime
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
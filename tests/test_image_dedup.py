@@ -0,0 +1,48 @@
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+from states import cache
+from states.loaders import utils
+
+
+def _page(lines, size=(600, 800)):
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for y, line in enumerate(lines):
+        draw.text((40, 40 + 18 * y), line, fill="black")
+    return image
+
+
+def _recompressed(image, quality=85):
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue())).convert("RGB")
+
+
+def _deduper(images, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(utils, "_image_cache", None)
+    return utils.ImageDeduper(images)
+
+
+def test_rescaled_and_recompressed_copies_are_repeats(tmp_path, monkeypatch):
+    rnd = random.Random(0)
+    page = _page(["".join(rnd.choice("abcdefgh ijklmnop") for _ in range(80)) for _ in range(40)])
+    deduper = _deduper([page, page.resize((300, 400)), _recompressed(page)], tmp_path, monkeypatch)
+
+    assert deduper.repeats == {1: 0, 2: 0}
+    assert deduper.vision_todo == [0]
+
+
+def test_pages_differing_in_one_identifier_are_kept(tmp_path, monkeypatch):
+    body = ["Supplier: Example Ltd", "Terms: 30 days"] * 10
+    first = _page(body + ["Invoice INV-2023-0042 total 1,200.00"])
+    second = _page(body + ["Invoice INV-2023-0043 total 1,200.00"])
+    assert bin(utils.perceptual_hash(first) ^ utils.perceptual_hash(second)).count("1") <= utils.PHASH_MAX_DISTANCE
+
+    deduper = _deduper([first, second], tmp_path, monkeypatch)
+
+    assert deduper.repeats == {}
+    assert deduper.vision_todo == [0, 1]
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+
+from states.keyword_index import KEYWORD_META_FILE, BM25Index, tokenize
+
+
+def _files(path):
+    return sorted(name for name in os.listdir(path) if name.endswith(".npz"))
+
+
+def _index(path, docs):
+    index = BM25Index(str(path))
+    for node_id, ref_doc_id, text in docs:
+        index.add(node_id, ref_doc_id, text)
+    return index
+
+
+DOCS = [
+    ("n1", "d1", "Invoice INV-2023-0042 from Example Ltd, total 1,200.00"),
+    ("n2", "d1", "Payment terms: 30 days net"),
+    ("n3", "d2", "Invoice INV-2023-0043 from Other GmbH"),
+    ("n4", "d3", "Quarterly report v1.2 with revenue tables"),
+]
+
+
+def test_codes_are_indexed_whole_and_by_parts():
+    assert tokenize("INV-2023-0042, v1.2") == ["inv-2023-0042", "inv", "2023", "0042", "v1.2", "v1", "2"]
+
+
+def test_segment_round_trip(tmp_path):
+    index = _index(tmp_path, DOCS)
+    index.persist()
+    assert len(_files(tmp_path)) == 1
+
+    loaded = BM25Index.from_persist_dir(str(tmp_path))
+    assert len(loaded) == 4
+    for query in ("INV-2023-0042", "invoice", "payment terms", "v1.2 revenue"):
+        assert loaded.search(query, 3) == index.search(query, 3)
+    assert loaded.search("inv-2023-0042", 3)[0][0] == "n1"
+    assert loaded.search("nothing matches", 3) == []
+
+
+def test_new_postings_append_a_segment(tmp_path):
+    index = _index(tmp_path, DOCS[:2])
+    index.persist()
+    first = _files(tmp_path)
+    stat = os.stat(tmp_path / first[0])
+
+    loaded = BM25Index.from_persist_dir(str(tmp_path))
+    loaded.add(*DOCS[2])
+    loaded.persist()
+    assert len(_files(tmp_path)) == 2
+    assert os.stat(tmp_path / first[0]).st_mtime_ns == stat.st_mtime_ns
+
+    reloaded = BM25Index.from_persist_dir(str(tmp_path))
+    assert sorted(node_id for node_id, _ in reloaded.search("invoice", 5)) == ["n1", "n3"]
+    assert reloaded.search("INV-2023-0043", 1)[0][0] == "n3"
+
+
+def test_deletes_are_tombstones_then_compacted(tmp_path):
+    index = _index(tmp_path, DOCS)
+    index.persist()
+
+    index.delete("d2")
+    index.persist()
+    loaded = BM25Index.from_persist_dir(str(tmp_path))
+    assert len(loaded) == 3
+    assert "n3" not in [node_id for node_id, _ in loaded.search("invoice", 5)]
+    assert len(_files(tmp_path)) == 1
+
+    # Re-adding a node tombstones its previous row; at 2 of 5 rows (over 30%) everything is
+    # merged into one renumbered segment and the old one is removed.
+    loaded.add("n4", "d3", "Annual report")
+    loaded.persist()
+    assert loaded.search("quarterly", 5) == []
+    assert len(_files(tmp_path)) == 1 and not loaded._deleted and loaded._ids == ["n1", "n2", "n4"]
+
+    loaded.delete("d1")
+    loaded.persist()
+    assert len(_files(tmp_path)) == 1
+    compacted = BM25Index.from_persist_dir(str(tmp_path))
+    assert len(compacted) == 1 and compacted._ids == ["n4"] and not compacted._deleted
+    assert compacted.search("annual report", 5)[0][0] == "n4"
+    assert compacted.search("invoice", 5) == []
+    assert os.path.exists(tmp_path / KEYWORD_META_FILE)
+
+
+def test_large_row_gaps_use_wide_encoding(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add("first", "d0", "needle")
+    for i in range(70000):
+        index.add(f"filler{i}", "filler", "hay")
+    index.add("last", "d1", "needle")
+    index.persist()
+
+    with np.load(tmp_path / _files(tmp_path)[0]) as data:
+        assert data["gaps"].dtype == np.uint32
+    loaded = BM25Index.from_persist_dir(str(tmp_path))
+    assert sorted(node_id for node_id, _ in loaded.search("needle", 5)) == ["first", "last"]
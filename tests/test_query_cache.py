@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from states import cache
+from states.query_cache import SemanticQueryCache
+
+
+@pytest.fixture
+def query_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    return SemanticQueryCache(threshold=0.95, size=2)
+
+
+def _vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_similar_question_with_same_codes_hits(query_cache):
+    query_cache.store("v1", "What is the total of INV-2023-0042?", _vector(1, 0, 0), "1,200", ["n1"])
+    hit = query_cache.lookup("v1", "what's the total for INV-2023-0042", _vector(1, 0.05, 0))
+    assert hit is not None and hit.answer == "1,200" and hit.node_ids == ["n1"]
+
+
+def test_question_about_another_identifier_misses(query_cache):
+    query_cache.store("v1", "What is the total of INV-2023-0042?", _vector(1, 0, 0), "1,200", ["n1"])
+    query_cache.store("v1", "What is the total of INV-2023-0044?", _vector(1, 0.01, 0), "900", ["n2"])
+    assert query_cache.lookup("v1", "What is the total of INV-2023-0043?", _vector(1, 0, 0)) is None
+    assert query_cache.lookup("v1", "Total of INV-2023-0044?", _vector(1, 0, 0)).answer == "900"
+    assert query_cache.lookup("v1", "Revenue in 2021?", _vector(1, 0, 0)) is None
+
+
+def test_entries_survive_restart_and_expire_with_the_version(query_cache):
+    for i in range(4):
+        query_cache.store("v1", f"question {i}", _vector(0, 1, i), f"answer {i}", [])
+
+    reopened = SemanticQueryCache(threshold=0.95, size=2)
+    assert reopened.lookup("v1", "question 0", _vector(0, 1, 0)).answer == "answer 0"
+    assert reopened.lookup("v2", "question 0", _vector(0, 1, 0)) is None
+    assert reopened.stats()["entries"] == 0
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+from llama_index.core import Document, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+
+from states import indexer
+from states.doc_state import DocState
+from states.sqlite_docstore import SQLiteKVStore
+
+
+@pytest.fixture
+def persist_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexer, "PERSIST_DIR", str(tmp_path))
+    monkeypatch.setattr(indexer, "get_embed_model", lambda: MockEmbedding(embed_dim=8))
+    return tmp_path
+
+
+def _docs(texts):
+    return [Document(text=text, metadata={"filename": f"f{i}.txt", "type": "text"}) for i, text in enumerate(texts)]
+
+
+def test_writes_are_visible_to_other_connections_only_after_commit(tmp_path):
+    path = str(tmp_path / "kv.sqlite")
+    writer, reader = SQLiteKVStore(path), SQLiteKVStore(path)
+    writer.put_all([("a", {"n": 1}), ("b", {"n": 2})], collection="docs")
+    assert writer.get("a", "docs") == {"n": 1}
+    assert reader.get("a", "docs") is None
+
+    writer.commit()
+    assert reader.get_all("docs") == {"a": {"n": 1}, "b": {"n": 2}}
+    assert writer.delete("a", "docs") and not writer.delete("a", "docs")
+    writer.rollback()
+    assert reader.get("a", "docs") == {"n": 1}
+
+
+def test_index_round_trip_and_upsert(persist_dir):
+    first = indexer.build_index(DocState(use_rag=True, documents=_docs(["alpha", "beta", "gamma"]), file_paths=["x"]))
+    assert not (persist_dir / "docstore.json").exists()
+
+    index = indexer.open_index()
+    assert len(index.ref_doc_info) == 3
+    assert sorted(n.text for n in index.docstore.docs.values()) == ["alpha", "beta", "gamma"]
+
+    second = indexer.build_index(DocState(use_rag=True, documents=_docs(["alpha", "BETA"]), file_paths=["x"]))
+    assert second["index_version"] != first["index_version"]
+    assert sorted(n.text for n in indexer.open_index().docstore.docs.values()) == ["BETA", "alpha", "gamma"]
+
+    unchanged = indexer.build_index(DocState(use_rag=True, documents=_docs(["alpha", "BETA"]), file_paths=["x"]))
+    assert unchanged["index_version"] == second["index_version"]
+
+
+def test_failed_sync_leaves_the_committed_index(persist_dir, monkeypatch):
+    indexer.build_index(DocState(use_rag=True, documents=_docs(["alpha"]), file_paths=["x"]))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("embedding service down")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(VectorStoreIndex, "insert_nodes", fail)
+        with pytest.raises(RuntimeError):
+            indexer.build_index(DocState(use_rag=True, documents=_docs(["changed"]), file_paths=["x"]))
+
+    assert [n.text for n in indexer.open_index().docstore.docs.values()] == ["alpha"]
+
+
+def test_json_stores_from_earlier_versions_are_imported(persist_dir):
+    docs = list(indexer.with_doc_ids(_docs(["alpha", "beta"])))
+    legacy = VectorStoreIndex.from_documents(docs, embed_model=MockEmbedding(embed_dim=8))
+    legacy.storage_context.persist(persist_dir=str(persist_dir))
+    assert (persist_dir / "docstore.json").exists()
+
+    index = indexer.open_index()
+    assert not os.path.exists(persist_dir / "docstore.json")
+    assert not os.path.exists(persist_dir / "index_store.json")
+    assert index.index_id == legacy.index_id
+    assert sorted(n.text for n in index.docstore.docs.values()) == ["alpha", "beta"]
@@ -0,0 +1,36 @@
+from states import summarizer
+from states.summarizer import count_tokens, split_by_tokens
+
+
+def _lines(n):
+    return "\n".join(f"line {i} of a report that fits in one summary call" for i in range(n))
+
+
+def test_text_within_budget_is_one_chunk():
+    text = _lines(400)
+    budget = count_tokens(text) + 10
+    # Well past half the budget, where content-defined cuts would otherwise start firing.
+    assert count_tokens(text) > budget // 2
+    assert split_by_tokens(text, budget) == [text]
+
+
+def test_empty_text_has_no_chunks():
+    assert split_by_tokens("  \n ", 100) == []
+
+
+def test_long_text_respects_budget():
+    text = _lines(2000)
+    budget = count_tokens(text) // 5
+    chunks = split_by_tokens(text, budget)
+    assert len(chunks) >= 5
+    assert all(count_tokens(chunk) <= budget for chunk in chunks)
+    assert "\n".join(chunks).split("\n") == text.split("\n")
+
+
+def test_summarize_text_within_budget_makes_one_call(monkeypatch):
+    calls = []
+    monkeypatch.setattr(summarizer, "_summarize_final", lambda prompt, text: calls.append(prompt) or "summary")
+    monkeypatch.setattr(summarizer, "_summarize_all", lambda prompt, texts: calls.extend([prompt] * len(texts)))
+    text = _lines(400)
+    assert summarizer.summarize_text(text, count_tokens(text) + 10) == "summary"
+    assert calls == [summarizer.MAP_PROMPT]
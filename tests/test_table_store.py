@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+import pytest
+
+from states import table_store
+from states.table_store import ParquetSink, read_table_page, table_exists, write_table
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(table_store, "TABLE_STORE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_table_is_hidden_until_close(store):
+    sink = ParquetSink("t1")
+    sink.write(pd.DataFrame({"a": [1, 2]}))
+    sink.write(pd.DataFrame({"a": [2.5]}))
+    assert not table_exists("t1")
+
+    info = sink.close()
+    assert info == {"table_id": "t1", "rows": 3, "columns": ["a"]}
+    assert read_table_page("t1")["data"] == [{"a": 1.0}, {"a": 2.0}, {"a": 2.5}]
+    assert os.listdir(store) == ["t1"]
+
+
+def test_existing_table_is_not_rewritten(store):
+    write_table(pd.DataFrame({"a": range(5)}), "t1")
+    part = os.path.join(table_store.table_dir("t1"), "part-00000.parquet")
+    before = os.stat(part)
+
+    sink = ParquetSink("t1")
+    sink.write(pd.DataFrame({"a": range(5)}))
+    assert sink.close()["rows"] == 5
+    after = os.stat(part)
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+    assert os.listdir(store) == ["t1"]
+
+
+def test_concurrent_ingests_of_one_table_leave_readers_a_whole_table(store):
+    first, second = ParquetSink("t1"), ParquetSink("t1")
+    first.write(pd.DataFrame({"a": range(10)}))
+    second.write(pd.DataFrame({"a": range(10)}))
+
+    assert first.close()["rows"] == 10
+    page = read_table_page("t1", 0, 100)
+    assert second.close()["rows"] == 10
+    assert read_table_page("t1", 0, 100) == page
+    assert os.listdir(store) == ["t1"]
+
+
+def test_interrupted_write_is_replaced(store):
+    os.makedirs(table_store.table_dir("t1"))
+    open(os.path.join(table_store.table_dir("t1"), "part-00000.parquet"), "wb").close()
+
+    assert write_table(pd.DataFrame({"a": [7]}), "t1")["rows"] == 1
+    assert read_table_page("t1")["data"] == [{"a": 7}]
+    assert os.listdir(store) == ["t1"]
@@ -0,0 +1,57 @@
+import importlib
+import io
+import os
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("backend.main")
+    monkeypatch.setattr(module, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(module, "REQUEST_UPLOAD_DIR", str(tmp_path / "uploads" / "requests"))
+    os.makedirs(module.REQUEST_UPLOAD_DIR)
+    module._uploads_in_use.clear()
+    return module
+
+
+def _upload(main, name, content, mtime, batch=False):
+    path = main._save_upload(SimpleNamespace(filename=name, file=io.BytesIO(content)))
+    os.utime(path, (mtime, mtime))
+    return path, main._pipeline_inputs(path, "summary", "", batch, "spec")
+
+
+def _request_dirs(main):
+    return sorted(os.listdir(main.REQUEST_UPLOAD_DIR))
+
+
+def test_superseded_copy_is_pruned_once_its_run_ends(main):
+    old, old_inputs = _upload(main, "report.pdf", b"v1", 1000)
+    new, new_inputs = _upload(main, "report.pdf", b"v2", 2000)
+    other, other_inputs = _upload(main, "notes.txt", b"n", 500)
+
+    main._release_uploads(main._run_uploads(new, new_inputs))
+    main._release_uploads(main._run_uploads(other, other_inputs))
+    assert old.exists() and new.exists() and other.exists()
+
+    main._release_uploads(main._run_uploads(old, old_inputs))
+    assert not old.exists()
+    assert _request_dirs(main) == sorted([new.parent.name, other.parent.name])
+    assert main._uploads_in_use == {}
+
+
+def test_batch_run_holds_every_file_it_lists(main):
+    old, old_inputs = _upload(main, "report.pdf", b"v1", 1000)
+    main._release_uploads(main._run_uploads(old, old_inputs))
+    trigger, batch_inputs = _upload(main, "notes.txt", b"n", 500, batch=True)
+    assert sorted(batch_inputs["file_paths"]) == sorted([str(old), str(trigger)])
+
+    new, new_inputs = _upload(main, "report.pdf", b"v2", 2000)
+    main._release_uploads(main._run_uploads(new, new_inputs))
+    assert old.exists()
+
+    main._release_uploads(main._run_uploads(trigger, batch_inputs))
+    assert not old.exists() and new.exists() and trigger.exists()
+    assert main._uploads_in_use == {}
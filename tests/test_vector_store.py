@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from states.ann import ANN_LISTS_FILE
+from states.vector_store import VECTORS_FILE, NumpyVectorStore
+
+
+def _nodes(n, dim=16, seed=0, per_doc=2):
+    """``n`` nodes with random embeddings, ``per_doc`` consecutive nodes per source document."""
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    nodes = [
+        TextNode(
+            id_=f"n{seed}-{i}",
+            embedding=vector.tolist(),
+            metadata={"page": i},
+            relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"d{seed}-{i // per_doc}")},
+        )
+        for i, vector in enumerate(vectors)
+    ]
+    return nodes, vectors
+
+
+def _top(store, vector, k=5):
+    return store.query(VectorStoreQuery(query_embedding=vector.tolist(), similarity_top_k=k)).ids
+
+
+def test_persist_and_reload_round_trip(tmp_path):
+    nodes, vectors = _nodes(40)
+    store = NumpyVectorStore(persist_dir=str(tmp_path))
+    store.add(nodes)
+    store.persist()
+    expected = [_top(store, v) for v in vectors[:5]]
+
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    assert [_top(loaded, v) for v in vectors[:5]] == expected
+    assert _top(loaded, vectors[3], k=1) == ["n0-3"]
+    assert os.path.getsize(tmp_path / VECTORS_FILE) == 40 * 16 * 4
+
+    # A second persist appends only the new rows.
+    more, more_vectors = _nodes(10, seed=1)
+    loaded.add(more)
+    loaded.persist()
+    assert os.path.getsize(tmp_path / VECTORS_FILE) == 50 * 16 * 4
+    assert _top(NumpyVectorStore.from_persist_dir(str(tmp_path)), more_vectors[7], k=1) == ["n1-7"]
+
+
+def test_float16_store_round_trip(tmp_path):
+    nodes, vectors = _nodes(30)
+    store = NumpyVectorStore(persist_dir=str(tmp_path), dtype="float16")
+    store.add(nodes)
+    store.persist()
+
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    assert loaded.dtype == "float16"
+    assert os.path.getsize(tmp_path / VECTORS_FILE) == 30 * 16 * 2
+    assert [_top(loaded, v, k=1)[0] for v in vectors] == [n.node_id for n in nodes]
+
+
+def test_deletes_are_tombstones_until_compaction(tmp_path):
+    nodes, vectors = _nodes(40)
+    store = NumpyVectorStore(persist_dir=str(tmp_path))
+    store.add(nodes)
+    store.persist()
+
+    store.delete("d0-0")
+    store.persist()
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    assert "n0-0" not in _top(loaded, vectors[0], k=40)
+    assert os.path.getsize(tmp_path / VECTORS_FILE) == 40 * 16 * 4
+
+    for doc in range(1, 8):
+        loaded.delete(f"d0-{doc}")
+    loaded.persist()
+    # 16 of 40 rows deleted: past the compaction ratio, so the file holds live rows only.
+    assert os.path.getsize(tmp_path / VECTORS_FILE) == 24 * 16 * 4
+    compacted = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    assert len(compacted._ids) == 24 and not compacted._deleted
+    assert [_top(compacted, v, k=1)[0] for v in vectors[16:]] == [n.node_id for n in nodes[16:]]
+    assert set(_top(compacted, vectors[0], k=40)) == {n.node_id for n in nodes[16:]}
+
+
+def test_flushed_rows_without_metadata_are_dropped_on_load(tmp_path):
+    nodes, vectors = _nodes(20)
+    store = NumpyVectorStore(persist_dir=str(tmp_path))
+    store.add(nodes[:10])
+    store.persist()
+    store.add(nodes[10:])
+    store.flush()
+    assert os.path.getsize(tmp_path / VECTORS_FILE) == 20 * 16 * 4
+
+    # Crash before persist: the metadata still lists 10 rows.
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    assert len(loaded._ids) == 10
+    assert os.path.getsize(tmp_path / VECTORS_FILE) == 10 * 16 * 4
+    loaded.add(nodes[10:])
+    loaded.persist()
+    assert _top(NumpyVectorStore.from_persist_dir(str(tmp_path)), vectors[15], k=1) == ["n0-15"]
+
+
+def test_ivf_store_persists_its_index_and_keeps_recall(tmp_path):
+    nodes, vectors = _nodes(3000, dim=32, per_doc=1)
+    options = {"ann_mode": "ivf", "ann_nlist": 16, "ann_nprobe": 16, "ann_min_rows": 1000}
+    store = NumpyVectorStore(persist_dir=str(tmp_path), **options)
+    store.add(nodes)
+    store.persist()
+
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path), **options)
+    assert loaded._ann is not None and loaded._ann.rows == 3000
+    queries = np.random.default_rng(5).normal(size=(20, 32)).astype(np.float32)
+    exact = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    assert exact._ann is None
+    for query in queries:
+        # nprobe == nlist scans every cell, so the approximate result is exact.
+        assert _top(loaded, query, k=10) == _top(exact, query, k=10)
+    assert os.path.exists(tmp_path / ANN_LISTS_FILE)
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    store = NumpyVectorStore(persist_dir=str(tmp_path))
+    store.add(_nodes(2, dim=8)[0])
+    with pytest.raises(ValueError):
+        store.add(_nodes(2, dim=4, seed=1)[0])
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from states.loaders import utils
+from states.loaders.utils import analyze_images_batch
+
+
+def _images(n):
+    return [Image.new("RGB", (40, 40), (i * 20 % 256, 0, 0)) for i in range(n)]
+
+
+def _response(caption):
+    content = json.dumps({"caption": caption, "insights": ["one", "two"]})
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class StubClient:
+    """Async ``chat.completions.create`` that records concurrency and fails every request's first try."""
+
+    def __init__(self):
+        self.in_flight = self.peak = self.calls = 0
+        self.seen = set()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **request):
+        self.calls += 1
+        image = request["messages"][0]["content"][1]["image_url"]["url"]
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if image not in self.seen:
+                self.seen.add(image)
+                raise RuntimeError("rate limited")
+            return _response(f"caption {len(image)}")
+        finally:
+            self.in_flight -= 1
+
+
+def test_stub_client_bounded_concurrency_retries_and_order(monkeypatch):
+    monkeypatch.setattr(utils, "_backoff", lambda attempt: 0)
+    stub = StubClient()
+    images = _images(10)
+    results = analyze_images_batch(images, vision_client=stub, concurrency=3, max_retries=1)
+    assert stub.peak <= 3
+    assert stub.calls == 20
+    expected = [f"caption {len(utils._vision_request(img)['messages'][0]['content'][1]['image_url']['url'])}" for img in images]
+    assert [caption for caption, _ in results] == expected
+    assert results[0][1] == "- one\n- two"
+
+
+def test_stub_client_gives_up_after_retries(monkeypatch):
+    monkeypatch.setattr(utils, "_backoff", lambda attempt: 0)
+    results = analyze_images_batch(_images(2), vision_client=StubClient(), max_retries=0)
+    assert all(caption.startswith("[VisionError]") for caption, _ in results)
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real API: pooled connections outlive the request that opened them.
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            body = json.dumps({
+                "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+                "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": json.dumps({"caption": "stub", "insights": []})},
+                }],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    yield
+    server.shutdown()
+
+
+def test_default_client_works_across_batches_and_threads(stub_server):
+    # Each batch runs on its own event loop; a client shared between loops fails the second one.
+    for _ in range(2):
+        assert analyze_images_batch(_images(3), max_retries=0) == [("stub", "")] * 3
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(analyze_images_batch(_images(4), max_retries=0)))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [[("stub", "")] * 4] * 3
@@ -0,0 +1,87 @@
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from states import visualizer
+from states.table_store import write_table
+from states.visualizer import CHART_MAX_POINTS, auto_chart_from_table
+
+
+@pytest.fixture
+def table_store(tmp_path, monkeypatch):
+    monkeypatch.setattr("states.table_store.TABLE_STORE_DIR", str(tmp_path / "tables"))
+    monkeypatch.setattr(visualizer, "render_charts", lambda charts, fmt: charts)
+
+
+def _chart_tables(tables):
+    class State:
+        extracted_tables = tables
+        chart_format = "spec"
+
+    return visualizer.ChartTables(State())["visuals"]["charts"]
+
+
+def test_small_table_charts_every_row():
+    rows = [{"region": f"r{i}", "sales": i} for i in range(20)]
+    chart = auto_chart_from_table(rows)
+    assert chart["type"] == "bar" and chart["values"] == list(map(float, range(20)))
+    assert chart["title"] == "sales by region"
+
+
+def test_bar_over_point_limit_totals_every_row():
+    n = CHART_MAX_POINTS * 3
+    df = pd.DataFrame({"region": ["north", "south", "east"] * (n // 3), "sales": [1] * n})
+    chart = auto_chart_from_table(df)
+    assert chart["title"] == "Total sales by region"
+    assert sorted(chart["labels"]) == ["east", "north", "south"]
+    assert sum(chart["values"]) == n
+
+
+def test_histogram_over_point_limit_is_sampled_and_labelled():
+    n = CHART_MAX_POINTS * 4 + 1
+    chart = auto_chart_from_table(pd.DataFrame({"value": range(n)}))
+    assert chart["type"] == "histogram"
+    assert len(chart["values"]) <= CHART_MAX_POINTS
+    assert chart["values"][-1] > n * 0.99
+    assert f"of {n:,} rows" in chart["title"]
+
+
+def test_stored_table_is_read_past_old_row_limit(table_store):
+    n = 20000
+    df = pd.DataFrame({"day": pd.date_range("2024-01-01", periods=n, freq="h"), "amount": [1.0] * n})
+    info = write_table(df, "big")
+    chart = _chart_tables([{**info, "source": "big.csv"}])[0]
+    assert chart["type"] == "line" and chart["x_type"] == "date"
+    assert sum(chart["values"]) == n
+    assert "rows)" not in chart["title"]
+
+
+def test_stored_table_over_row_limit_is_labelled(table_store, monkeypatch):
+    monkeypatch.setattr(visualizer, "CHART_MAX_ROWS", 100)
+    info = write_table(pd.DataFrame({"value": range(1000)}), "capped")
+    chart = _chart_tables([info])[0]
+    assert len(chart["values"]) == 100
+    assert chart["title"].endswith("(first 100 of 1,000 rows)")
+
+
+def test_render_pool_spawns_workers_from_a_request_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(visualizer, "CHART_DIR", str(tmp_path))
+    monkeypatch.setattr(visualizer, "CHART_WORKERS", 2)
+    monkeypatch.setattr(visualizer, "CHART_POOL_MIN", 1)
+    monkeypatch.setattr(visualizer, "_render_pool", None)
+    charts = [auto_chart_from_table([{"region": f"r{i}", "sales": i + n} for i in range(5)]) for n in range(2)]
+
+    result = {}
+    try:
+        worker = threading.Thread(target=lambda: result.update(charts=visualizer.render_charts(charts, "png")))
+        worker.start()
+        worker.join(timeout=120)
+    finally:
+        pool = visualizer._render_pool
+        if pool is not None:
+            pool.shutdown()
+
+    assert pool._mp_context.get_start_method() == "spawn"
+    assert all(os.path.exists(chart["file"]) for chart in result["charts"])